@@ -158,4 +158,88 @@ SOCIALACCOUNT_PROVIDERS = {
 
 # --- GROQ AI CONFIGURATION ---
 # Reads the key from your .env file
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
\ No newline at end of file
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# --- LOCAL COMPILER ENGINE (DOCKER) ---
+# Number of pre-started 'local-compiler' containers kept warm (each serves one run, then is replaced; 0 = always cold start)
+# Each process fills its pool on its first code run; containers of killed processes are removed then too
+COMPILER_POOL_SIZE = int(os.getenv("COMPILER_POOL_SIZE", "4"))
+# Background workers that run IDE submissions, and how many jobs may wait for them
+CODE_EXEC_WORKERS = int(os.getenv("CODE_EXEC_WORKERS", "4"))
+CODE_EXEC_QUEUE_SIZE = int(os.getenv("CODE_EXEC_QUEUE_SIZE", "50"))
+# Disk budget for cached C++/Java builds (least recently used builds are evicted first)
+COMPILE_CACHE_MAX_BYTES = int(os.getenv("COMPILE_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# --- BOUNTY ARENA JUDGING ---
+# Verdicts come from the sandboxed test cases; the AI only adds a hint to Wrong Answer results
+BOUNTY_AI_HINTS = os.getenv("BOUNTY_AI_HINTS", "True") == "True"
+
+# --- BOUNTY PROBLEM POOL ---
+# Popular (language, topic, difficulty) combinations keep pre-generated problems ready.
+# Refill starts when fewer than LOW_WATER are left and tops up to HIGH_WATER.
+BOUNTY_POOL_LOW_WATER = int(os.getenv("BOUNTY_POOL_LOW_WATER", "2"))
+BOUNTY_POOL_HIGH_WATER = int(os.getenv("BOUNTY_POOL_HIGH_WATER", "5"))
+# Requests per day before a topic counts as popular (rarer topics are generated live)
+BOUNTY_POOL_MIN_DEMAND = int(os.getenv("BOUNTY_POOL_MIN_DEMAND", "3"))
+
+# --- COMMUNITY AI REPLIES ---
+# Background workers answering /ai commands in course chats, and how many commands may wait for them
+COMMUNITY_AI_WORKERS = int(os.getenv("COMMUNITY_AI_WORKERS", "3"))
+COMMUNITY_AI_QUEUE_SIZE = int(os.getenv("COMMUNITY_AI_QUEUE_SIZE", "20"))
+
+# --- COMMUNITY CHAT LIVE UPDATES ---
+# Pub/sub used to push chat changes to open pages (needs the ASGI app: lms_core.asgi:application).
+# The default only reaches streams in the same process. One change-log poller per process reads the log of courses
+# with open streams every 2 seconds and publishes into it, so changes saved by other processes still arrive.
+CHAT_BROKER_BACKEND = os.getenv("CHAT_BROKER_BACKEND", "students.chat_broker.InProcessBroker")
+# Chat search backend (dotted path). Empty = SQLite FTS5 index when available, else a plain icontains scan.
+CHAT_SEARCH_BACKEND = os.getenv("CHAT_SEARCH_BACKEND", "")
+
+# --- LLM GATEWAY (GROQ) ---
+# Every AI feature goes through students/llm_gateway.py (one keep-alive connection pool)
+LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+# After this many failed calls in a row AI features fail fast for LLM_BREAKER_COOLDOWN seconds
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = int(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# --- LLM RESPONSE CACHE ---
+# Backend for cached AI replies: "locmem" (per process, LRU), "file" or "db" (shared between processes).
+# The "db" backend needs `python manage.py createcachetable` once.
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "locmem")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+
+_LLM_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'llm-replies'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'llm_cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'llm_reply_cache'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm': {
+        'BACKEND': _LLM_CACHE_BACKENDS[LLM_CACHE_BACKEND][0],
+        'LOCATION': _LLM_CACHE_BACKENDS[LLM_CACHE_BACKEND][1],
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': LLM_CACHE_MAX_ENTRIES},
+    },
+}
+# Per-feature TTL overrides in seconds, e.g. "ai_chat=600,quiz_generation=0" (0 disables caching for that feature).
+# Defaults live in students/llm_cache.py.
+LLM_CACHE_POLICIES = {
+    name.strip(): int(ttl)
+    for name, ttl in (item.split('=', 1) for item in os.getenv("LLM_CACHE_POLICIES", "").split(',') if '=' in item)
+}
+
+# --- LLM QUOTA SCHEDULER ---
+# Groq limits for this process (split them between processes if you run several workers)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "30"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "12000"))
+LLM_USER_RPM_LIMIT = int(os.getenv("LLM_USER_RPM_LIMIT", "10"))
+LLM_USER_TPM_LIMIT = int(os.getenv("LLM_USER_TPM_LIMIT", "4000"))
+# Share of the budget batch work (quiz generation, auto-replies, pool refills) may use
+LLM_BATCH_SHARE = float(os.getenv("LLM_BATCH_SHARE", "0.7"))
+# Seconds a call may queue for quota before it is shed with a "busy" message
+LLM_INTERACTIVE_MAX_WAIT = int(os.getenv("LLM_INTERACTIVE_MAX_WAIT", "10"))
+LLM_BATCH_MAX_WAIT = int(os.getenv("LLM_BATCH_MAX_WAIT", "60"))
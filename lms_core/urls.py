@@ -22,6 +22,8 @@ from students.views import (
     live_classes, 
     library_view, 
     profile_view,       #  Profile View
+    activity_heatmap,   # 📊 Profile heatmap (daily activity rollups)
+    leaderboard_api,    # 🏆 Leaderboard (windows, per course, my rank)
 
     # 4. Payment System
     payment_page,
@@ -31,6 +33,7 @@ from students.views import (
     # 👉 🚀 NEW: SYNTAX SINGULARITY (AI Coding Arena)
     syntax_singularity_view,
     generate_ai_challenge,
+    challenge_status,   # Live problem verification: poll
     submit_bounty_code,  # 🚀 NEW: Added this import!
 
     # 5. Quiz & AI
@@ -40,7 +43,12 @@ from students.views import (
     save_quiz_view, 
     submit_quiz_view,   
     ai_chat,
+    ai_chat_stream,     # Streaming AI chat (SSE)
+    ai_gateway_stats,   # Operator LLM stats
     execute_code_api,   # 👉 🚀 NEW: Imported the Docker Code Execution API
+    submit_code_job,    # Async execution: submit
+    code_job_status,    # Async execution: poll
+    code_queue_stats,   # Operator queue stats
 
     # 6. Admin Panel (Dashboard)
     admin_dashboard, 
@@ -81,7 +89,10 @@ from students.community_views import (
     get_student_info,
     delete_message,   # ADDED for Delete API
     edit_message,     # ADDED for Edit API
-    accept_bounty     #  NEW: ADDED for Bounty System API
+    accept_bounty,    #  NEW: ADDED for Bounty System API
+    chat_updates,     # Incremental message feed (since-cursor)
+    chat_stream,      # Live push channel (SSE)
+    chat_history      # Older messages on scroll-up (keyset pages)
 )
 
 urlpatterns = [
@@ -104,6 +115,8 @@ urlpatterns = [
     # 4. Student Dashboard & Features
     path('dashboard/', student_dashboard, name='dashboard'),
     path('profile/', profile_view, name='profile'), 
+    path('api/profile/activity/', activity_heatmap, name='activity_heatmap'),
+    path('api/leaderboard/', leaderboard_api, name='leaderboard_api'),
 
     # Courses
     path('courses/', all_courses, name='all_courses'),
@@ -126,6 +139,9 @@ urlpatterns = [
     
     #  9. ADVANCED COMMUNITY CHAT URLs 
     path('community/<slug:slug>/', course_community_chat, name='course_community_chat'),
+    path('api/chat/<slug:slug>/updates/', chat_updates, name='chat_updates'),
+    path('api/chat/<slug:slug>/stream/', chat_stream, name='chat_stream'),
+    path('api/chat/<slug:slug>/history/', chat_history, name='chat_history'),
     
     # AJAX APIs for Chat Features
     path('api/chat/pin/<int:message_id>/', toggle_pin_message, name='toggle_pin_message'),
@@ -141,10 +157,16 @@ urlpatterns = [
     
     #  NEW: Local Docker Code Execution API (THE MISSING LINK IS NOW HERE!)
     path('api/chat/execute-code/', execute_code_api, name='execute_code_api'),
+
+    #  Async Code Execution Jobs (submit, poll by id, operator stats)
+    path('api/code/jobs/', submit_code_job, name='submit_code_job'),
+    path('api/code/jobs/<str:job_id>/', code_job_status, name='code_job_status'),
+    path('api/code/queue-stats/', code_queue_stats, name='code_queue_stats'),
     
     # 👉 🚀 NEW: SYNTAX SINGULARITY (LeetCode Style AI Arena URLs)
     path('syntax-singularity/', syntax_singularity_view, name='syntax_singularity'),
     path('api/generate-challenge/', generate_ai_challenge, name='generate_challenge'),
+    path('api/generate-challenge/<int:problem_id>/status/', challenge_status, name='challenge_status'),
     path('api/submit-bounty/', submit_bounty_code, name='submit_bounty'), # 🚀 NEW: Added this route!
     
     # 5. Quiz & AI System
@@ -159,6 +181,8 @@ urlpatterns = [
     
     # AI Chatbot Endpoint
     path('api/ai-chat/', ai_chat, name='ai_chat'),
+    path('api/ai-chat/stream/', ai_chat_stream, name='ai_chat_stream'),
+    path('api/ai/stats/', ai_gateway_stats, name='ai_gateway_stats'),
 
     # 6. Admin Panel System
     path('admin-panel/', admin_dashboard, name='admin_dashboard'),
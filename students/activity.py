@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import BountySubmission, CoinEvent, DailyActivity, QuizResult
+
+# Days shown on the profile heatmap (52 weeks + today)
+HEATMAP_DAYS = 365
+
+COUNTERS = ('solves', 'coins', 'lessons', 'quizzes')
+
+
+def record_activity(user_id, day=None, **counts):
+    """
+    Adds to a user's counters for one day (default today), e.g. record_activity(user.id, solves=1, coins=50).
+    A single UPDATE with F() expressions, so concurrent requests never lose an increment.
+    """
+    counts = {field: n for field, n in counts.items() if n}
+    if not counts:
+        return
+    day = day or timezone.localdate()
+    rows = DailyActivity.objects.filter(user_id=user_id, date=day)
+    # update() skips auto_now, the ETag of the heatmap depends on updated_at
+    updates = {field: F(field) + n for field, n in counts.items()}
+    updates['updated_at'] = timezone.now()
+
+    if rows.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(user_id=user_id, date=day, **counts)
+    except IntegrityError:
+        # Another request created the day's row first
+        rows.update(**updates)
+
+
+def heatmap(user, days=HEATMAP_DAYS):
+    """ {'YYYY-MM-DD': {solves, coins, lessons, quizzes}} for the user's active days in the window (one range query). """
+    start = timezone.localdate() - timedelta(days=days - 1)
+    rows = DailyActivity.objects.filter(user=user, date__gte=start).order_by('date').values('date', *COUNTERS)
+    return {row.pop('date').isoformat(): row for row in rows}
+
+
+def heatmap_version(user):
+    """ Changes whenever one of the user's rollups does (and every day, as the window moves). """
+    last_change = DailyActivity.objects.filter(user=user).order_by('-updated_at').values_list('updated_at', flat=True).first()
+    return f"{user.pk}-{timezone.localdate():%Y%m%d}-{last_change.timestamp() if last_change else 0}"
+
+
+def rebuild_activity(user_id=None):
+    """
+    Recomputes the rollups from submissions, quiz results and the coin log (all users, or one).
+    Coins earned before the coin log existed are taken from the bounty submissions. Returns the row count.
+    """
+    def scoped(queryset, field='student'):
+        return queryset.filter(**{field: user_id}) if user_id else queryset
+
+    rollups = {}
+
+    def add(user, day, **counts):
+        row = rollups.setdefault((user, day), DailyActivity(user_id=user, date=day))
+        for field, n in counts.items():
+            setattr(row, field, getattr(row, field) + (n or 0))
+
+    solved = scoped(BountySubmission.objects.filter(earned_coins__gt=0))
+    for user, day, n in solved.annotate(day=TruncDate('submitted_at')).values('student', 'day').annotate(n=Count('id')).values_list('student', 'day', 'n'):
+        add(user, day, solves=n)
+
+    quizzes = scoped(QuizResult.objects.all())
+    for user, day, n in quizzes.annotate(day=TruncDate('taken_at')).values('student', 'day').annotate(n=Count('id')).values_list('student', 'day', 'n'):
+        add(user, day, quizzes=n)
+
+    earned = scoped(CoinEvent.objects.filter(amount__gt=0).exclude(reason__in=CoinEvent.BOOKKEEPING_REASONS), 'user')
+    earned = earned.annotate(day=TruncDate('created_at')).values('user', 'day').annotate(
+        coins=Sum('amount'), lessons=Count('id', filter=Q(reason=CoinEvent.REASON_LESSON))
+    )
+    for user, day, coins, lessons in earned.values_list('user', 'day', 'coins', 'lessons'):
+        add(user, day, coins=coins, lessons=lessons)
+
+    ledger_start = CoinEvent.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    older = solved.filter(submitted_at__lt=ledger_start) if ledger_start else solved
+    for user, day, coins in older.annotate(day=TruncDate('submitted_at')).values('student', 'day').annotate(coins=Sum('earned_coins')).values_list('student', 'day', 'coins'):
+        add(user, day, coins=coins)
+
+    with transaction.atomic():
+        scoped(DailyActivity.objects.all(), 'user').delete()
+        DailyActivity.objects.bulk_create(rollups.values(), batch_size=500)
+    return len(rollups)
+
+
+@receiver(post_save, sender=BountySubmission)
+def bounty_submitted(sender, instance, created, raw=False, **kwargs):
+    # Coins of the solve arrive through its CoinEvent
+    if created and not raw and instance.earned_coins > 0:
+        record_activity(instance.student_id, timezone.localdate(instance.submitted_at), solves=1)
+
+
+@receiver(post_save, sender=QuizResult)
+def quiz_taken(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_activity(instance.student_id, timezone.localdate(instance.taken_at), quizzes=1)
+
+
+@receiver(post_save, sender=CoinEvent)
+def coins_changed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.amount > 0 and instance.reason not in CoinEvent.BOOKKEEPING_REASONS:
+        record_activity(
+            instance.user_id, timezone.localdate(instance.created_at),
+            coins=instance.amount, lessons=int(instance.reason == CoinEvent.REASON_LESSON),
+        )
@@ -8,7 +8,8 @@ from .models import (
     # 🚀 NEW: IMPORT FACULTY AND AI BOUNTY MODELS HERE 
     FacultyProfile, LessonComment, DynamicBountyProblem, 
     ProblemTestCase, BountySubmission, MessageReaction,
-    AICodeSubmission, StudyRoadmap, ProctoringLog, AIVideoNote
+    AICodeSubmission, StudyRoadmap, ProctoringLog, AIVideoNote,
+    PooledBountyProblem, ScheduledTask, CoinEvent
 )
 
 # 1. Custom User Admin (Student/Teacher/Faculty Info)
@@ -125,6 +126,34 @@ class BountySubmissionAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     search_fields = ('student__username', 'problem__title')
 
+@admin.register(PooledBountyProblem)
+class PooledBountyProblemAdmin(admin.ModelAdmin):
+    list_display = ('title', 'language', 'topic_key', 'difficulty', 'created_at')
+    list_filter = ('language', 'difficulty')
+    search_fields = ('title', 'topic_key')
+
+@admin.register(ScheduledTask)
+class ScheduledTaskAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'run_at', 'attempts', 'group_key', 'created_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('group_key',)
+
+# Coin ledger: append-only audit trail, read-only here (balances change through students.coin_ledger)
+@admin.register(CoinEvent)
+class CoinEventAdmin(admin.ModelAdmin):
+    list_display = ('user', 'amount', 'reason', 'course', 'idempotency_key', 'created_at')
+    list_filter = ('reason',)
+    search_fields = ('user__username', 'idempotency_key')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # AI Feature Admins
 admin.site.register(AICodeSubmission)
 admin.site.register(StudyRoadmap)
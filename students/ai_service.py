@@ -1,40 +1,28 @@
-import os
-from groq import Groq
-from django.conf import settings
-from .models import Course  # Importing Course model to get real data
+from .llm_gateway import chat_completion, stream_chat_completion, LLMError
+from .course_index import relevant_course_context
+from .chat_memory import build_history, remember_turn, last_user_message
 
-def get_course_context():
+def get_course_context(question=''):
     """
-    Fetches course data from the database to give the AI 'Context'.
-    Includes: Title, Instructor (Faculty), Level, and Description.
+    Course data that gives the AI 'Context' (Title, Instructor (Faculty), Level, Description).
+    Only the courses most relevant to the question are included (BM25 over the catalog),
+    so the prompt stays the same size however many courses we have.
     """
-    courses = Course.objects.filter(is_published=True)
-    
-    if not courses.exists():
-        return "No specific course data is currently available on the platform."
-    
-    # Building the context string
-    # CRITICAL FIX: Added 'faculty_name' so AI knows the mentor.
-    course_list_text = "Here is the list of active courses on Learning-365:\n"
-    for c in courses:
-        course_list_text += f"- Course: '{c.title}' | Mentor: {c.faculty_name} | Level: {c.difficulty_level} | Description: {c.description[:150]}...\n"
-    
-    return course_list_text
+    return relevant_course_context(question)
 
-def generate_learning_assistant_response(user_message, chat_history=[]):
+AI_ERROR_REPLY = "I'm having a bit of trouble connecting to my brain right now! 🧠💥 Please try again in a moment."
+
+def build_assistant_messages(user_message, chat_history=[], conversation_id=None):
     """
-    Generates a response using Llama 3 with Memory and Database Context.
+    Builds the message chain (system prompt with course context + history + user message).
+    History comes from the client or from the conversation stored server-side.
     """
     
-    # 1. Initialize Groq Client
-    client = Groq(
-        api_key=settings.GROQ_API_KEY, 
-    )
+    # 1. Get Real-time Data (Context), retrieved for this question (+ the previous one for follow-ups)
+    previous_question = last_user_message(conversation_id, chat_history)
+    db_context = get_course_context(f"{previous_question} {user_message}")
 
-    # 2. Get Real-time Data (Context)
-    db_context = get_course_context()
-
-    # 3. The "Next Level" System Prompt (Updated for Friendly Persona)
+    # 2. The "Next Level" System Prompt (Updated for Friendly Persona)
     system_prompt = f"""
     ROLE & PERSONA:
     You are 'Learning-365 AI', a super friendly, enthusiastic, and expert coding mentor.
@@ -56,28 +44,66 @@ def generate_learning_assistant_response(user_message, chat_history=[]):
     4. **Tone:** Encouraging, clear, and beginner-friendly. Keep answers concise unless asked for detailed code.
     """
 
-    # 4. Construct Message Chain (System + History + User)
+    # 3. Construct Message Chain (System + History + User)
     messages = [{"role": "system", "content": system_prompt}]
     
     # Append History (Fixes the "Forgetting" issue)
-    # We take the last 6 messages to keep context without exceeding token limits
-    for msg in chat_history[-6:]:
-        messages.append(msg)
+    # Newest turns that fit the token budget; older ones arrive as a short rolling summary
+    messages += build_history(conversation_id, chat_history)
 
     # Append Current User Message
     messages.append({"role": "user", "content": user_message})
 
+    return messages
+
+def generate_learning_assistant_response(user_message, chat_history=[], user_id=None, conversation_id=None):
+    """
+    Generates a response using Llama 3 with Memory and Database Context.
+    """
+    messages = build_assistant_messages(user_message, chat_history, conversation_id)
+
     try:
-        # 5. Call AI API
-        chat_completion = client.chat.completions.create(
+        # Call AI API (shared keep-alive session, timeout + retries)
+        reply = chat_completion(
             messages=messages,
             # UPDATE: Changed to the latest supported model
             model="llama-3.3-70b-versatile", 
             temperature=0.7,         
             max_tokens=400,
+            timeout=20,
+            feature='ai_chat',
+            user_id=user_id,
         )
-        return chat_completion.choices[0].message.content
 
-    except Exception as e:
+    except LLMError as e:
         print(f"AI Error: {e}")
-        return "I'm having a bit of trouble connecting to my brain right now! 🧠💥 Please try again in a moment."
\ No newline at end of file
+        return AI_ERROR_REPLY
+
+    remember_turn(conversation_id, user_message, reply)
+    return reply
+
+def stream_learning_assistant_response(user_message, chat_history=[], user_id=None, conversation_id=None):
+    """
+    Same as generate_learning_assistant_response, but yields the reply chunk by chunk
+    as Groq generates it. On failure the friendly error text is yielded instead.
+    """
+    messages = build_assistant_messages(user_message, chat_history, conversation_id)
+    parts = []
+    try:
+        for chunk in stream_chat_completion(
+            messages=messages,
+            model="llama-3.3-70b-versatile",
+            temperature=0.7,
+            max_tokens=400,
+            timeout=20,
+            feature='ai_chat',
+            user_id=user_id,
+        ):
+            parts.append(chunk)
+            yield chunk
+    except LLMError as e:
+        print(f"AI Stream Error: {e}")
+        yield ("\n\n" if parts else "") + AI_ERROR_REPLY
+        return
+
+    remember_turn(conversation_id, user_message, ''.join(parts))
@@ -1,27 +1,23 @@
-import os
 import json
 import PyPDF2
 import docx
-from groq import Groq
 from dotenv import load_dotenv
+from .llm_gateway import chat_completion, LLMError
 
 # Load .env file
 load_dotenv()
 
-# Initialize Groq Client
-client = Groq(
-    api_key=os.environ.get("GROQ_API_KEY"),
-)
-
 # 1. CORE AI COMMUNICATOR (The Brain)
 
-def get_groq_response(system_instruction, user_message):
+def get_groq_response(system_instruction, user_message, feature=None, user_id=None):
     """
-    Sends data to Groq API and retrieves the AI response.
+    Sends data to Groq (through the shared LLM gateway) and retrieves the AI response.
     Updated Model: llama-3.3-70b-versatile (Latest Supported)
+    `feature` opts the call into the LLM response cache (see llm_cache.LLM_CACHE_POLICIES)
+    and sets its scheduling priority; `user_id` counts it against that user's quota.
     """
     try:
-        chat_completion = client.chat.completions.create(
+        return chat_completion(
             messages=[
                 {
                     "role": "system",
@@ -36,9 +32,11 @@ def get_groq_response(system_instruction, user_message):
             model="llama-3.3-70b-versatile", 
             temperature=0.5,
             max_tokens=1024,
+            timeout=60,
+            feature=feature,
+            user_id=user_id,
         )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
+    except LLMError as e:
         print(f"Error in Groq API: {e}")
         return "I am having trouble connecting to the brain right now. Please try again later."
 
@@ -77,7 +75,7 @@ def extract_text_from_file(file_path):
 
 # 3. AI QUIZ GENERATOR (Powered by Groq)
 
-def generate_quiz_from_text(text, num_questions=5):
+def generate_quiz_from_text(text, num_questions=5, user_id=None):
     """
     Uses Groq AI to generate a JSON quiz from the provided text.
     """
@@ -102,7 +100,7 @@ def generate_quiz_from_text(text, num_questions=5):
     
     try:
         # Call AI
-        response = get_groq_response(system_prompt, f"Generate quiz from this text:\n\n{safe_text}")
+        response = get_groq_response(system_prompt, f"Generate quiz from this text:\n\n{safe_text}", feature='quiz_generation', user_id=user_id)
         
         # Clean up response (sometimes AI adds markdown backticks)
         clean_response = response.replace('```json', '').replace('```', '').strip()
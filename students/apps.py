@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class StudentsConfig(AppConfig):
     name = 'students'
+
+    def ready(self):
+        # Registers the signal receivers that write the community chat change log
+        from . import chat_events  # noqa: F401
+        # ... and the chat search index
+        from . import chat_search  # noqa: F401
+        # ... and the one that keeps the leaderboard sorted as balances change
+        from . import leaderboard  # noqa: F401
+        # ... and the daily activity rollups behind the profile heatmap
+        from . import activity  # noqa: F401
+        # ... and the one that books new accounts' starting coins in the ledger
+        from . import coin_ledger  # noqa: F401
@@ -0,0 +1,350 @@
+import re
+import json
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .llm_gateway import complete, strip_fences, LLMError
+from .judge import judge_code, JudgeError, ACCEPTED
+from .models import DynamicBountyProblem, ProblemTestCase, PooledBountyProblem
+from .worker_pool import BoundedWorkerPool
+
+# Pool sizing per (language, topic, difficulty): refill below LOW_WATER, up to HIGH_WATER
+BOUNTY_POOL_LOW_WATER = getattr(settings, 'BOUNTY_POOL_LOW_WATER', 2)
+BOUNTY_POOL_HIGH_WATER = getattr(settings, 'BOUNTY_POOL_HIGH_WATER', 5)
+# A topic is only pooled once it has been requested this many times in a day
+BOUNTY_POOL_MIN_DEMAND = getattr(settings, 'BOUNTY_POOL_MIN_DEMAND', 3)
+
+DEMAND_CACHE_PREFIX = 'bounty_demand:'
+DEMAND_WINDOW = 60 * 60 * 24
+REFILL_LOCK_PREFIX = 'bounty_refill:'
+# A refill that dies without releasing its lock blocks the key for at most this long
+REFILL_LOCK_TTL = 60 * 10
+
+# Problems need at least this many test cases, with both visible and hidden ones
+MIN_TEST_CASES = 3
+
+# Background generation is slow (one LLM call + one sandbox run per problem), keep it small
+refill_pool = BoundedWorkerPool(name='bounty-pool', max_workers=2, max_queue=20)
+# Live problems are checked on their own workers so a long refill never delays a student's problem
+verify_pool = BoundedWorkerPool(name='bounty-verify', max_workers=2, max_queue=20)
+
+_Case = namedtuple('_Case', 'input_data expected_output is_hidden')
+
+
+def call_groq(prompt, temperature, timeout=20, feature=None, user_id=None):
+    """ Sends one prompt through the LLM gateway and returns the reply with markdown fences stripped. """
+    return strip_fences(complete(prompt, temperature=temperature, timeout=timeout, feature=feature, user_id=user_id))
+
+
+# 1. PROBLEM GENERATION + VALIDATION
+
+def normalize_topic(topic):
+    """ 'Binary  Search!!' and 'binary search' share one pool. """
+    topic = re.sub(r'[^a-z0-9+#]+', ' ', (topic or '').lower())
+    return ' '.join(topic.split())[:100] or 'logic'
+
+
+def bounty_coins_for(difficulty):
+    return 10 if difficulty == 'Easy' else (30 if difficulty == 'Medium' else 100)
+
+
+def _problem_prompt(language, topic, difficulty, with_solution):
+    solution_field = ''
+    solution_rule = ''
+    if with_solution:
+        solution_field = f'\n                "reference_solution": "A complete, correct {language} program that passes every test case.",'
+        solution_rule = '\n            Also write `reference_solution`: a full working program. It is never shown to the student and is used to verify your test cases.\n'
+
+    return f"""
+            You are ARIS, an advanced AI system. Generate a coding problem for a student.
+            Language: {language}
+            Topic: {topic}
+            Difficulty: {difficulty}
+
+            The student's program reads its input from standard input (stdin) and prints the answer to standard output (stdout).
+            The description MUST explain the exact input format and output format.
+
+            CRITICAL INSTRUCTION FOR `base_code`:
+            You MUST NOT provide the solution. Provide ONLY the template for the student to start with: read the input, call an empty function, print its result. The function body MUST be empty (use `pass` in Python, or empty brackets `{{}}` in other languages). DO NOT write the actual logic.
+
+            Also write 6 test cases with the exact stdin text and the exact expected stdout text.
+            The first 2 are shown to the student ("hidden": false), the rest are hidden ("hidden": true).
+            {solution_rule}
+            Return ONLY a valid JSON object without markdown tags:
+            {{
+                "title": "A short engaging title",
+                "description": "Clear problem statement, input format, output format and constraints.",
+                "base_code": "def solve(arr):\\n    # Write your logic here\\n    pass\\n\\narr = list(map(int, input().split()))\\nprint(solve(arr))",{solution_field}
+                "test_cases": [
+                    {{"input": "1 2 3", "output": "6", "hidden": false}}
+                ]
+            }}
+            """
+
+
+def generate_problem_data(language, topic, difficulty, with_solution=False, timeout=30, user_id=None, feature='challenge_generation'):
+    """
+    Asks the AI for a new problem. Returns the parsed dict.
+    `feature` picks the scheduler lane and cache policy: 'challenge_generation' for a student
+    waiting on the page, 'bounty_pool_refill' for background pool work.
+    Raises LLMError on API errors and ValueError on unusable JSON.
+    """
+    content = call_groq(_problem_prompt(language, topic, difficulty, with_solution), temperature=0.5, timeout=timeout, feature=feature, user_id=user_id)
+    try:
+        problem_data = json.loads(content)
+    except json.JSONDecodeError:
+        raise ValueError('AI generated invalid JSON. Try again.')
+    if not isinstance(problem_data, dict) or not problem_data.get('title') or not problem_data.get('description'):
+        raise ValueError('AI generated an incomplete problem. Try again.')
+    return problem_data
+
+
+def clean_test_cases(problem_data):
+    """ Keeps only well-formed test cases, as plain {'input', 'output', 'hidden'} dicts. """
+    return [
+        {'input': str(case['input']), 'output': str(case['output']), 'hidden': bool(case.get('hidden', True))}
+        for case in problem_data.get('test_cases', [])
+        if isinstance(case, dict) and 'input' in case and 'output' in case
+    ]
+
+
+def validate_problem_data(language, problem_data):
+    """
+    Checks a generated problem before it may enter the pool:
+    enough visible + hidden test cases, a starter template, and a reference solution
+    that actually passes every case in the sandbox. Returns an error message or None.
+    """
+    cases = clean_test_cases(problem_data)
+    if len(cases) < MIN_TEST_CASES:
+        return f"only {len(cases)} usable test cases"
+    if all(c['hidden'] for c in cases) or not any(c['hidden'] for c in cases):
+        return "needs both visible and hidden test cases"
+    if not problem_data.get('base_code'):
+        return "missing base_code"
+
+    solution = problem_data.get('reference_solution')
+    if not solution:
+        return "missing reference_solution"
+    try:
+        results = judge_code(language, solution, [_Case(c['input'], c['output'], c['hidden']) for c in cases])
+    except JudgeError as e:
+        return f"sandbox unavailable ({e})"
+    if results['verdict'] != ACCEPTED:
+        return f"reference solution got {results['verdict']} ({results['passed']}/{results['total']})"
+    return None
+
+
+def _save_test_cases(problem, problem_data):
+    ProblemTestCase.objects.bulk_create([
+        ProblemTestCase(problem=problem, input_data=c['input'], expected_output=c['output'], is_hidden=c['hidden'])
+        for c in clean_test_cases(problem_data)
+    ])
+
+
+def create_problem_for_student(student, course, language, topic, difficulty, problem_data, verification=DynamicBountyProblem.VERIFICATION_VERIFIED):
+    """
+    Saves a DynamicBountyProblem for the student from generated or pooled data.
+    Only a verified problem gets its test cases and coins; a pending one gets them once
+    verify_live_problem accepts it, a failed one stays practice with AI feedback only.
+    """
+    verified = verification == DynamicBountyProblem.VERIFICATION_VERIFIED
+    problem = DynamicBountyProblem.objects.create(
+        student=student, course=course, language=language,
+        topic=topic, difficulty=difficulty, title=problem_data['title'],
+        description=problem_data['description'], base_code=problem_data.get('base_code', ''),
+        base_bounty_coins=bounty_coins_for(difficulty) if verified else 0,
+        verification=verification,
+    )
+    if verified:
+        _save_test_cases(problem, problem_data)
+    return problem
+
+
+def verify_live_problem(problem_id, problem_data):
+    """
+    Runs the reference solution of a live-generated problem in the sandbox and, when it passes,
+    attaches the test cases and the coin reward. Returns the final verification state.
+    """
+    problem = DynamicBountyProblem.objects.filter(id=problem_id, verification=DynamicBountyProblem.VERIFICATION_PENDING).first()
+    if problem is None:
+        return None
+
+    error = validate_problem_data(problem.language, problem_data)
+    if error:
+        print(f"Bounty Live Problem Not Verified ({problem.language}:{problem.difficulty}:{normalize_topic(problem.topic)}): {error}")
+        DynamicBountyProblem.objects.filter(id=problem_id).update(verification=DynamicBountyProblem.VERIFICATION_FAILED)
+        return DynamicBountyProblem.VERIFICATION_FAILED
+
+    with transaction.atomic():
+        _save_test_cases(problem, problem_data)
+        DynamicBountyProblem.objects.filter(id=problem_id).update(
+            verification=DynamicBountyProblem.VERIFICATION_VERIFIED,
+            base_bounty_coins=bounty_coins_for(problem.difficulty),
+        )
+    return DynamicBountyProblem.VERIFICATION_VERIFIED
+
+
+def _verify_job(problem_id, problem_data):
+    try:
+        verify_live_problem(problem_id, problem_data)
+    except Exception as e:
+        print(f"Bounty Verification Error: {e}")
+        DynamicBountyProblem.objects.filter(
+            id=problem_id, verification=DynamicBountyProblem.VERIFICATION_PENDING
+        ).update(verification=DynamicBountyProblem.VERIFICATION_FAILED)
+    finally:
+        connection.close()
+
+
+def schedule_verification(problem, problem_data):
+    """
+    Queues the sandbox check of a pending live problem. With a full queue the problem
+    is marked failed at once (practice only) instead of staying pending forever.
+    """
+    if verify_pool.submit(_verify_job, problem.id, problem_data) is None:
+        DynamicBountyProblem.objects.filter(id=problem.id).update(verification=DynamicBountyProblem.VERIFICATION_FAILED)
+        problem.verification = DynamicBountyProblem.VERIFICATION_FAILED
+        return False
+    return True
+
+
+# 2. PRE-GENERATED PROBLEM POOL
+
+def _pool_key(language, topic_key, difficulty):
+    # Also a cache key suffix: no spaces (memcached refuses them)
+    return f"{language}:{difficulty}:{topic_key}".replace(' ', '_')
+
+
+def record_demand(language, topic_key, difficulty):
+    """ Counts a request for this combination (rolling day window). Returns the new count. """
+    key = DEMAND_CACHE_PREFIX + _pool_key(language, topic_key, difficulty)
+    cache.add(key, 0, DEMAND_WINDOW)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, DEMAND_WINDOW)
+        return 1
+
+
+def take_pooled_problem(language, topic_key, difficulty):
+    """
+    Claims the oldest pooled problem for this combination, or returns None.
+    The claim is the DELETE itself, so two students never get the same row.
+    """
+    for _ in range(3):
+        pooled = PooledBountyProblem.objects.filter(
+            language=language, topic_key=topic_key, difficulty=difficulty
+        ).first()
+        if pooled is None:
+            return None
+        deleted, _ = PooledBountyProblem.objects.filter(id=pooled.id).delete()
+        if deleted:
+            return pooled
+    return None
+
+
+def pool_size(language, topic_key, difficulty):
+    return PooledBountyProblem.objects.filter(language=language, topic_key=topic_key, difficulty=difficulty).count()
+
+
+def fill_pool(language, topic_key, difficulty, target=None):
+    """
+    Generates and validates problems until the pool holds `target` of them.
+    Gives up after a few rejected attempts so a bad topic can't burn API quota forever.
+    Returns the number of problems added.
+    """
+    target = target or BOUNTY_POOL_HIGH_WATER
+    missing = target - pool_size(language, topic_key, difficulty)
+    added = 0
+    attempts = 0
+    while added < missing and attempts < missing * 2:
+        attempts += 1
+        try:
+            problem_data = generate_problem_data(language, topic_key, difficulty, with_solution=True, timeout=60, feature='bounty_pool_refill')
+        except (ValueError, LLMError) as e:
+            print(f"Bounty Pool Generation Error: {e}")
+            continue
+
+        error = validate_problem_data(language, problem_data)
+        if error:
+            print(f"Bounty Pool Rejected Problem ({_pool_key(language, topic_key, difficulty)}): {error}")
+            continue
+
+        PooledBountyProblem.objects.create(
+            language=language, topic_key=topic_key, difficulty=difficulty,
+            title=problem_data['title'], description=problem_data['description'],
+            base_code=problem_data['base_code'], test_cases=clean_test_cases(problem_data),
+        )
+        added += 1
+    return added
+
+
+def _refill_job(language, topic_key, difficulty, lock_key):
+    try:
+        fill_pool(language, topic_key, difficulty)
+    except Exception as e:
+        print(f"Bounty Pool Refill Error: {e}")
+    finally:
+        cache.delete(lock_key)
+        # Worker threads get their own DB connection, don't leak it
+        connection.close()
+
+
+def schedule_refill(language, topic_key, difficulty):
+    """ Queues a background refill unless one is already running for this combination. """
+    lock_key = REFILL_LOCK_PREFIX + _pool_key(language, topic_key, difficulty)
+    if not cache.add(lock_key, 1, REFILL_LOCK_TTL):
+        return False
+    if refill_pool.submit(_refill_job, language, topic_key, difficulty, lock_key) is None:
+        cache.delete(lock_key)
+        return False
+    return True
+
+
+def serve_problem_from_pool(language, topic, difficulty):
+    """
+    Returns problem data ready for create_problem_for_student from the pool, or None
+    (cold / uncommon topic -> caller generates live). Refills popular combinations in the background.
+    """
+    topic_key = normalize_topic(topic)
+    demand = record_demand(language, topic_key, difficulty)
+
+    pooled = take_pooled_problem(language, topic_key, difficulty)
+    if demand >= BOUNTY_POOL_MIN_DEMAND and pool_size(language, topic_key, difficulty) < BOUNTY_POOL_LOW_WATER:
+        schedule_refill(language, topic_key, difficulty)
+
+    if pooled is None:
+        return None
+    return {
+        'title': pooled.title,
+        'description': pooled.description,
+        'base_code': pooled.base_code,
+        'test_cases': pooled.test_cases,
+    }
+
+
+def popular_pool_keys(days=7, min_requests=None):
+    """ (language, topic_key, difficulty) combinations students asked for at least min_requests times recently. """
+    min_requests = min_requests or BOUNTY_POOL_MIN_DEMAND
+    since = timezone.now() - timedelta(days=days)
+    counts = Counter(
+        (language, normalize_topic(topic), difficulty)
+        for language, topic, difficulty in DynamicBountyProblem.objects.filter(
+            created_at__gte=since
+        ).values_list('language', 'topic', 'difficulty')
+    )
+    return [key for key, count in counts.most_common() if count >= min_requests]
+
+
+def bounty_pool_stats():
+    return {
+        'pooled_problems': PooledBountyProblem.objects.count(),
+        'refill_workers': refill_pool.stats(),
+        'verify_workers': verify_pool.stats(),
+    }
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Events buffered per connected page; a page that falls further behind is disconnected and catches up on reconnect
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """ One open stream. Events are handed to its event loop from whatever thread published them. """
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event):
+        # Runs on the subscription's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow: drop the backlog and end the stream (None); the page reloads its state on reconnect
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Pub/sub between the code that saves chat changes and the open chat streams of this process.
+    A shared backend (e.g. Redis) can replace it via CHAT_BROKER_BACKEND by providing the same
+    subscribe(channel) / unsubscribe(subscription) / publish(channel, event) / has_subscribers(channel)
+    / stats() methods.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, channel):
+        """ Must be called from the event loop that will read the subscription. """
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        """ Safe to call from any thread (request threads, worker pools). Never blocks. """
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self.published += 1
+            self.delivered += len(subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Its event loop is already closed
+                self.unsubscribe(subscription)
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._channels.get(channel))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'in-process',
+                'channels': len(self._channels),
+                'subscribers': sum(len(s) for s in self._channels.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+            }
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'CHAT_BROKER_BACKEND', 'students.chat_broker.InProcessBroker')
+                _broker = import_string(backend)()
+    return _broker
+
+
+def course_channel(course_id):
+    return f"course:{course_id}"
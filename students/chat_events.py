@@ -0,0 +1,232 @@
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .chat_broker import get_broker, course_channel
+from .models import Course, CourseChatEvent, CourseGroupMessage, MessageReaction, Enrollment
+
+# At most this many events are returned per poll (the client asks again when has_more is set)
+EVENTS_PER_POLL = 200
+# Change log rows older than this are deleted by the background worker
+KEEP_EVENTS = timedelta(days=2)
+# How often the poller reads the log of courses with open streams, for changes saved by other processes
+POLL_INTERVAL = 2
+
+# Event kinds that carry no message (the member list or the course itself changed)
+PAGE_KINDS = (CourseChatEvent.KIND_MEMBERS, CourseChatEvent.KIND_COURSE)
+
+
+def chat_version(slug):
+    """
+    Per-course token that changes with anything shown in the chat; drives the chat's ETags.
+    It is the id of the course's newest change-log row, so every process (web workers, the
+    background worker, the shell) sees the same version, and ids never come back.
+    One indexed query by slug.
+    """
+    return CourseChatEvent.objects.filter(course__slug=slug).aggregate(version=Max('id'))['version'] or 0
+
+
+def latest_cursor(course_id):
+    """ Id of the course's newest chat event (0 if there is none yet). """
+    return CourseChatEvent.objects.filter(course_id=course_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def cursor_expired(since):
+    """ True when events after `since` may already have been purged (the client has to reload). """
+    oldest = CourseChatEvent.objects.order_by('id').values_list('id', flat=True).first()
+    return bool(since and oldest and since < oldest - 1)
+
+
+def changes_since(course_id, since):
+    """
+    Messages created/changed (oldest first, each with `change_kind`: KIND_MESSAGE for new ones,
+    KIND_UPDATE otherwise) and ids deleted after the cursor, read from the change log.
+    The work done depends on the amount of new activity, not on the size of the chat.
+    """
+    events = list(
+        CourseChatEvent.objects.filter(course_id=course_id, id__gt=since)
+        .order_by('id').values_list('id', 'kind', 'message_id')[:EVENTS_PER_POLL]
+    )
+    deleted = {message_id for _, kind, message_id in events if kind == CourseChatEvent.KIND_DELETE}
+    created = {message_id for _, kind, message_id in events if kind == CourseChatEvent.KIND_MESSAGE}
+    changed = {
+        message_id for _, kind, message_id in events if kind != CourseChatEvent.KIND_DELETE and kind not in PAGE_KINDS
+    } - deleted
+
+    chat_messages = list(
+        CourseGroupMessage.objects.filter(course_id=course_id, id__in=changed)
+        .select_related('sender', 'reply_to__sender', 'bounty_winner').order_by('id')
+    )
+    attach_reactions(chat_messages)
+    # The page appends new messages and only replaces ones it has rendered: edits and reactions
+    # of a message it never loaded (older than its first page) must not show up at the bottom
+    for msg in chat_messages:
+        msg.change_kind = CourseChatEvent.KIND_MESSAGE if msg.id in created else CourseChatEvent.KIND_UPDATE
+
+    return {
+        'cursor': events[-1][0] if events else since,
+        'messages': chat_messages,
+        'deleted': sorted(deleted),
+        'has_more': len(events) == EVENTS_PER_POLL,
+        'changed': bool(events),
+    }
+
+
+def attach_reactions(chat_messages):
+    """
+    Sets msg.reactors ({reaction type: [reactor names]}) for the chat template.
+    One query for the whole page, however many messages and reactions it has.
+    """
+    reactors = {msg.id: {} for msg in chat_messages}
+    rows = (
+        MessageReaction.objects.filter(message_id__in=reactors).order_by('created_at')
+        .values_list('message_id', 'reaction_type', 'user__first_name', 'user__username')
+    )
+    for message_id, reaction_type, first_name, username in rows:
+        reactors[message_id].setdefault(reaction_type, []).append(first_name or username)
+    for msg in chat_messages:
+        msg.reactors = reactors[msg.id]
+
+
+def purge_old_events():
+    # Each course keeps its newest row: it is the course's chat version
+    newest = CourseChatEvent.objects.values('course').annotate(newest=Max('id')).values('newest')
+    return CourseChatEvent.objects.filter(created_at__lt=timezone.now() - KEEP_EVENTS).exclude(id__in=newest).delete()[0]
+
+
+def events_after(course_id, cursor):
+    """ Change log rows after the cursor as stream notices (at most EVENTS_PER_POLL). """
+    rows = (
+        CourseChatEvent.objects.filter(course_id=course_id, id__gt=cursor)
+        .order_by('id').values_list('id', 'kind', 'message_id')[:EVENTS_PER_POLL]
+    )
+    return [{'cursor': event_id, 'kind': kind, 'message_id': message_id} for event_id, kind, message_id in rows]
+
+
+class ChangeLogPoller:
+    """
+    Feeds the open chat streams of this process. One thread reads the change log of every course
+    that has a stream open (one indexed query per course per POLL_INTERVAL, however many pages are
+    open) and publishes the new events into the broker; streams only wait on their subscription.
+    The log is the source of truth, so changes saved by other processes (the background worker,
+    other web workers) arrive too. A change committed in this process pokes its course to be read at once.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._cursors = {}  # course id -> last event published
+        self._due = set()   # courses to read before the interval is over
+        self._wake = threading.Event()
+        self._thread = None
+        self.polls = 0
+
+    def watch(self, course_id, cursor):
+        """ Called by a stream after it subscribed. Starts the thread on first use. """
+        with self._lock:
+            self._cursors.setdefault(course_id, cursor)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-log-poller', daemon=True)
+                self._thread.start()
+
+    def poke(self, course_id):
+        with self._lock:
+            if course_id not in self._cursors:
+                return
+            self._due.add(course_id)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            poked = self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.poll(only_due=poked)
+            except Exception as e:
+                print(f"Chat Poller Error: {e}")
+            finally:
+                close_old_connections()
+
+    def poll(self, only_due=False):
+        """ One round: publishes new events, and stops watching courses whose streams are all closed. """
+        broker = get_broker()
+        with self._lock:
+            for course_id in list(self._cursors):
+                # Checked under the lock: a stream that subscribes now calls watch() after this and re-adds it
+                if not broker.has_subscribers(course_channel(course_id)):
+                    del self._cursors[course_id]
+                    self._due.discard(course_id)
+            courses = dict(self._cursors)
+            if only_due:
+                courses = {course_id: cursor for course_id, cursor in courses.items() if course_id in self._due}
+            self._due.difference_update(courses)
+            self.polls += len(courses)
+
+        for course_id, cursor in courses.items():
+            events = events_after(course_id, cursor)
+            for event in events:
+                broker.publish(course_channel(course_id), event)
+            if events:
+                with self._lock:
+                    if course_id in self._cursors:
+                        self._cursors[course_id] = max(self._cursors[course_id], events[-1]['cursor'])
+                if len(events) == EVENTS_PER_POLL:
+                    self.poke(course_id)
+
+    def stats(self):
+        with self._lock:
+            return {'watched_courses': len(self._cursors), 'polls': self.polls}
+
+
+poller = ChangeLogPoller()
+
+
+def _record(course_id, kind, message_id):
+    CourseChatEvent.objects.create(course_id=course_id, kind=kind, message_id=message_id)
+    # The new row already changes the chat version; open chat pages are told once it is visible to the poller
+    transaction.on_commit(lambda: poller.poke(course_id))
+
+
+def _deleting_course(origin):
+    # The whole course (and its change log) is going away: a new event would point at a deleted course
+    return isinstance(origin, Course) or getattr(origin, 'model', None) is Course
+
+
+@receiver(post_save, sender=CourseGroupMessage)
+def message_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        _record(instance.course_id, CourseChatEvent.KIND_MESSAGE if created else CourseChatEvent.KIND_UPDATE, instance.id)
+
+
+@receiver(post_delete, sender=CourseGroupMessage)
+def message_deleted(sender, instance, origin=None, **kwargs):
+    if not _deleting_course(origin):
+        _record(instance.course_id, CourseChatEvent.KIND_DELETE, instance.id)
+
+
+@receiver([post_save, post_delete], sender=MessageReaction)
+def reaction_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleting_course(origin):
+        return
+    course_id = CourseGroupMessage.objects.filter(id=instance.message_id).values_list('course_id', flat=True).first()
+    # No course: the message itself is being deleted, its own delete event covers it
+    if course_id:
+        _record(course_id, CourseChatEvent.KIND_REACTION, instance.message_id)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def members_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # The member list is part of the chat page (progress updates re-save enrollments: only joins/leaves count)
+    if not raw and kwargs.get('created', True) and not _deleting_course(origin):
+        _record(instance.course_id, CourseChatEvent.KIND_MEMBERS, 0)
+
+
+@receiver(post_save, sender=Course)
+def course_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _record(instance.id, CourseChatEvent.KIND_COURSE, 0)
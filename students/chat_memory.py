@@ -0,0 +1,113 @@
+import re
+
+from django.core.cache import cache
+
+# Conversation state (recent turns + rolling summary) is kept server-side per conversation
+CONVERSATION_CACHE_PREFIX = 'ai_conversation:'
+CONVERSATION_TTL = 60 * 60 * 2
+
+# Prompt budget for the conversation, in estimated tokens
+HISTORY_TOKEN_BUDGET = 1200
+SUMMARY_TOKEN_BUDGET = 300
+# A single pasted wall of code may not eat the whole budget: longer turns keep their head and tail
+MESSAGE_TOKEN_CAP = 400
+# Characters of each folded turn that make it into the summary
+SUMMARY_LINE_CHARS = 160
+
+# Roughly how BPE tokenizers split text: words, numbers and single symbols
+TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """ Local token estimate (no tokenizer download): word pieces and symbols, long words count double. """
+    return sum(1 if len(piece) <= 8 else 2 for piece in TOKEN_PIECE_RE.findall(text or ''))
+
+
+def _trim_message(content):
+    """ Keeps the start and end of an over-long message within MESSAGE_TOKEN_CAP. """
+    tokens = count_tokens(content)
+    if tokens <= MESSAGE_TOKEN_CAP:
+        return content
+    # Cut proportionally: the message's own characters per token decide how much each half keeps
+    keep = len(content) * MESSAGE_TOKEN_CAP // (2 * tokens)
+    if len(content) <= 2 * keep:
+        return content
+    return f"{content[:keep]}\n...[{len(content) - 2 * keep} characters trimmed]...\n{content[-keep:]}"
+
+
+def _summary_line(message):
+    text = ' '.join(str(message.get('content', '')).split())
+    first_sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0][:SUMMARY_LINE_CHARS]
+    who = 'Student asked' if message.get('role') == 'user' else 'Assistant answered'
+    return f"- {who}: {first_sentence}"
+
+
+def _fold(summary, folded_messages):
+    """ Adds folded turns to the rolling summary, dropping its oldest lines beyond the budget. """
+    lines = [line for line in summary.split('\n') if line] + [_summary_line(m) for m in folded_messages]
+    while lines and count_tokens('\n'.join(lines)) > SUMMARY_TOKEN_BUDGET:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def _split_by_budget(messages, budget):
+    """ (older messages that don't fit, newest messages that fit into the budget). """
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        cost = count_tokens(message['content']) + 4  # role/formatting overhead
+        if used + cost > budget and kept:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    return messages[:len(messages) - len(kept)], kept
+
+
+def _clean(chat_history):
+    return [
+        {'role': m['role'], 'content': _trim_message(str(m.get('content', '')))}
+        for m in chat_history
+        if isinstance(m, dict) and m.get('role') in ('user', 'assistant') and m.get('content')
+    ]
+
+
+def _load(conversation_id):
+    if not conversation_id:
+        return {'summary': '', 'turns': []}
+    return cache.get(CONVERSATION_CACHE_PREFIX + conversation_id) or {'summary': '', 'turns': []}
+
+
+def build_history(conversation_id=None, chat_history=None):
+    """
+    Conversation messages for the prompt, within HISTORY_TOKEN_BUDGET.
+    Uses the history the client sent if any, otherwise the turns stored for the conversation.
+    Turns that don't fit are represented by the rolling summary (one system message).
+    """
+    state = _load(conversation_id)
+    turns = _clean(chat_history) if chat_history else state['turns']
+
+    folded, kept = _split_by_budget(turns, HISTORY_TOKEN_BUDGET)
+    summary = _fold(state['summary'], folded) if folded else state['summary']
+
+    messages = []
+    if summary:
+        messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"})
+    return messages + kept
+
+
+def remember_turn(conversation_id, user_message, reply):
+    """ Stores the exchange; turns beyond the budget are folded into the summary right away. """
+    if not conversation_id:
+        return
+    state = _load(conversation_id)
+    turns = state['turns'] + _clean([{'role': 'user', 'content': user_message}, {'role': 'assistant', 'content': reply}])
+
+    folded, kept = _split_by_budget(turns, HISTORY_TOKEN_BUDGET)
+    state = {'summary': _fold(state['summary'], folded) if folded else state['summary'], 'turns': kept}
+    cache.set(CONVERSATION_CACHE_PREFIX + conversation_id, state, CONVERSATION_TTL)
+
+
+def last_user_message(conversation_id=None, chat_history=None):
+    turns = _clean(chat_history) if chat_history else _load(conversation_id)['turns']
+    return next((m['content'] for m in reversed(turns) if m['role'] == 'user'), '')
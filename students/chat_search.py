@@ -0,0 +1,154 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import CourseGroupMessage
+
+# SQLite FTS5 table (created by migration 0015 when the SQLite build supports FTS5).
+# rowid = message id; the `course` column holds one token ("course<id>") so the course filter is part of the MATCH.
+FTS_TABLE = 'chat_message_fts'
+
+SEARCH_LIMIT = 50
+# Words of context around the matches in a result snippet
+SNIPPET_WORDS = 16
+
+# Highlight markers FTS5 puts around matched words; swapped for <mark> after escaping the snippet
+_HL_START = '\x02'
+_HL_END = '\x03'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def sender_name(msg):
+    return f"{msg.sender.first_name or ''} {msg.sender.username}".strip()
+
+
+def course_token(course_id):
+    return f"course{course_id}"
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_HL_START, '<mark>').replace(_HL_END, '</mark>'))
+
+
+class SqliteFTSBackend:
+    """
+    Inverted index in an FTS5 virtual table: BM25-ranked, prefix-matching search with highlighted snippets.
+    Kept in sync on every message create, edit and delete (signal receivers below).
+    """
+
+    def index(self, msg):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [msg.id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, sender_name, course) VALUES (%s, %s, %s, %s)",
+                [msg.id, msg.text or '', sender_name(msg), course_token(msg.course_id)],
+            )
+
+    def remove(self, message_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [message_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def search(self, course_id, query, limit=SEARCH_LIMIT):
+        """ [(message id, highlighted snippet)], best match first. """
+        words = WORD_RE.findall(query)
+        if not words:
+            return []
+        # Every word quoted (no FTS query syntax from users), the last one as a prefix for search-as-you-type
+        terms = ' '.join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+        match = f'course:"{course_token(course_id)}" AND {{text sender_name}}: ({terms})'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, '…', %s) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}, 1.0, 0.5, 0.0) LIMIT %s",
+                [_HL_START, _HL_END, SNIPPET_WORDS, match, limit],
+            )
+            return [(message_id, _highlight(snippet)) for message_id, snippet in cursor.fetchall()]
+
+
+class IContainsBackend:
+    """ Fallback for databases without an FTS index: substring match on text and sender, newest first. """
+
+    def index(self, msg):
+        pass
+
+    def remove(self, message_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, course_id, query, limit=SEARCH_LIMIT):
+        matches = (
+            CourseGroupMessage.objects.filter(course_id=course_id)
+            .filter(Q(text__icontains=query) | Q(sender__first_name__icontains=query) | Q(sender__username__icontains=query))
+            .order_by('-created_at').values_list('id', flat=True)[:limit]
+        )
+        return [(message_id, None) for message_id in matches]
+
+
+_backend = None
+
+
+def get_backend():
+    """ CHAT_SEARCH_BACKEND (dotted path), or FTS5 when its table exists, else the icontains fallback. """
+    global _backend
+    if _backend is None:
+        backend = getattr(settings, 'CHAT_SEARCH_BACKEND', '')
+        if backend:
+            _backend = import_string(backend)()
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            _backend = SqliteFTSBackend()
+        else:
+            _backend = IContainsBackend()
+    return _backend
+
+
+def search_messages(course_id, query, limit=SEARCH_LIMIT):
+    """ Matching messages of a course in rank order, each with a `search_snippet` (highlighted HTML or None). """
+    results = get_backend().search(course_id, query, limit)
+    snippets = dict(results)
+    found = CourseGroupMessage.objects.filter(id__in=snippets, course_id=course_id).select_related(
+        'sender', 'reply_to__sender', 'bounty_winner'
+    ).in_bulk()
+    chat_messages = []
+    for message_id, snippet in results:
+        msg = found.get(message_id)
+        if msg is not None:
+            msg.search_snippet = snippet
+            chat_messages.append(msg)
+    return chat_messages
+
+
+def rebuild_index(batch_size=1000):
+    """ Re-indexes every message, e.g. after a bulk import that skipped the signals. Returns the count. """
+    backend = get_backend()
+    count = 0
+    with transaction.atomic():
+        backend.clear()
+        for msg in CourseGroupMessage.objects.select_related('sender').order_by('id').iterator(chunk_size=batch_size):
+            backend.index(msg)
+            count += 1
+    return count
+
+
+@receiver(post_save, sender=CourseGroupMessage)
+def index_message(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().index(instance)
+
+
+@receiver(post_delete, sender=CourseGroupMessage)
+def unindex_message(sender, instance, **kwargs):
+    get_backend().remove(instance.id)
@@ -0,0 +1,144 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import activity, leaderboard
+from .models import CoinEvent, User
+
+# Entries per INSERT / balance UPDATE in apply_coins_bulk
+BULK_BATCH_SIZE = 500
+
+
+class InsufficientCoins(Exception):
+    """ A debit would take the balance below zero (nothing was written). """
+
+
+def _announce_balances(rows):
+    # Balances change through UPDATE ... SET lms_coins = lms_coins + n, which sends no post_save
+    for user_id, balance, is_student in rows:
+        score = balance if is_student else None
+        transaction.on_commit(lambda user_id=user_id, score=score: leaderboard.apply_balance(user_id, score))
+
+
+def apply_coins(user, amount, reason, course=None, key=None):
+    """
+    Adds `amount` coins (negative to spend) to a user's balance and appends the entry to the ledger.
+    Both happen in one transaction, and the balance moves with a database-side increment,
+    so concurrent requests can't overwrite each other's changes.
+
+    Returns the CoinEvent, or None when `key` was applied before (the reward was already paid).
+    Raises InsufficientCoins when the balance can't cover a debit. Refreshes user.lms_coins.
+    """
+    if not amount:
+        return None
+    try:
+        with transaction.atomic():
+            event = CoinEvent.objects.create(user=user, amount=amount, reason=reason, course=course, idempotency_key=key)
+            balances = User.objects.filter(pk=user.pk)
+            if amount < 0:
+                balances = balances.filter(lms_coins__gte=-amount)
+            if not balances.update(lms_coins=F('lms_coins') + amount):
+                raise InsufficientCoins(f"{user.username} has fewer than {-amount} coins")
+    except IntegrityError:
+        if key and CoinEvent.objects.filter(idempotency_key=key).exists():
+            return None
+        raise
+
+    row = User.objects.filter(pk=user.pk).values_list('id', 'lms_coins', 'is_student').get()
+    user.lms_coins = row[1]
+    _announce_balances([row])
+    return event
+
+
+def apply_coins_bulk(entries, batch_size=BULK_BATCH_SIZE):
+    """
+    Pays out many rewards at once (contest results, event prizes) without one transaction per reward.
+    `entries` are (user_id, amount, reason, course_id, key) tuples with positive amounts; key may be None.
+
+    Per batch: one query for keys already paid, one INSERT into the ledger and one UPDATE for all
+    the balances involved. Entries whose key was already paid are skipped. Returns the number applied.
+    """
+    entries = list(entries)
+    if any(amount <= 0 for _, amount, _, _, _ in entries):
+        raise ValueError("apply_coins_bulk only credits coins; spend with apply_coins()")
+
+    applied = 0
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        # A concurrent apply_coins() may take one of our keys between the check and the INSERT: check again
+        for attempt in range(3):
+            try:
+                applied += _apply_batch(batch)
+                break
+            except IntegrityError:
+                if attempt == 2:
+                    raise
+    return applied
+
+
+def _apply_batch(batch):
+    keys = {key for _, _, _, _, key in batch if key}
+    paid = set(CoinEvent.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+
+    events = []
+    for user_id, amount, reason, course_id, key in batch:
+        if key:
+            if key in paid:
+                continue
+            paid.add(key)
+        events.append(CoinEvent(user_id=user_id, amount=amount, reason=reason, course_id=course_id, idempotency_key=key))
+    if not events:
+        return 0
+
+    totals = {}
+    lessons = {}
+    for event in events:
+        totals[event.user_id] = totals.get(event.user_id, 0) + event.amount
+        lessons[event.user_id] = lessons.get(event.user_id, 0) + (event.reason == CoinEvent.REASON_LESSON)
+
+    with transaction.atomic():
+        CoinEvent.objects.bulk_create(events)
+        User.objects.filter(pk__in=totals).update(lms_coins=F('lms_coins') + Case(
+            *[When(pk=user_id, then=Value(total)) for user_id, total in totals.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+        # bulk_create sends no post_save: update the daily rollups here
+        for user_id, total in totals.items():
+            activity.record_activity(user_id, coins=total, lessons=lessons[user_id])
+        _announce_balances(User.objects.filter(pk__in=totals).values_list('id', 'lms_coins', 'is_student'))
+    return len(events)
+
+
+def find_mismatches():
+    """ [(user id, username, balance, ledger total)] for every user whose balance differs from their ledger (one query). """
+    return list(
+        User.objects.annotate(ledger_total=Coalesce(Sum('coin_events__amount'), 0))
+        .exclude(lms_coins=F('ledger_total'))
+        .order_by('id').values_list('id', 'username', 'lms_coins', 'ledger_total')
+    )
+
+
+def reconcile(fix=False):
+    """
+    Checks every balance against the ledger. With fix=True each difference (e.g. a balance edited in
+    the Django admin) is booked as a correction entry, so the ledger explains the balance again.
+    """
+    mismatches = find_mismatches()
+    if fix:
+        CoinEvent.objects.bulk_create([
+            CoinEvent(user_id=user_id, amount=balance - ledger_total, reason=CoinEvent.REASON_CORRECTION)
+            for user_id, _, balance, ledger_total in mismatches
+        ])
+    return mismatches
+
+
+@receiver(post_save, sender=User)
+def open_account(sender, instance, created, raw=False, **kwargs):
+    # New accounts start with the default balance: book it, or every new user would fail reconciliation
+    if created and not raw and instance.lms_coins:
+        CoinEvent.objects.create(
+            user=instance, amount=instance.lms_coins, reason=CoinEvent.REASON_OPENING,
+            idempotency_key=f"opening:{instance.pk}",
+        )
@@ -1,16 +1,29 @@
 import os
 import json
 import base64
-import threading
-from groq import Groq
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q
-from django.db import transaction  # NEW: For secure coin transfer
-from .models import Course, Enrollment, CourseGroupMessage, MessageReaction, User
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.template.loader import render_to_string
+from django.views.decorators.http import condition
+from django.views.decorators.cache import cache_control
+from django.db.models import Q, Count
+from django.db import transaction, connection  # NEW: For secure coin transfer
+from .models import Course, Enrollment, CourseGroupMessage, MessageReaction, User, CoinEvent
+from .chat_events import latest_cursor, changes_since, cursor_expired, attach_reactions, chat_version, poller as change_log_poller
+from .chat_broker import get_broker, course_channel
+from .chat_search import search_messages
+from .llm_gateway import chat_completion, DEFAULT_MODEL, VISION_MODEL
+from .task_queue import schedule, cancel_pending
+from .worker_pool import BoundedWorkerPool
+from .coin_ledger import apply_coins, InsufficientCoins
 
 # .env file loaded 
 try:
@@ -21,34 +34,49 @@ except ImportError:
 
 #  AI BOT BACKGROUND WORKERS (VISION ENABLED) 
 
-def generate_ai_reply(course_id, prompt, reply_to_id=None, image_path=None):
+# Fixed pool for /ai replies: a burst of commands waits in a bounded backlog instead of spawning a thread each
+community_ai_pool = BoundedWorkerPool(
+    name='community-ai',
+    max_workers=getattr(settings, 'COMMUNITY_AI_WORKERS', 3),
+    max_queue=getattr(settings, 'COMMUNITY_AI_QUEUE_SIZE', 20),
+)
+
+def get_ai_user():
+    ai_user, created = User.objects.get_or_create(
+        username="ai_commander", 
+        defaults={
+            'first_name': 'AI', 
+            'last_name': 'Commander', 
+            'email': 'ai@commander.com',
+            'is_teacher': True
+        }
+    )
+    return ai_user
+
+def post_ai_error(course_id, error, reply_to_id=None):
+    """ Tells the chat that the AI reply failed. """
+    try:
+        CourseGroupMessage.objects.create(
+            course_id=course_id,
+            sender=get_ai_user(),
+            text=f"⚠️ AI Core Error: `{str(error)}`",
+            reply_to_id=reply_to_id
+        )
+    except Exception:
+        pass
+
+def generate_ai_reply(course_id, prompt, reply_to_id=None, image_path=None, feature='community_ai', user_id=None, raise_errors=False):
     """
     Calls Groq API in the background. Now supports Image Vision!
+    `feature` is 'community_ai' for /ai commands and 'community_auto_reply' for unanswered questions.
+    With raise_errors the failure goes to the caller (a retried task) instead of into the chat.
     """
     try:
         # 1. Safely Create or Get the AI User
-        ai_user, created = User.objects.get_or_create(
-            username="ai_commander", 
-            defaults={
-                'first_name': 'AI', 
-                'last_name': 'Commander', 
-                'email': 'ai@commander.com',
-                'is_teacher': True
-            }
-        )
-        
-        # 2. Fetch API Key
-        api_key = os.environ.get("GROQ_API_KEY") or getattr(settings, 'GROQ_API_KEY', None)
+        ai_user = get_ai_user()
         
-        if not api_key:
-            CourseGroupMessage.objects.create(
-                course_id=course_id, sender=ai_user, reply_to_id=reply_to_id,
-                text="⚠️ System Error: `GROQ_API_KEY` is missing."
-            )
-            return
+        # 2. A missing GROQ_API_KEY raises LLMError in the gateway (retried like any other failure)
 
-        client = Groq(api_key=api_key)
-        
         # Base setup for AI
         system_prompt = "You are an expert AI teaching assistant for a tech community. Provide short, clear, and very helpful answers. DO NOT use markdown asterisks (**) or bold text. Instead, use relevant emojis 🚀💡💻 🤖 to highlight key points. Format code blocks using standard markdown."
         
@@ -69,7 +97,7 @@ def generate_ai_reply(course_id, prompt, reply_to_id=None, image_path=None):
                 }
             ]
             # FIXED: Updated to the new, supported 90B Vision model
-            ai_model = "llama-3.2-90b-vision-preview" 
+            ai_model = VISION_MODEL
             
         else:
             # Standard Text-Only Model
@@ -77,14 +105,10 @@ def generate_ai_reply(course_id, prompt, reply_to_id=None, image_path=None):
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ]
-            ai_model = "llama-3.3-70b-versatile" # GROQ TEXT MODEL
+            ai_model = DEFAULT_MODEL # GROQ TEXT MODEL
 
-        # Call Groq API
-        chat_completion = client.chat.completions.create(
-            messages=api_messages,
-            model=ai_model, 
-        )
-        ai_response = chat_completion.choices[0].message.content
+        # Call Groq API (shared keep-alive session, timeout + retries)
+        ai_response = chat_completion(api_messages, model=ai_model, timeout=60, feature=feature, user_id=user_id)
         
         # 4. Save AI reply
         CourseGroupMessage.objects.create(
@@ -95,47 +119,76 @@ def generate_ai_reply(course_id, prompt, reply_to_id=None, image_path=None):
         )
     except Exception as e:
         print(f"Groq AI Error: {e}")
-        try:
-            CourseGroupMessage.objects.create(
-                course_id=course_id,
-                sender=ai_user,
-                text=f"⚠️ AI Core Error: `{str(e)}`",
-                reply_to_id=reply_to_id
-            )
-        except Exception as inner_e:
-            pass
+        if raise_errors:
+            raise
+        post_ai_error(course_id, e, reply_to_id)
+
+def _ai_reply_job(*args, **kwargs):
+    try:
+        generate_ai_reply(*args, **kwargs)
+    finally:
+        # Pool threads get their own DB connection, don't leak it
+        connection.close()
+
+# Unanswered questions get an AI answer after this long
+AUTO_REPLY_DELAY = timedelta(minutes=45)
 
 def check_and_auto_reply(course_id, message_id, prompt):
     """
     Checks if a question has been answered after 45 mins. If not, AI replies.
+    Runs from the ScheduledTask worker (`manage.py run_scheduled_tasks`). Errors are raised,
+    so the worker retries the task; auto_reply_failed() reports the last one.
     """
-    try:
-        newer_messages_exist = CourseGroupMessage.objects.filter(course_id=course_id, id__gt=message_id).exists()
-        if not newer_messages_exist:
-            ai_prompt = f"A student asked this question and no one replied. Please provide a helpful answer: '{prompt}'"
-            generate_ai_reply(course_id, ai_prompt, reply_to_id=message_id)
-    except Exception as e:
-        print(f"Auto Reply Error: {e}")
+    newer_messages_exist = CourseGroupMessage.objects.filter(course_id=course_id, id__gt=message_id).exists()
+    if not newer_messages_exist:
+        ai_prompt = f"A student asked this question and no one replied. Please provide a helpful answer: '{prompt}'"
+        generate_ai_reply(course_id, ai_prompt, reply_to_id=message_id, feature='community_auto_reply', raise_errors=True)
+
+def auto_reply_failed(error, course_id, message_id, prompt):
+    """ Runs once the auto reply has failed MAX_ATTEMPTS times. """
+    print(f"Auto Reply Error: {error}")
+    post_ai_error(course_id, error, reply_to_id=message_id)
 
 # 1. MAIN COMMUNITY CHAT VIEW 
 
+def can_access_chat(user, course):
+    is_enrolled = Enrollment.objects.filter(student=user, course=course).exists()
+    return is_enrolled or user.is_teacher or user.is_superuser
+
+def _is_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+def chat_etag(request, slug):
+    """
+    Course chat version + viewer + exact URL. An unchanged chat answers 304 after one indexed query,
+    before any message query runs. No ETag while flash messages are pending (e.g. right after a
+    redirect with an error): the page has to be rendered to show them.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    url_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()[:10]
+    # The viewer's coin balance caps the bounty input on the page
+    return f"{chat_version(slug)}-{request.user.pk}-{request.user.lms_coins}-{url_hash}"
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chat_etag)
 def course_community_chat(request, slug):
     course = get_object_or_404(Course, slug=slug)
 
-    is_enrolled = Enrollment.objects.filter(student=request.user, course=course).exists()
-    if not (is_enrolled or request.user.is_teacher or request.user.is_superuser):
+    if not can_access_chat(request.user, course):
         messages.error(request, "You must be enrolled in this course to access the community chat.")
         return redirect('dashboard')
 
+    chat_cursor = latest_cursor(course.id)
     search_query = request.GET.get('q', '')
+    has_older = False
     if search_query:
-        chat_messages = CourseGroupMessage.objects.filter(
-            Q(course=course) & 
-            (Q(text__icontains=search_query) | Q(sender__first_name__icontains=search_query) | Q(sender__username__icontains=search_query))
-        ).select_related('sender', 'reply_to')
+        # Ranked, highlighted matches from the full-text index (best match first)
+        chat_messages = search_messages(course.id, search_query)
     else:
-        chat_messages = CourseGroupMessage.objects.filter(course=course).select_related('sender', 'reply_to')
+        # Only the newest page; older messages are loaded on scroll-up (chat_history)
+        chat_messages, has_older = message_page(course)
 
     pinned_messages = CourseGroupMessage.objects.filter(course=course, is_pinned=True).order_by('-created_at')
 
@@ -155,15 +208,15 @@ def course_community_chat(request, slug):
         except ValueError:
             bounty_amount = 0
 
-        # Check if user has enough coins
+        # Deduct coins safely (refused without charging if the user doesn't have enough)
         if bounty_amount > 0:
-            if request.user.lms_coins < bounty_amount:
+            try:
+                apply_coins(request.user, -bounty_amount, CoinEvent.REASON_CHAT_BOUNTY, course)
+            except InsufficientCoins:
+                if _is_ajax(request):
+                    return JsonResponse({'status': 'error', 'message': 'Insufficient LMS Coins to set this bounty.'}, status=400)
                 messages.error(request, "Insufficient LMS Coins to set this bounty.")
                 return redirect('course_community_chat', slug=course.slug)
-            
-            # Deduct coins safely
-            request.user.lms_coins -= bounty_amount
-            request.user.save(update_fields=['lms_coins'])
 
         if message_text or attachment:
             reply_msg = None
@@ -180,6 +233,9 @@ def course_community_chat(request, slug):
                 bounty_amount=bounty_amount #  Added here
             )
 
+            # Any new message means earlier questions in this course got company: drop their pending auto-replies
+            cancel_pending(f"course:{course.id}", kind='community_auto_reply')
+
             #  AI BOT TRIGGERS (VISION ENABLED) 
             text_lower = message_text.strip().lower()
             
@@ -195,26 +251,35 @@ def course_community_chat(request, slug):
                     if ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
                         image_path = msg.attachment.path
                 
-                # Start Thread with Image Path
-                threading.Thread(target=generate_ai_reply, args=(course.id, prompt, msg.id, image_path)).start()
+                # Queue the reply with Image Path (the pool is full during a burst: tell the user right away)
+                if community_ai_pool.submit(_ai_reply_job, course.id, prompt, msg.id, image_path, user_id=request.user.id) is None:
+                    CourseGroupMessage.objects.create(
+                        course=course, sender=get_ai_user(), reply_to=msg,
+                        text="⏳ AI Commander is busy with other questions right now. Please try /ai again in a minute."
+                    )
             
             # Auto Reply Logic (Only for text questions without /ai)
             elif '?' in text_lower and not attachment:
-                timer_seconds = 2700 # 45 mins
-                threading.Timer(timer_seconds, check_and_auto_reply, args=[course.id, msg.id, message_text]).start()
-
+                schedule(
+                    'community_auto_reply',
+                    {'course_id': course.id, 'message_id': msg.id, 'prompt': message_text},
+                    delay=AUTO_REPLY_DELAY, group_key=f"course:{course.id}",
+                )
+
+            # The chat page picks the new message up from the update feed, no need to re-render everything
+            if _is_ajax(request):
+                return JsonResponse({'status': 'success', 'message_id': msg.id})
             return redirect('course_community_chat', slug=course.slug)
 
-    for msg in chat_messages:
-        reactions = msg.reactions.all()
-        reaction_counts = {}
-        for r in reactions:
-            reaction_counts[r.reaction_type] = reaction_counts.get(r.reaction_type, 0) + 1
-        msg.reaction_counts = reaction_counts
+    attach_reactions(chat_messages)
 
     context = {
         'course': course,
+        # Read before the messages: anything newer is picked up by the first poll
+        'chat_cursor': chat_cursor,
         'chat_messages': chat_messages,
+        'has_older': has_older,
+        'history_cursor': history_cursor(chat_messages[0]) if has_older else '',
         'pinned_messages': pinned_messages,
         'members': members,
         'member_count': len(members),
@@ -223,6 +288,166 @@ def course_community_chat(request, slug):
     
     return render(request, 'community_chat.html', context)
 
+#  1a. CHAT HISTORY PAGES (keyset pagination, AJAX)
+
+# Messages per page: the chat opens with the newest page and loads older ones on scroll-up
+CHAT_PAGE_SIZE = 50
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def history_cursor(msg):
+    """ Position of a message as "<created_at in µs>_<id>" (exact, URL safe). """
+    return f"{(msg.created_at - _EPOCH) // timedelta(microseconds=1)}_{msg.id}"
+
+def _parse_history_cursor(cursor):
+    micros, msg_id = cursor.split('_')
+    return _EPOCH + timedelta(microseconds=int(micros)), int(msg_id)
+
+def message_page(course, before=None, limit=None):
+    """
+    Up to `limit` (default CHAT_PAGE_SIZE) messages older than `before` (created_at, id), oldest first,
+    and whether more exist. Seeks on the (course, created_at, id) index, so old pages cost the same as the newest one.
+    """
+    limit = limit or CHAT_PAGE_SIZE
+    page = CourseGroupMessage.objects.filter(course=course)
+    if before:
+        created_at, msg_id = before
+        page = page.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=msg_id))
+    page = list(
+        page.select_related('sender', 'reply_to__sender', 'bounty_winner')
+        .order_by('-created_at', '-id')[:limit + 1]
+    )
+    has_older = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    return page, has_older
+
+@login_required
+def chat_history(request, slug):
+    """ The page of messages before `before` (a history cursor), rendered like the chat page renders them. """
+    course = get_object_or_404(Course, slug=slug)
+    if not can_access_chat(request.user, course):
+        return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+
+    try:
+        before = _parse_history_cursor(request.GET.get('before', ''))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+
+    chat_messages, has_older = message_page(course, before)
+    attach_reactions(chat_messages)
+    return JsonResponse({
+        'status': 'success',
+        'html': ''.join(render_to_string('community_message.html', {'message': msg}, request=request) for msg in chat_messages),
+        'has_older': has_older,
+        'cursor': history_cursor(chat_messages[0]) if has_older else '',
+    })
+
+#  1b. INCREMENTAL CHAT FEED (AJAX)
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chat_etag)
+def chat_updates(request, slug):
+    """
+    Changes after the `since` cursor: new/changed messages as rendered HTML, deleted ids,
+    and the pinned list when anything changed. The page polls this instead of reloading itself.
+    """
+    course = get_object_or_404(Course, slug=slug)
+    if not can_access_chat(request.user, course):
+        return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+
+    try:
+        since = max(0, int(request.GET.get('since', 0)))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+
+    if cursor_expired(since):
+        return JsonResponse({'status': 'success', 'reload': True})
+
+    changes = changes_since(course.id, since)
+    data = {
+        'status': 'success',
+        'cursor': changes['cursor'],
+        'has_more': changes['has_more'],
+        'deleted': changes['deleted'],
+        'messages': [
+            {
+                'id': msg.id,
+                'kind': msg.change_kind,
+                'is_ai': msg.sender.username == 'ai_commander',
+                'html': render_to_string('community_message.html', {'message': msg}, request=request),
+            }
+            for msg in changes['messages']
+        ],
+    }
+    if changes['changed']:
+        data['pinned'] = [
+            {'id': p.id, 'text': (p.text or '')[:70]}
+            for p in CourseGroupMessage.objects.filter(course=course, is_pinned=True).order_by('-created_at')
+        ]
+    return JsonResponse(data)
+
+#  1c. LIVE CHAT STREAM (SSE, served async from the ASGI app)
+
+# Comment line sent when nothing happened, keeps proxies from closing an idle stream
+STREAM_HEARTBEAT = 20
+# Streams end after this long; EventSource reconnects and the page catches up from its cursor
+STREAM_MAX_AGE = 60 * 5
+
+async def _chat_event_stream(course_id, cursor):
+    """
+    Sends every change-log event after `cursor`. The stream never queries the database itself:
+    this process's change-log poller reads each watched course once per interval and publishes
+    the events, which the stream just waits for.
+    """
+    subscription = get_broker().subscribe(course_channel(course_id))
+    change_log_poller.watch(course_id, cursor)
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_MAX_AGE
+        yield "retry: 3000\n\n"
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(subscription.get(), min(STREAM_HEARTBEAT, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            # The poller of a course that was already watched may re-send events this page has seen
+            if event['cursor'] <= cursor:
+                continue
+            cursor = event['cursor']
+            yield f"data: {json.dumps(event)}\n\n"
+    finally:
+        subscription.close()
+
+@login_required
+async def chat_stream(request, slug):
+    """
+    Pushes a small notice (new cursor, kind, message id) when a message, edit, reaction,
+    pin or AI reply in this course is saved; the page then fetches the change from chat_updates.
+    Changes made in this process arrive at once, changes from other processes within the poller's interval.
+    An idle connection is a parked coroutine: no thread and no query of its own.
+    """
+    # Under WSGI (runserver) Django would buffer the whole stream: the page keeps using the update feed instead
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'status': 'error', 'message': 'Live updates need the ASGI server'}, status=501)
+
+    course = await Course.objects.filter(slug=slug).afirst()
+    if course is None:
+        return JsonResponse({'status': 'error', 'message': 'Course not found'}, status=404)
+    user = await request.auser()
+    if not await sync_to_async(can_access_chat)(user, course):
+        return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+
+    cursor = await sync_to_async(latest_cursor)(course.id)
+    response = StreamingHttpResponse(_chat_event_stream(course.id, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 #  2. PIN MESSAGE API (AJAX) 
 
 @login_required
@@ -253,9 +478,11 @@ def add_message_reaction(request, message_id):
                 MessageReaction.objects.create(message=msg, user=request.user, reaction_type=reaction_type)
                 action = 'added'
             
-            reactions_count = {}
-            for r in MessageReaction.objects.filter(message=msg):
-                reactions_count[r.reaction_type] = reactions_count.get(r.reaction_type, 0) + 1
+            # Counted by the database in one grouped query
+            reactions_count = dict(
+                MessageReaction.objects.filter(message=msg).order_by()
+                .values_list('reaction_type').annotate(count=Count('id'))
+            )
                 
             return JsonResponse({'status': 'success', 'action': action, 'reactions': reactions_count})
         
@@ -351,16 +578,16 @@ def accept_bounty(request, reply_id):
 
             # Execute Transaction Securely
             with transaction.atomic():
-                # 1. Mark bounty as resolved
+                # 1. Add coins to the winner (keyed per bounty: a second accept racing this one pays nothing)
+                winner = reply_msg.sender
+                if not apply_coins(winner, parent_msg.bounty_amount, CoinEvent.REASON_CHAT_BOUNTY, parent_msg.course, key=f"chat_bounty:{parent_msg.id}"):
+                    return JsonResponse({'status': 'error', 'message': 'This bounty is already resolved.'})
+
+                # 2. Mark bounty as resolved
                 parent_msg.is_bounty_resolved = True
-                parent_msg.bounty_winner = reply_msg.sender
+                parent_msg.bounty_winner = winner
                 parent_msg.save()
                 
-                # 2. Add coins to the winner
-                winner = reply_msg.sender
-                winner.lms_coins += parent_msg.bounty_amount
-                winner.save(update_fields=['lms_coins'])
-                
                 # 3. Create the global notification that triggers our Golden Popup!
                 # Note: The word 'Coin' must be in the message for the JS to trigger the golden style
                 winner_name = winner.first_name if winner.first_name else winner.username
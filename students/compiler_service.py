@@ -1,99 +1,500 @@
 # students/compiler_service.py
 import os
+import glob
 import uuid
+import hashlib
+import time
+import shutil
+import atexit
 import subprocess
+import threading
 import json
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+import socket
+from django.conf import settings
 
 # Directory to temporarily store student codes
 TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_codes')
 os.makedirs(TEMP_DIR, exist_ok=True)
 
-@csrf_exempt
-def run_code_in_docker(request):
-    if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'message': 'Invalid Request'})
-        
+# The image we built from Dockerfile.compiler
+COMPILER_IMAGE = 'local-compiler'
+
+# Security limits applied to every sandbox container (warm or cold)
+CONTAINER_LIMITS = [
+    '--network', 'none',      # Security: No internet access for student code
+    '--memory', '256m',       # Security: Limit memory
+    '--cpus', '0.5',          # Security: Limit CPU
+]
+
+# Every submission gets its own container, which sees nothing but the submission's folder (as /app).
+# For simplicity in this basic setup, Java code must use a class named Main.
+# Compiled languages list their build outputs ('artifacts'), which the compile cache keeps.
+LANGUAGE_SPECS = {
+    'python': {'source': 'main.py', 'run': 'python3 main.py'},
+    'javascript': {'source': 'main.js', 'run': 'node main.js'},
+    'cpp': {'source': 'main.cpp', 'compile': 'g++ main.cpp -o main', 'run': './main', 'artifacts': ['main']},
+    'java': {'source': 'Main.java', 'compile': 'javac Main.java', 'run': 'java Main', 'artifacts': ['*.class']},
+}
+
+TIMEOUT_MESSAGE = "Timeout Error: Your code took too long to execute (Possible Infinite Loop)."
+
+
+class SandboxError(Exception):
+    """ No compiler container could be started (Docker not running, image not built, ...). """
+
+
+# 1. SANDBOXES (WARM CONTAINER POOL)
+
+# Every sandbox container carries these labels; the owner ("<host>:<pid>") lets a new pool
+# remove the containers of a process that was killed before its atexit cleanup could run
+POOL_LABEL = 'lms.compiler-pool'
+OWNER_LABEL = 'lms.compiler-owner'
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _start_container(host_dir):
+    """ Starts one idle, network-less compiler container that only sees host_dir (as /app). Returns its id or None. """
+    docker_cmd = [
+        'docker', 'run', '-d', '--rm',
+        '--label', f"{POOL_LABEL}=1",
+        '--label', f"{OWNER_LABEL}={_owner()}",
+        '-v', f"{host_dir}:/app",
+    ] + CONTAINER_LIMITS + [COMPILER_IMAGE]
     try:
-        data = json.loads(request.body)
-        language = data.get('language', 'python')
-        code = data.get('code', '')
-        
-        if not code.strip():
-            return JsonResponse({'status': 'error', 'message': 'Code cannot be empty.'})
-
-        # 1. Create a unique filename to prevent conflicts between students
-        unique_id = str(uuid.uuid4())
-        
-        # Determine file extension and run command based on language
-        if language == 'python':
-            file_ext = '.py'
-            run_cmd = ['python3', f'/app/{unique_id}{file_ext}']
-        elif language == 'javascript':
-            file_ext = '.js'
-            run_cmd = ['node', f'/app/{unique_id}{file_ext}']
-        elif language == 'cpp':
-            file_ext = '.cpp'
-            # C++ needs compilation first, then execution
-            run_cmd = ['sh', '-c', f'g++ /app/{unique_id}{file_ext} -o /app/{unique_id} && /app/{unique_id}']
-        elif language == 'java':
-            file_ext = '.java'
-            # For simplicity in this basic setup, we assume the class is named Main
-            run_cmd = ['sh', '-c', f'javac /app/{unique_id}{file_ext} && cd /app && java Main']
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Unsupported language.'})
-
-        file_name = f"{unique_id}{file_ext}"
-        file_path = os.path.join(TEMP_DIR, file_name)
-
-        # 2. Save the code to the temporary file
-        with open(file_path, 'w') as f:
-            f.write(code)
-
-        # 3. Build the Docker command
-        # We mount (bind) the temp directory to /app inside the container
+        process = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Compiler Pool Error: {e}")
+        return None
+    if process.returncode != 0:
+        print(f"Compiler Pool Error: {process.stderr.strip()}")
+        return None
+    return process.stdout.strip()
+
+
+def _remove_container(container_id):
+    try:
+        subprocess.run(['docker', 'rm', '-f', container_id], capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+def reap_stale_containers():
+    """
+    Removes sandbox containers left behind by dead processes on this host (SIGKILL, OOM kill),
+    which never ran their atexit cleanup. Containers of live processes and other hosts are kept.
+    Returns the number removed.
+    """
+    try:
+        process = subprocess.run(
+            ['docker', 'ps', '-a', '--filter', f"label={POOL_LABEL}=1", '--format', f'{{{{.ID}}}} {{{{.Label "{OWNER_LABEL}"}}}}'],
+            capture_output=True, text=True, timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Compiler Pool Error: {e}")
+        return 0
+    if process.returncode != 0:
+        return 0
+
+    host = socket.gethostname()
+    removed = 0
+    for line in process.stdout.splitlines():
+        container_id, _, owner = line.strip().partition(' ')
+        owner_host, _, pid = owner.rpartition(':')
+        # Containers from before owner labels existed have no owner: nothing could still be using them
+        if owner and (owner_host != host or not pid.isdigit() or _process_alive(int(pid))):
+            continue
+        _remove_container(container_id)
+        removed += 1
+    return removed
+
+
+class Sandbox:
+    """
+    One container plus the host folder mounted as its /app, used for a single submission.
+    Destroying it kills everything the student's code started (PID 1 included) and deletes
+    everything it wrote, so nothing carries over into another student's run.
+    """
+
+    def __init__(self, container_id, host_dir):
+        self.container_id = container_id
+        self.host_dir = host_dir
+
+    @classmethod
+    def start(cls):
+        """ Starts a fresh sandbox, or returns None if Docker refused. """
+        host_dir = os.path.join(TEMP_DIR, str(uuid.uuid4()))
+        os.makedirs(host_dir)
+        container_id = _start_container(host_dir)
+        if not container_id:
+            shutil.rmtree(host_dir, ignore_errors=True)
+            return None
+        return cls(container_id, host_dir)
+
+    def run(self, shell_cmd, timeout):
+        """
+        Runs a shell command in /app under `timeout`, so runaway code is always killed
+        (exit code 124, or 137 if it ignored SIGTERM).
+        Returns the CompletedProcess; raises subprocess.TimeoutExpired if Docker itself hangs.
+        """
         docker_cmd = [
-            'docker', 'run', '--rm', 
-            '-v', f"{TEMP_DIR}:/app", # Share folder
-            '--network', 'none',      # Security: No internet access for student code
-            '--memory', '256m',       # Security: Limit memory
-            '--cpus', '0.5',          # Security: Limit CPU
-            'local-compiler'          # The image we built in Step 1
-        ] + run_cmd
-
-        # 4. Execute the command with a timeout (e.g., 5 seconds) to prevent infinite loops
-        try:
-            process = subprocess.run(
-                docker_cmd,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            output = process.stdout
-            error = process.stderr
-            
-            if process.returncode == 0:
-                result_status = 'success'
-                final_output = output if output else "Execution completed (No output)"
+            'docker', 'exec', self.container_id,
+            'timeout', '-k', '1', str(timeout), 'sh', '-c', f"cd /app && {shell_cmd}",
+        ]
+        return subprocess.run(docker_cmd, capture_output=True, text=True, timeout=timeout + 10)
+
+    def destroy(self):
+        _remove_container(self.container_id)
+        shutil.rmtree(self.host_dir, ignore_errors=True)
+
+
+class WarmContainerPool:
+    """
+    Keeps pre-started sandboxes idle so a submission only pays for a `docker exec`
+    instead of a full `docker run` cold start.
+    A sandbox is never reused: after its one submission it is destroyed and the pool
+    starts a replacement in the background. When every sandbox is taken, callers
+    fall back to a cold start.
+    """
+
+    # Wait this long before trying again when Docker refuses to start containers
+    RETRY_DELAY = 30
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._starting = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+        self.warm_runs = 0
+        self.cold_runs = 0
+
+    def acquire(self):
+        """ Returns an idle sandbox (and starts its replacement), or None if the pool is empty. """
+        with self._lock:
+            sandbox = self._idle.pop() if self._idle else None
+            if sandbox:
+                self.warm_runs += 1
             else:
-                result_status = 'error'
-                final_output = error if error else output
-
-        except subprocess.TimeoutExpired:
-            result_status = 'error'
-            final_output = "Timeout Error: Your code took too long to execute (Possible Infinite Loop)."
-            
-        finally:
-            # 5. Cleanup: Always delete the temporary file after execution
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                
-            # Note: For C++ and Java, compiled files (.class, executable) might remain in TEMP_DIR. 
-            # In a production app, you'd clean those up too based on the unique_id.
-
-        return JsonResponse({'status': result_status, 'output': final_output})
-
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)})
\ No newline at end of file
+                self.cold_runs += 1
+        self.refill()
+        return sandbox
+
+    def refill(self):
+        """ Starts sandboxes in the background until the pool is back to full size. """
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                return
+            missing = self.size - len(self._idle) - self._starting
+            if missing <= 0:
+                return
+            self._starting += missing
+        threading.Thread(target=self._start_sandboxes, args=(missing,), daemon=True).start()
+
+    def _start_sandboxes(self, count):
+        for _ in range(count):
+            sandbox = Sandbox.start()
+            with self._lock:
+                self._starting -= 1
+                if sandbox:
+                    self._idle.append(sandbox)
+                else:
+                    self._retry_at = time.monotonic() + self.RETRY_DELAY
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sandbox in idle:
+            sandbox.destroy()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'starting': self._starting,
+                'warm_runs': self.warm_runs,
+                'cold_runs': self.cold_runs,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _start_pool():
+    # Clean up after killed processes first, then warm up
+    reap_stale_containers()
+    _pool.refill()
+
+
+def get_pool():
+    """
+    This process's warm pool, created on the first submission (None when COMPILER_POOL_SIZE is 0).
+    Processes that never run code (migrate, the task worker, tests) never start a container.
+    """
+    global _pool
+    if _pool is None and getattr(settings, 'COMPILER_POOL_SIZE', 0) > 0:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WarmContainerPool(size=settings.COMPILER_POOL_SIZE)
+                atexit.register(_pool.shutdown)
+                threading.Thread(target=_start_pool, name='compiler-pool-start', daemon=True).start()
+    return _pool
+
+
+def pool_stats():
+    return _pool.stats() if _pool else None
+
+
+def open_sandbox():
+    """ A fresh sandbox for one submission: a warm one when available, else a cold start. Raises SandboxError. """
+    pool = get_pool()
+    sandbox = pool.acquire() if pool else None
+    if sandbox is None:
+        sandbox = Sandbox.start()
+        if sandbox is None:
+            raise SandboxError("Could not start a compiler container.")
+    return sandbox
+
+
+def close_sandbox(sandbox):
+    """ Destroys a used sandbox in the background (docker rm takes a moment). """
+    threading.Thread(target=sandbox.destroy, daemon=True).start()
+
+
+# 2. COMPILE CACHE (C++ / JAVA)
+
+# Compiled programs are stored by a hash of (language, compiler command, source) under
+# compile_cache/<key>/, next to (never inside) temp_codes: no container ever mounts it.
+# Each entry has a manifest with the SHA-256 of every build file; a hit is only used when
+# the copy placed in the sandbox still matches it. Builds are cached straight after the
+# compiler ran, before any student code executes in the sandbox.
+COMPILE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compile_cache')
+os.makedirs(COMPILE_CACHE_DIR, exist_ok=True)
+COMPILE_CACHE_MANIFEST = 'manifest.json'
+
+# Time budget for g++/javac (compiling runs as its own step, before the program)
+COMPILE_TIMEOUT = 30
+
+_cache_lock = threading.Lock()
+_cache_counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'rejected': 0}
+
+
+def _count(name):
+    with _cache_lock:
+        _cache_counters[name] += 1
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_cache_key(language, code):
+    spec = LANGUAGE_SPECS[language]
+    payload = '\0'.join([language, spec['compile'], code])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def compile_cache_fetch(cache_key, dest_dir):
+    """
+    Copies the cached build for this key into dest_dir and checks every copied file against
+    the manifest. Returns False on a miss; an entry that doesn't match is thrown away.
+    """
+    entry_dir = os.path.join(COMPILE_CACHE_DIR, cache_key)
+    try:
+        with open(os.path.join(entry_dir, COMPILE_CACHE_MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        _count('misses')
+        return False
+
+    try:
+        for name, digest in manifest.items():
+            if os.path.basename(name) != name or name == COMPILE_CACHE_MANIFEST:
+                raise ValueError(name)
+            copied = os.path.join(dest_dir, name)
+            shutil.copy2(os.path.join(entry_dir, name), copied)
+            if _file_hash(copied) != digest:
+                raise ValueError(name)
+        os.utime(entry_dir)  # mtime is the LRU clock
+    except (OSError, ValueError, AttributeError):
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        _count('rejected')
+        _count('misses')
+        return False
+    _count('hits')
+    return True
+
+
+def compile_cache_store(language, cache_key, run_dir):
+    """
+    Copies the build outputs of a successful compile from run_dir into the cache, with their hashes.
+    Must be called right after the compile step, before the program runs in that sandbox.
+    """
+    spec = LANGUAGE_SPECS[language]
+    artifacts = []
+    for pattern in spec['artifacts']:
+        artifacts.extend(glob.glob(os.path.join(run_dir, pattern)))
+    artifacts = [path for path in artifacts if os.path.isfile(path) and not os.path.islink(path)]
+    if not artifacts:
+        return  # Compilation failed, nothing to keep
+
+    staging_dir = os.path.join(COMPILE_CACHE_DIR, f".tmp-{uuid.uuid4()}")
+    os.makedirs(staging_dir)
+    manifest = {}
+    for path in artifacts:
+        name = os.path.basename(path)
+        shutil.copy2(path, os.path.join(staging_dir, name))
+        manifest[name] = _file_hash(os.path.join(staging_dir, name))
+    with open(os.path.join(staging_dir, COMPILE_CACHE_MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    try:
+        os.rename(staging_dir, os.path.join(COMPILE_CACHE_DIR, cache_key))
+    except OSError:
+        # Another run cached the same program first
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return
+    _count('stores')
+    _evict_compile_cache()
+
+
+def _dir_size(path):
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+
+def _evict_compile_cache():
+    """ Removes least recently used builds until the cache fits COMPILE_CACHE_MAX_BYTES. """
+    max_bytes = getattr(settings, 'COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    entries = []
+    total = 0
+    for name in os.listdir(COMPILE_CACHE_DIR):
+        path = os.path.join(COMPILE_CACHE_DIR, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        try:
+            size = _dir_size(path)
+            entries.append((os.path.getmtime(path), size, path))
+        except OSError:
+            continue
+        total += size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        _count('evictions')
+
+
+def compile_cache_stats():
+    with _cache_lock:
+        counters = dict(_cache_counters)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_rate'] = round(counters['hits'] / lookups, 3) if lookups else 0
+    counters['entries'] = sum(1 for name in os.listdir(COMPILE_CACHE_DIR) if not name.startswith('.'))
+    return counters
+
+
+# 3. SANDBOX EXECUTION ENGINE
+
+def create_workspace(sandbox, language, code):
+    """ Writes the code into the sandbox's folder. """
+    spec = LANGUAGE_SPECS[language]
+    with open(os.path.join(sandbox.host_dir, spec['source']), 'w') as f:
+        f.write(code)
+
+
+def prepare_program(sandbox, language, code):
+    """
+    Works out how to run the code in the sandbox.
+    Returns (compile_step, run_step, cache_key); compile_step is None for interpreted
+    languages and for compile cache hits, whose verified build is already in the sandbox.
+    """
+    spec = LANGUAGE_SPECS[language]
+    if not spec.get('compile'):
+        return None, spec['run'], None
+
+    cache_key = compile_cache_key(language, code)
+    if compile_cache_fetch(cache_key, sandbox.host_dir):
+        return None, spec['run'], cache_key
+    return spec['compile'], spec['run'], cache_key
+
+
+def compile_program(sandbox, language, compile_step, cache_key, timeout=COMPILE_TIMEOUT):
+    """
+    Runs the compiler on its own, so the build is cached while it is still exactly what the
+    compiler produced (no student code has run in the sandbox yet). Returns the CompletedProcess.
+    """
+    process = sandbox.run(compile_step, timeout)
+    if process.returncode == 0:
+        compile_cache_store(language, cache_key, sandbox.host_dir)
+    return process
+
+
+def execute_code(language, code, timeout=5):
+    """
+    Runs student code in a fresh sandbox and returns {'status': ..., 'output': ...}.
+    """
+    if language not in LANGUAGE_SPECS:
+        return {'status': 'error', 'message': 'Unsupported language.'}
+    if not code.strip():
+        return {'status': 'error', 'message': 'Code cannot be empty.'}
+
+    try:
+        sandbox = open_sandbox()
+    except SandboxError as e:
+        return {'status': 'error', 'output': f"Sandbox Error: {e}"}
+
+    try:
+        create_workspace(sandbox, language, code)
+        compile_step, run_step, cache_key = prepare_program(sandbox, language, code)
+
+        if compile_step:
+            process = compile_program(sandbox, language, compile_step, cache_key)
+            if process.returncode in (124, 137):
+                return {'status': 'error', 'output': "Compilation Error: the compiler took too long."}
+            if process.returncode != 0:
+                return {'status': 'error', 'output': process.stderr if process.stderr else process.stdout}
+
+        started = time.monotonic()
+        process = sandbox.run(run_step, timeout)
+        timed_out = process.returncode == 124 or (
+            process.returncode == 137 and time.monotonic() - started >= timeout
+        )
+
+        if timed_out:
+            return {'status': 'error', 'output': TIMEOUT_MESSAGE}
+        if process.returncode == 0:
+            return {'status': 'success', 'output': process.stdout if process.stdout else "Execution completed (No output)"}
+        return {'status': 'error', 'output': process.stderr if process.stderr else process.stdout}
+
+    except subprocess.TimeoutExpired:
+        return {'status': 'error', 'output': TIMEOUT_MESSAGE}
+
+    finally:
+        # Always throw the sandbox away (with everything the program started or wrote)
+        close_sandbox(sandbox)
@@ -0,0 +1,137 @@
+import re
+import math
+import time
+import threading
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Max
+
+from .models import Course, Lesson
+
+# Rebuild anyway after this long (changes the version stamp can't see, e.g. queryset.update())
+INDEX_MAX_AGE = 60 * 15
+
+# How many courses go into the assistant's prompt
+TOP_K = 5
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Field weights: a query word in the title counts more than one in the description
+TITLE_WEIGHT = 3
+FACULTY_WEIGHT = 2
+LESSON_WEIGHT = 1
+DESCRIPTION_WEIGHT = 1
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'course', 'courses', 'do', 'does', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'the', 'this', 'to', 'what',
+    'which', 'who', 'with', 'you', 'your',
+}
+
+TOKEN_RE = re.compile(r'[a-z0-9+#]+')
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def course_line(course):
+    return f"- Course: '{course.title}' | Mentor: {course.faculty_name} | Level: {course.difficulty_level} | Description: {course.description[:150]}...\n"
+
+
+class CourseIndex:
+    """ In-memory BM25 index over published courses (title, faculty, description, lesson titles). """
+
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.lines = {}          # course id -> prompt line
+        self.recent = []         # course ids, newest first (fallback when nothing matches)
+        self.postings = defaultdict(dict)  # term -> {course id: weighted term frequency}
+        self.lengths = {}
+        self.avg_length = 0
+
+        lesson_titles = defaultdict(list)
+        for course_id, title in Lesson.objects.filter(course__is_published=True).values_list('course_id', 'title'):
+            lesson_titles[course_id].append(title)
+
+        for course in Course.objects.filter(is_published=True).order_by('-created_at'):
+            terms = Counter()
+            for field_text, weight in (
+                (course.title, TITLE_WEIGHT),
+                (course.faculty_name, FACULTY_WEIGHT),
+                (course.description, DESCRIPTION_WEIGHT),
+                (' '.join(lesson_titles[course.id]), LESSON_WEIGHT),
+            ):
+                for term in tokenize(field_text):
+                    terms[term] += weight
+
+            self.lines[course.id] = course_line(course)
+            self.recent.append(course.id)
+            self.lengths[course.id] = sum(terms.values())
+            for term, frequency in terms.items():
+                self.postings[term][course.id] = frequency
+
+        if self.lengths:
+            self.avg_length = sum(self.lengths.values()) / len(self.lengths)
+
+    def search(self, query, k=TOP_K):
+        """ Course ids ranked by BM25 score for the query (best first, at most k). """
+        total = len(self.lengths)
+        scores = Counter()
+        for term in set(tokenize(query)):
+            matches = self.postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+            for course_id, frequency in matches.items():
+                norm = K1 * (1 - B + B * self.lengths[course_id] / self.avg_length)
+                scores[course_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+        return [course_id for course_id, _ in scores.most_common(k)]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _current_version():
+    """
+    Stamp of the catalog, read from the database so every process sees the same one:
+    row counts catch deletes, the newest updated_at catches inserts and saves.
+    """
+    courses = Course.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    lessons = Lesson.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    return (courses['count'], courses['changed'], lessons['count'], lessons['changed'])
+
+
+def get_index():
+    """ This process's index, rebuilt when the version stamp moved or it got too old. """
+    global _index
+    version = _current_version()
+    index = _index
+    if index is None or index.version != version or time.monotonic() - index.built_at > INDEX_MAX_AGE:
+        with _index_lock:
+            if _index is None or _index.version != version or time.monotonic() - _index.built_at > INDEX_MAX_AGE:
+                _index = CourseIndex(version)
+            index = _index
+    return index
+
+
+def relevant_course_context(question, k=TOP_K):
+    """
+    Prompt text listing only the k courses most relevant to the question.
+    Falls back to the newest courses when no course matches (e.g. "hi", "what can I learn?").
+    """
+    index = get_index()
+    if not index.lines:
+        return "No specific course data is currently available on the platform."
+
+    course_ids = index.search(question, k)
+    if course_ids:
+        header = f"Courses on Learning-365 most relevant to this question ({len(index.lines)} active courses in total):\n"
+    else:
+        course_ids = index.recent[:k]
+        header = f"Some of the newest courses on Learning-365 ({len(index.lines)} active courses in total):\n"
+    return header + ''.join(index.lines[course_id] for course_id in course_ids)
@@ -0,0 +1,76 @@
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .compiler_service import execute_code
+from .models import CodeJob
+from .worker_pool import BoundedWorkerPool
+
+# Finished results are kept this long for the client to collect them (rows are stored in the
+# database, so a poll is answered by whichever web process receives it)
+JOB_RESULT_TTL = 300
+
+# Bounded pool that runs student programs off the request/response cycle
+execution_pool = BoundedWorkerPool(
+    name='code-exec',
+    max_workers=getattr(settings, 'CODE_EXEC_WORKERS', 4),
+    max_queue=getattr(settings, 'CODE_EXEC_QUEUE_SIZE', 50),
+)
+
+
+def _run_job(job_id, language, code, timeout):
+    try:
+        if not CodeJob.objects.filter(id=job_id).update(state=CodeJob.STATE_RUNNING, started_at=timezone.now()):
+            return
+
+        try:
+            result = execute_code(language, code, timeout=timeout)
+        except Exception as e:
+            result = {'status': 'error', 'message': str(e)}
+
+        CodeJob.objects.filter(id=job_id).update(state=CodeJob.STATE_DONE, finished_at=timezone.now(), result=result)
+    finally:
+        # Pool threads get their own DB connection, don't leak it
+        connection.close()
+
+
+def submit_job(language, code, owner_id, timeout=15):
+    """
+    Queues a code execution job and returns its id, or None when the queue is full.
+    """
+    job = CodeJob.objects.create(id=uuid.uuid4().hex, owner_id=owner_id, language=language)
+
+    if execution_pool.submit(_run_job, job.id, language, code, timeout) is None:
+        job.delete()
+        return None
+    return job.id
+
+
+def get_job(job_id, owner_id):
+    """ Returns the job record (a dict) if it exists, hasn't expired and belongs to owner_id. """
+    job = CodeJob.objects.filter(
+        id=job_id, owner_id=owner_id, submitted_at__gte=timezone.now() - timedelta(seconds=JOB_RESULT_TTL)
+    ).first()
+    if job is None:
+        return None
+    return {
+        'id': job.id,
+        'owner_id': job.owner_id,
+        'language': job.language,
+        'state': job.state,
+        'submitted_at': job.submitted_at.timestamp(),
+        'started_at': job.started_at.timestamp() if job.started_at else None,
+        'finished_at': job.finished_at.timestamp() if job.finished_at else None,
+        'result': job.result,
+    }
+
+
+def purge_expired_jobs():
+    """ Deletes jobs older than JOB_RESULT_TTL (run by the background worker's housekeeping). """
+    return CodeJob.objects.filter(submitted_at__lt=timezone.now() - timedelta(seconds=JOB_RESULT_TTL)).delete()[0]
+
+
+def queue_stats():
+    return execution_pool.stats()
@@ -0,0 +1,206 @@
+import os
+import ast
+import subprocess
+
+from .compiler_service import (
+    LANGUAGE_SPECS,
+    SandboxError,
+    open_sandbox,
+    close_sandbox,
+    create_workspace,
+    prepare_program,
+    compile_program,
+)
+
+# Verdicts (stored in BountySubmission.status)
+ACCEPTED = 'Accepted'
+WRONG_ANSWER = 'Wrong Answer'
+TIME_LIMIT_EXCEEDED = 'Time Limit Exceeded'
+RUNTIME_ERROR = 'Runtime Error'
+COMPILATION_ERROR = 'Compilation Error'
+
+# Per-case limits
+CASE_TIME_LIMIT = 2           # seconds
+CASE_MEMORY_LIMIT_MB = 200    # address space limit (python / cpp only, JVM and V8 reserve far more)
+CASE_OUTPUT_LIMIT_KB = 1024   # stops a runaway print loop from filling the disk
+
+# How much of a visible case's output is sent back to the student
+PREVIEW_CHARS = 500
+
+MEMORY_LIMITED_LANGUAGES = ('python', 'cpp')
+
+
+class JudgeError(Exception):
+    """ The sandbox itself could not run the submission (Docker missing, hung, etc.). """
+
+
+def _normalize_output(text):
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').strip().split('\n')]
+    return '\n'.join(lines)
+
+
+def _read(path):
+    try:
+        with open(path, 'r', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def _build_script(language, run_step, case_count, time_limit, memory_limit_mb):
+    """
+    Shell script that runs every case with its own limits (the program is already compiled).
+    Each case leaves case_N.out / case_N.err and case_N.meta ("<exit code> <ms>").
+    """
+    limits = f"ulimit -f {CASE_OUTPUT_LIMIT_KB * 2}"  # dash counts 512-byte blocks
+    if language in MEMORY_LIMITED_LANGUAGES:
+        limits += f"; ulimit -v {memory_limit_mb * 1024}"
+
+    # Runs from the sandbox's /app (Sandbox.run changes into it)
+    lines = [
+        f"for i in $(seq 1 {case_count}); do",
+        "  start=$(date +%s%N)",
+        f"  ( {limits}; timeout -k 1 {time_limit} {run_step} < case_$i.in > case_$i.out 2> case_$i.err )",
+        "  rc=$?",
+        "  echo \"$rc $(( ($(date +%s%N) - start) / 1000000 ))\" > case_$i.meta",
+        "done",
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def judge_code(language, code, test_cases, time_limit=CASE_TIME_LIMIT, memory_limit_mb=CASE_MEMORY_LIMIT_MB):
+    """
+    Judges code against all test cases in a single sandbox session (one fresh container).
+    `test_cases` are ProblemTestCase rows (or anything with input_data / expected_output / is_hidden).
+
+    Returns a dict:
+        verdict         overall verdict (first failing case decides it)
+        passed / total  number of accepted cases
+        execution_time  slowest case in seconds
+        cases           per-case verdicts; visible cases include input/expected/actual previews
+        compile_output  compiler errors, if any
+    Raises JudgeError if the sandbox could not run at all.
+    """
+    if language not in LANGUAGE_SPECS:
+        raise JudgeError('Unsupported language.')
+
+    test_cases = list(test_cases)
+    try:
+        sandbox = open_sandbox()
+    except SandboxError as e:
+        raise JudgeError(f"Sandbox unavailable: {e}")
+    run_dir = sandbox.host_dir
+
+    try:
+        create_workspace(sandbox, language, code)
+        compile_step, run_step, cache_key = prepare_program(sandbox, language, code)
+
+        if compile_step:
+            try:
+                process = compile_program(sandbox, language, compile_step, cache_key)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise JudgeError(f"Sandbox unavailable: {e}")
+            if process.returncode in (125, 126, 127):
+                raise JudgeError(process.stderr.strip() or 'Sandbox failed to start.')
+            if process.returncode != 0:
+                compile_output = (process.stdout + process.stderr).strip()
+                if process.returncode in (124, 137):
+                    compile_output = 'The compiler took too long.'
+                return {
+                    'verdict': COMPILATION_ERROR,
+                    'passed': 0,
+                    'total': len(test_cases),
+                    'execution_time': None,
+                    'cases': [],
+                    'compile_output': compile_output[:2000],
+                }
+
+        for index, case in enumerate(test_cases, start=1):
+            with open(os.path.join(run_dir, f"case_{index}.in"), 'w') as f:
+                f.write(case.input_data)
+
+        script = _build_script(language, run_step, len(test_cases), time_limit, memory_limit_mb)
+        with open(os.path.join(run_dir, 'judge.sh'), 'w') as f:
+            f.write(script)
+
+        session_timeout = len(test_cases) * (time_limit + 1) + 5
+
+        try:
+            process = sandbox.run("sh judge.sh", session_timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise JudgeError(f"Sandbox unavailable: {e}")
+        if process.returncode in (125, 126, 127):
+            raise JudgeError(process.stderr.strip() or 'Sandbox failed to start.')
+
+        return _collect_results(run_dir, test_cases, time_limit)
+
+    finally:
+        close_sandbox(sandbox)
+
+
+def _collect_results(run_dir, test_cases, time_limit):
+    cases = []
+    overall = ACCEPTED
+    slowest = 0.0
+
+    for index, case in enumerate(test_cases, start=1):
+        meta = _read(os.path.join(run_dir, f"case_{index}.meta")).split()
+        if len(meta) != 2:
+            # The session was cut short before this case ran
+            returncode, elapsed = 124, float(time_limit)
+        else:
+            returncode, elapsed = int(meta[0]), int(meta[1]) / 1000
+        actual = _read(os.path.join(run_dir, f"case_{index}.out"))
+
+        if returncode == 124 or (returncode == 137 and elapsed >= time_limit):
+            verdict = TIME_LIMIT_EXCEEDED
+        elif returncode != 0:
+            verdict = RUNTIME_ERROR
+        elif _normalize_output(actual) == _normalize_output(case.expected_output):
+            verdict = ACCEPTED
+        else:
+            verdict = WRONG_ANSWER
+
+        result = {'case': index, 'verdict': verdict, 'time': round(elapsed, 3), 'hidden': case.is_hidden}
+        if not case.is_hidden:
+            result['input'] = case.input_data[:PREVIEW_CHARS]
+            result['expected'] = case.expected_output[:PREVIEW_CHARS]
+            result['actual'] = actual[:PREVIEW_CHARS]
+            if verdict == RUNTIME_ERROR:
+                result['error'] = _read(os.path.join(run_dir, f"case_{index}.err"))[:PREVIEW_CHARS]
+        cases.append(result)
+
+        slowest = max(slowest, elapsed)
+        if overall == ACCEPTED and verdict != ACCEPTED:
+            overall = verdict
+
+    return {
+        'verdict': overall,
+        'passed': sum(1 for c in cases if c['verdict'] == ACCEPTED),
+        'total': len(cases),
+        'execution_time': round(slowest, 3),
+        'cases': cases,
+        'compile_output': '',
+    }
+
+
+# Cheap local syntax pre-check (runs before the sandbox is touched)
+
+def precheck_syntax(language, code):
+    """
+    Catches broken Python without starting a container (ast.parse is the real parser).
+    Other languages go straight to their compiler: a home-made lexer would reject valid
+    code (raw strings, text blocks, digit separators). Returns an error message or None.
+    """
+    if language == 'python':
+        try:
+            ast.parse(code)
+        except SyntaxError as e:
+            return f"Line {e.lineno}: {e.msg}"
+    return None
+
+
+def judge_problem(problem, code):
+    """ Judges a submission against every ProblemTestCase of a DynamicBountyProblem. """
+    test_cases = problem.test_cases.order_by('is_hidden', 'id')
+    return judge_code(problem.language, code, test_cases)
@@ -0,0 +1,172 @@
+import time
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CoinEvent, User
+
+# Time windows for "coins earned" boards
+WINDOWS = {
+    'week': timedelta(days=7),
+    'month': timedelta(days=30),
+}
+
+# Bumped on every balance change; other processes rebuild their all-time board when it moved...
+BOARD_VERSION_KEY = 'leaderboard_version'
+# ... and every board is rebuilt after this many seconds anyway (balances changed without a signal, evicted version key)
+BOARD_MAX_STALENESS = 30
+# Window and per-course boards are re-aggregated from coin events at most this often (seconds)
+EVENT_BOARD_TTL = 60
+# Window and per-course boards kept per process (least recently used dropped first)
+EVENT_BOARD_MAX = 64
+
+
+class Board:
+    """
+    Scores kept sorted high to low as (-score, user_id) keys.
+    Rank lookups are a binary search (O(log n)); update() moves one entry instead of re-sorting.
+    """
+
+    def __init__(self, scores, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.scores = dict(scores)
+        self._keys = sorted((-score, user_id) for user_id, score in self.scores.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def top(self, n):
+        """ [(user_id, score)] for the first n places. """
+        return [(user_id, -neg_score) for neg_score, user_id in self._keys[:n]]
+
+    def rank_of(self, user_id):
+        """ 1-based rank (users with the same score share the better rank), None if the user isn't on the board. """
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, (-score,)) + 1
+
+    def update(self, user_id, score):
+        """ Moves one user to a new score (None removes them). """
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, user_id))]
+        if score is not None:
+            self.scores[user_id] = score
+            bisect.insort(self._keys, (-score, user_id))
+
+
+_board = None
+_event_boards = OrderedDict()
+_lock = threading.Lock()
+
+
+def _current_version():
+    cache.add(BOARD_VERSION_KEY, 1, None)
+    return cache.get(BOARD_VERSION_KEY) or 1
+
+
+def _build_global_board(version):
+    return Board(User.objects.filter(is_student=True).values_list('id', 'lms_coins'), version)
+
+
+def global_board():
+    """ All-time board by current coin balance (this process's copy, updated incrementally). """
+    global _board
+    version = _current_version()
+    with _lock:
+        if _board is None or _board.version != version or time.monotonic() - _board.built_at > BOARD_MAX_STALENESS:
+            _board = _build_global_board(version)
+        return _board
+
+
+def event_board(window=None, course_id=None):
+    """ Board of coins earned in a time window and/or inside one course, aggregated from CoinEvent rows. """
+    key = (window, course_id)
+    with _lock:
+        entry = _event_boards.get(key)
+        if entry is not None and time.monotonic() - entry.built_at < EVENT_BOARD_TTL:
+            _event_boards.move_to_end(key)
+            return entry
+
+    # Same people as the all-time board: teachers' and staff coins don't rank
+    events = CoinEvent.objects.filter(amount__gt=0, user__is_student=True).exclude(reason__in=CoinEvent.BOOKKEEPING_REASONS)
+    if window:
+        events = events.filter(created_at__gte=timezone.now() - WINDOWS[window])
+    if course_id:
+        events = events.filter(course_id=course_id)
+    board = Board(events.values('user').annotate(total=Sum('amount')).values_list('user', 'total'))
+
+    with _lock:
+        _event_boards[key] = board
+        _event_boards.move_to_end(key)
+        while len(_event_boards) > EVENT_BOARD_MAX:
+            _event_boards.popitem(last=False)
+    return board
+
+
+def get_board(window=None, course_id=None):
+    if window is None and course_id is None:
+        return global_board()
+    return event_board(window, course_id)
+
+
+def top_students(n=10, window=None, course_id=None):
+    """ The first n users of a board, each with .score and .rank set (one query for the users). """
+    board = get_board(window, course_id)
+    places = board.top(n)
+    users = User.objects.select_related('profile').in_bulk([user_id for user_id, _ in places])
+    leaders = []
+    for user_id, score in places:
+        user = users.get(user_id)
+        if user is not None:
+            user.score = score
+            user.rank = board.rank_of(user_id)
+            leaders.append(user)
+    return leaders
+
+
+def rank_of(user, window=None, course_id=None):
+    """ {'rank', 'score', 'total'} for one user on a board; rank is None when they have no score there. """
+    board = get_board(window, course_id)
+    return {'rank': board.rank_of(user.id), 'score': board.scores.get(user.id, 0), 'total': len(board)}
+
+
+def apply_balance(user_id, score):
+    """ Moves one user on this process's board and tells the other processes (score None = off the board). """
+    with _lock:
+        if _board is not None:
+            if _board.scores.get(user_id) == score:
+                return
+            _board.update(user_id, score)
+    try:
+        version = cache.incr(BOARD_VERSION_KEY)
+    except ValueError:
+        version = None
+        cache.set(BOARD_VERSION_KEY, 2, None)
+    with _lock:
+        # This process already applied the change: no rebuild needed for the version it just caused
+        if _board is not None and version is not None and _board.version == version - 1:
+            _board.version = version
+
+
+@receiver(post_save, sender=User)
+def balance_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'lms_coins', 'is_student'} & set(update_fields)):
+        return
+    score = instance.lms_coins if instance.is_student else None
+    transaction.on_commit(lambda: apply_balance(instance.id, score))
+
+
+@receiver(post_delete, sender=User)
+def user_removed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: apply_balance(instance.id, None))
@@ -0,0 +1,84 @@
+import json
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Django cache alias holding LLM replies (backend chosen in settings: locmem / file / db)
+LLM_CACHE_ALIAS = 'llm'
+LLM_CACHE_PREFIX = 'llm_reply:'
+
+# Per-feature opt-in: feature name -> TTL in seconds. Features not listed (or 0) are never cached.
+DEFAULT_POLICIES = {
+    'ai_chat': 60 * 60,                  # FAQ style questions with the same history
+    'quiz_generation': 60 * 60 * 24,     # same document -> same quiz
+    'challenge_generation': 60 * 10,     # same rare topic/difficulty requested in a burst
+}
+LLM_CACHE_POLICIES = {**DEFAULT_POLICIES, **getattr(settings, 'LLM_CACHE_POLICIES', {})}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(feature, name):
+    with _stats_lock:
+        feature_stats = _stats.setdefault(feature, {'hits': 0, 'misses': 0, 'stores': 0})
+        feature_stats[name] += 1
+
+
+def _normalize_content(content):
+    """ Whitespace differences must not split the cache ("What is  Python?\\n" == "What is Python?"). """
+    if isinstance(content, str):
+        return ' '.join(content.split())
+    return content  # multi-part (vision) content is kept as is
+
+
+def cache_ttl(feature):
+    """ TTL for a feature, or 0 when its replies must not be cached. """
+    if not feature:
+        return 0
+    return LLM_CACHE_POLICIES.get(feature) or 0
+
+
+def cache_key(model, messages, temperature, max_tokens):
+    normalized = [{'role': m.get('role'), 'content': _normalize_content(m.get('content'))} for m in messages]
+    raw = json.dumps([model, normalized, temperature, max_tokens], sort_keys=True, ensure_ascii=False)
+    return LLM_CACHE_PREFIX + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def lookup(feature, key):
+    """ Returns the cached reply text or None. """
+    try:
+        reply = caches[LLM_CACHE_ALIAS].get(key)
+    except Exception as e:
+        # A broken cache backend (e.g. missing DB table) must not take the AI features down
+        print(f"LLM Cache Error: {e}")
+        reply = None
+    _count(feature, 'hits' if reply is not None else 'misses')
+    return reply
+
+
+def store(feature, key, reply):
+    ttl = cache_ttl(feature)
+    if not ttl or not reply:
+        return
+    try:
+        caches[LLM_CACHE_ALIAS].set(key, reply, ttl)
+    except Exception as e:
+        print(f"LLM Cache Error: {e}")
+        return
+    _count(feature, 'stores')
+
+
+def cache_stats():
+    with _stats_lock:
+        per_feature = {name: dict(values) for name, values in _stats.items()}
+    for values in per_feature.values():
+        lookups = values['hits'] + values['misses']
+        values['hit_rate'] = round(values['hits'] / lookups, 3) if lookups else 0
+    return {
+        'backend': settings.CACHES.get(LLM_CACHE_ALIAS, {}).get('BACKEND', ''),
+        'policies': LLM_CACHE_POLICIES,
+        'features': per_feature,
+    }
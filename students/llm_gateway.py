@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import llm_cache
+from .llm_scheduler import scheduler, estimate_tokens, priority_for
+
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+VISION_MODEL = "llama-3.2-90b-vision-preview"
+
+# Per-call read timeout (seconds) unless the caller passes its own; connecting gets a short fixed budget
+LLM_TIMEOUT = getattr(settings, 'LLM_TIMEOUT', 20)
+LLM_CONNECT_TIMEOUT = 5
+# Extra attempts after the first one for 429 / 5xx / network errors
+LLM_MAX_RETRIES = getattr(settings, 'LLM_MAX_RETRIES', 2)
+# Kept-alive HTTPS connections to Groq (shared by every thread in the process)
+LLM_POOL_SIZE = getattr(settings, 'LLM_POOL_SIZE', 10)
+# Circuit breaker: open after this many failed calls in a row, try again after the cooldown
+LLM_BREAKER_THRESHOLD = getattr(settings, 'LLM_BREAKER_THRESHOLD', 5)
+LLM_BREAKER_COOLDOWN = getattr(settings, 'LLM_BREAKER_COOLDOWN', 30)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+
+
+class LLMError(Exception):
+    """ The LLM call failed (API error, timeout, bad response). Message is safe to show. """
+
+
+class LLMUnavailable(LLMError):
+    """ The circuit breaker is open: Groq has been failing, calls are refused without trying. """
+
+
+class LLMBusy(LLMError):
+    """ The Groq quota is used up for longer than this call may wait (shed by the scheduler). """
+
+
+# 1. CIRCUIT BREAKER
+
+class CircuitBreaker:
+    """
+    Stops hammering an upstream that keeps failing.
+    closed -> (threshold failures) -> open -> (cooldown) -> half-open: one trial call decides.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return 'open'
+            return 'half-open'
+
+
+breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN)
+
+
+# 2. SHARED HTTP SESSION
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {'calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'rejected_open_circuit': 0, 'coalesced': 0}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_session():
+    """ One keep-alive session per process, so calls skip the TCP + TLS handshake. """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def _api_key():
+    return getattr(settings, 'GROQ_API_KEY', None) or os.environ.get('GROQ_API_KEY', '')
+
+
+def _retry_after_seconds(retry_after):
+    try:
+        return float(retry_after) if retry_after else None
+    except ValueError:
+        return None
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """ Full-jitter exponential backoff; a Retry-After header from Groq wins when present. """
+    seconds = _retry_after_seconds(retry_after)
+    if seconds is not None:
+        return min(seconds, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _error_message(response):
+    try:
+        return response.json().get('error', {}).get('message') or response.text[:200]
+    except ValueError:
+        return response.text[:200]
+
+
+# 3. SINGLE-FLIGHT (REQUEST COALESCING)
+
+class _Flight:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Concurrent identical requests share one upstream call.
+    The first caller for a key (the leader) does the work; callers arriving while it is
+    in flight get the leader's result (or its exception) instead of calling Groq again.
+    Streams are shared chunk by chunk, so followers still see tokens as they arrive.
+    do() and stream() keep separate flights: a stream's chunks are never mistaken for a whole reply.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def _join(self, key):
+        """ Returns (flight, is_leader). Keys are (mode, request key) pairs. """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                _count('coalesced')
+                return flight, False
+            flight = _Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def _finish(self, key, flight, error=None):
+        with self._lock:
+            self._flights.pop(key, None)
+        with flight.cond:
+            flight.error = error
+            flight.done = True
+            flight.cond.notify_all()
+
+    def do(self, key, fn):
+        """ Returns fn(), shared with every concurrent caller using the same key. """
+        key = ('do', key)
+        flight, leader = self._join(key)
+        if not leader:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.done)
+            if flight.error:
+                raise flight.error
+            return flight.chunks[0]
+
+        try:
+            flight.chunks.append(fn())
+        except Exception as e:
+            self._finish(key, flight, e)
+            raise
+        self._finish(key, flight)
+        return flight.chunks[0]
+
+    def stream(self, key, make_stream):
+        """ Yields the chunks of make_stream(), shared with every concurrent caller using the same key. """
+        key = ('stream', key)
+        flight, leader = self._join(key)
+        if not leader:
+            yield from self._follow(flight)
+            return
+
+        try:
+            for chunk in make_stream():
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+                yield chunk
+        except GeneratorExit:
+            # The leader's client went away mid-stream; followers can't get the rest
+            self._finish(key, flight, LLMError('AI reply was interrupted. Please ask again.'))
+            raise
+        except Exception as e:
+            self._finish(key, flight, e)
+            raise
+        self._finish(key, flight)
+
+    def _follow(self, flight):
+        sent = 0
+        while True:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.done or len(flight.chunks) > sent)
+                new_chunks = flight.chunks[sent:]
+                finished, error = flight.done, flight.error
+            sent += len(new_chunks)
+            yield from new_chunks
+            if finished and sent == len(flight.chunks):
+                if error:
+                    raise error
+                return
+
+
+flights = SingleFlight()
+
+
+# 4. PUBLIC API
+
+def chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=None, timeout=None, retries=None, feature=None, user_id=None):
+    """
+    Sends a chat completion request to Groq and returns the reply text.
+    Retries 429 / 5xx / network errors with jittered backoff, then raises LLMError.
+    `feature` names the calling AI feature; features with a cache policy are answered
+    from the response cache when the same request was made recently.
+    Identical requests already in flight are joined instead of sent again.
+    Calls that reach Groq first wait for quota in the scheduler (priority from `feature`,
+    per-user budget from `user_id`) and raise LLMBusy if it can't be had in time.
+    """
+    key = llm_cache.cache_key(model, messages, temperature, max_tokens)
+    if llm_cache.cache_ttl(feature):
+        cached = llm_cache.lookup(feature, key)
+        if cached is not None:
+            return cached
+
+    def request():
+        reply = _request_completion(messages, model, temperature, max_tokens, timeout, retries, feature, user_id)
+        llm_cache.store(feature, key, reply)
+        return reply
+
+    return flights.do(key, request)
+
+
+def _acquire_quota(messages, max_tokens, feature, user_id):
+    ticket = scheduler.acquire(priority_for(feature), estimate_tokens(messages, max_tokens), user_id=user_id)
+    if ticket is None:
+        raise LLMBusy('AI is handling too many requests right now. Please try again in a minute.')
+    return ticket
+
+
+def _request_completion(messages, model, temperature, max_tokens, timeout, retries, feature=None, user_id=None):
+    ticket = _acquire_quota(messages, max_tokens, feature, user_id)
+    response = _post(_payload(messages, model, temperature, max_tokens), timeout, retries)
+    try:
+        data = response.json()
+        ticket.settle((data.get('usage') or {}).get('total_tokens'))
+        return data['choices'][0]['message']['content']
+    except (ValueError, KeyError, IndexError):
+        raise LLMError('Groq API returned an unexpected response.')
+
+
+def _payload(messages, model, temperature, max_tokens):
+    payload = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    return payload
+
+
+def _post(payload, timeout, retries, stream=False):
+    """
+    POSTs to Groq and returns the 200 response.
+    Retries 429 / 5xx / network errors (before any reply byte arrived), then raises LLMError.
+    """
+    api_key = _api_key()
+    if not api_key:
+        raise LLMError('GROQ_API_KEY is missing in backend.')
+    if not breaker.allow():
+        _count('rejected_open_circuit')
+        raise LLMUnavailable('AI service is temporarily unavailable. Please try again in a moment.')
+
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    timeout = (LLM_CONNECT_TIMEOUT, timeout or LLM_TIMEOUT)
+    retries = LLM_MAX_RETRIES if retries is None else retries
+
+    _count('calls')
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            _count('retries')
+        retry_after = None
+        try:
+            response = get_session().post(GROQ_CHAT_URL, headers=headers, json=payload, timeout=timeout, stream=stream)
+        except requests.RequestException as e:
+            last_error = f"Groq API unreachable: {e}"
+        else:
+            if response.status_code == 200:
+                breaker.record_success()
+                _count('succeeded')
+                return response
+            message = f"Groq API Error ({response.status_code}): {_error_message(response)}"
+            response.close()
+            if response.status_code not in RETRY_STATUSES:
+                # 4xx: our request is wrong, retrying won't help and Groq itself is healthy
+                breaker.record_success()
+                _count('failed')
+                raise LLMError(message)
+            last_error = message
+            retry_after = response.headers.get('Retry-After')
+            if response.status_code == 429:
+                # Hold every other caller too, they would only collect more 429s
+                scheduler.pause(_retry_after_seconds(retry_after))
+
+        if attempt < retries:
+            time.sleep(_backoff_delay(attempt, retry_after))
+
+    breaker.record_failure()
+    _count('failed')
+    raise LLMError(last_error)
+
+
+def stream_chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=None, timeout=None, retries=None, feature=None, user_id=None):
+    """
+    Like chat_completion, but yields the reply in text chunks as Groq produces them
+    (Server-Sent Events with "stream": true). The assembled reply is cached like a normal call.
+    Raises LLMError before the first chunk, or mid-stream if the connection breaks.
+    """
+    key = llm_cache.cache_key(model, messages, temperature, max_tokens)
+    if llm_cache.cache_ttl(feature):
+        cached = llm_cache.lookup(feature, key)
+        if cached is not None:
+            yield cached
+            return
+
+    yield from flights.stream(key, lambda: _stream_completion(messages, model, temperature, max_tokens, timeout, retries, feature, user_id, key))
+
+
+def _stream_completion(messages, model, temperature, max_tokens, timeout, retries, feature, user_id, key):
+    _acquire_quota(messages, max_tokens, feature, user_id)
+    payload = _payload(messages, model, temperature, max_tokens)
+    payload["stream"] = True
+    parts = []
+    with _post(payload, timeout, retries, stream=True) as response:
+        try:
+            for line in response.iter_lines():
+                # Decoded per line: SSE is UTF-8, but requests would guess ISO-8859-1 for text/*
+                line = line.decode('utf-8', errors='replace')
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except requests.RequestException as e:
+            raise LLMError(f"Groq stream interrupted: {e}")
+
+    llm_cache.store(feature, key, ''.join(parts))
+
+
+def complete(prompt, system=None, **kwargs):
+    """ Single-prompt shortcut for chat_completion. """
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return chat_completion(messages, **kwargs)
+
+
+def strip_fences(text):
+    """ Removes the ```json fences models like to wrap JSON in. """
+    return text.replace("```json", "").replace("```", "").strip()
+
+
+def gateway_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['circuit'] = breaker.state()
+    return stats
@@ -0,0 +1,224 @@
+import time
+import threading
+from collections import deque
+
+from django.conf import settings
+
+# Priorities: interactive traffic (someone is waiting on screen) always goes first
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# Which AI features count as interactive; anything not listed is batch work
+FEATURE_PRIORITIES = {
+    'ai_chat': INTERACTIVE,
+    'bounty_review': INTERACTIVE,
+    'challenge_generation': INTERACTIVE,
+    'community_ai': INTERACTIVE,
+    'quiz_generation': BATCH,
+    'community_auto_reply': BATCH,
+    'bounty_pool_refill': BATCH,
+}
+
+# Groq quota for this process (requests / tokens per minute), globally and per user
+LLM_RPM_LIMIT = getattr(settings, 'LLM_RPM_LIMIT', 30)
+LLM_TPM_LIMIT = getattr(settings, 'LLM_TPM_LIMIT', 12000)
+LLM_USER_RPM_LIMIT = getattr(settings, 'LLM_USER_RPM_LIMIT', 10)
+LLM_USER_TPM_LIMIT = getattr(settings, 'LLM_USER_TPM_LIMIT', 4000)
+# Batch work may only use this share of the global budget, the rest is kept for interactive calls
+LLM_BATCH_SHARE = getattr(settings, 'LLM_BATCH_SHARE', 0.7)
+# How long a call may queue for budget before it is shed (seconds)
+MAX_WAIT = {
+    INTERACTIVE: getattr(settings, 'LLM_INTERACTIVE_MAX_WAIT', 10),
+    BATCH: getattr(settings, 'LLM_BATCH_MAX_WAIT', 60),
+}
+
+WINDOW = 60
+# Pause after a 429 without a Retry-After header
+DEFAULT_RATE_LIMIT_PAUSE = 5
+# Reply budget assumed when the caller sets no max_tokens
+DEFAULT_REPLY_TOKENS = 512
+# Rough size of a token for the estimate (English text / code)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """ Prompt tokens (~4 chars each) plus the reply budget. Images count as a flat 1000. """
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get('type') == 'text':
+                    chars += len(part.get('text', ''))
+                else:
+                    images += 1
+    return chars // CHARS_PER_TOKEN + images * 1000 + (max_tokens or DEFAULT_REPLY_TOKENS)
+
+
+class SlidingWindow:
+    """ Requests and tokens spent in the last WINDOW seconds. Entries are [timestamp, tokens]. """
+
+    def __init__(self):
+        self.entries = deque()
+        self.tokens = 0
+
+    def prune(self, now):
+        while self.entries and self.entries[0][0] <= now - WINDOW:
+            self.tokens -= self.entries.popleft()[1]
+
+    def add(self, now, tokens):
+        entry = [now, tokens]
+        self.entries.append(entry)
+        self.tokens += tokens
+        return entry
+
+    def adjust(self, entry, tokens):
+        if any(e is entry for e in self.entries):
+            self.tokens += tokens - entry[1]
+        entry[1] = tokens
+
+    def delay(self, now, max_requests, max_tokens, tokens):
+        """ Seconds until one more request of `tokens` fits in the window (0 = fits now). """
+        self.prune(now)
+        tokens = min(tokens, max_tokens)  # a huge request must still fit into an empty window
+        requests_over = len(self.entries) + 1 - max_requests
+        tokens_over = self.tokens + tokens - max_tokens
+        if requests_over <= 0 and tokens_over <= 0:
+            return 0
+
+        freed_requests = 0
+        freed_tokens = 0
+        for timestamp, entry_tokens in self.entries:
+            freed_requests += 1
+            freed_tokens += entry_tokens
+            if freed_requests >= requests_over and freed_tokens >= tokens_over:
+                return timestamp + WINDOW - now
+        return WINDOW
+
+
+class Ticket:
+    """ Permission to make one call. settle() replaces the estimate with Groq's real token count. """
+
+    def __init__(self, scheduler, entries):
+        self._scheduler = scheduler
+        self._entries = entries
+
+    def settle(self, actual_tokens):
+        if actual_tokens:
+            self._scheduler.settle(self._entries, actual_tokens)
+
+
+class TokenBudgetScheduler:
+    """
+    Keeps this process under Groq's requests/minute and tokens/minute limits, globally and per user.
+    Calls that don't fit wait in line (interactive ahead of batch) until budget frees up;
+    if that would take longer than their priority's max wait they are shed instead.
+    """
+
+    def __init__(self, rpm, tpm, user_rpm, user_tpm, batch_share):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.user_rpm = user_rpm
+        self.user_tpm = user_tpm
+        self.batch_share = batch_share
+        self._cond = threading.Condition()
+        self._global = SlidingWindow()
+        self._users = {}
+        self._paused_until = 0
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._granted = {INTERACTIVE: 0, BATCH: 0}
+        self._shed = {INTERACTIVE: 0, BATCH: 0}
+        self._rate_limited = 0
+        self._wait_total = {INTERACTIVE: 0.0, BATCH: 0.0}
+
+    def _delay(self, priority, tokens, user_id, now):
+        if now < self._paused_until:
+            return self._paused_until - now
+        if priority == BATCH and self._waiting[INTERACTIVE]:
+            return 0.5
+
+        share = 1 if priority == INTERACTIVE else self.batch_share
+        delay = self._global.delay(now, max(1, int(self.rpm * share)), max(1, int(self.tpm * share)), tokens)
+        if user_id is not None and user_id in self._users:
+            delay = max(delay, self._users[user_id].delay(now, self.user_rpm, self.user_tpm, tokens))
+        return delay
+
+    def acquire(self, priority, tokens, user_id=None, max_wait=None):
+        """ Waits for budget and returns a Ticket, or None if the call has to be shed. """
+        max_wait = MAX_WAIT[priority] if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(priority, tokens, user_id, now)
+                    if delay <= 0:
+                        entries = [(self._global, self._global.add(now, tokens))]
+                        if user_id is not None:
+                            if user_id not in self._users and len(self._users) >= 500:
+                                self._prune_users(now)
+                            window = self._users.setdefault(user_id, SlidingWindow())
+                            entries.append((window, window.add(now, tokens)))
+                        self._granted[priority] += 1
+                        self._wait_total[priority] += now - start
+                        return Ticket(self, entries)
+                    if now + delay > deadline:
+                        self._shed[priority] += 1
+                        return None
+                    self._cond.wait(delay)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def settle(self, entries, actual_tokens):
+        with self._cond:
+            for window, entry in entries:
+                window.adjust(entry, actual_tokens)
+            self._cond.notify_all()
+
+    def pause(self, seconds=None):
+        """ Groq answered 429: hold every call until the limit resets instead of retrying into it. """
+        with self._cond:
+            self._rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + (seconds or DEFAULT_RATE_LIMIT_PAUSE))
+
+    def _prune_users(self, now):
+        for user_id, window in list(self._users.items()):
+            window.prune(now)
+            if not window.entries:
+                del self._users[user_id]
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._global.prune(now)
+            self._prune_users(now)
+            return {
+                'rpm_limit': self.rpm,
+                'tpm_limit': self.tpm,
+                'requests_last_minute': len(self._global.entries),
+                'tokens_last_minute': self._global.tokens,
+                'active_users': len(self._users),
+                'paused_for': round(max(0, self._paused_until - now), 1),
+                'rate_limited': self._rate_limited,
+                'waiting': dict(self._waiting),
+                'granted': dict(self._granted),
+                'shed': dict(self._shed),
+                'avg_wait_ms': {
+                    p: round(self._wait_total[p] / self._granted[p] * 1000, 1) if self._granted[p] else 0
+                    for p in (INTERACTIVE, BATCH)
+                },
+            }
+
+
+scheduler = TokenBudgetScheduler(LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_USER_RPM_LIMIT, LLM_USER_TPM_LIMIT, LLM_BATCH_SHARE)
+
+
+def priority_for(feature):
+    return FEATURE_PRIORITIES.get(feature, BATCH)
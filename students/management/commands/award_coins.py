@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from students.coin_ledger import apply_coins_bulk
+from students.models import CoinEvent, Course, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Pays the same coin reward to every student, or to the students enrolled in one course "
+        "(contest results, event prizes). Each student is paid once per --campaign, so re-running is safe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('amount', type=int, help='Coins per student')
+        parser.add_argument('--campaign', required=True, help='Name of the award; makes the payment idempotent')
+        parser.add_argument('--course', type=int, help='Only students enrolled in this course id')
+
+    def handle(self, *args, **options):
+        amount, campaign = options['amount'], options['campaign']
+        if amount <= 0:
+            raise CommandError("amount must be positive")
+
+        course = None
+        students = User.objects.filter(is_student=True)
+        if options['course']:
+            course = Course.objects.filter(id=options['course']).first()
+            if course is None:
+                raise CommandError(f"Course {options['course']} not found")
+            students = students.filter(enrollments__course=course)
+
+        student_ids = list(students.values_list('id', flat=True).distinct())
+        paid = apply_coins_bulk(
+            (user_id, amount, CoinEvent.REASON_ADMIN, course and course.id, f"award:{campaign}:{user_id}")
+            for user_id in student_ids
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Paid {amount} coins to {paid} student(s); {len(student_ids) - paid} already had this award."
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from students.bounty_service import (
+    BOUNTY_POOL_HIGH_WATER,
+    fill_pool,
+    normalize_topic,
+    pool_size,
+    popular_pool_keys,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Tops up the pre-generated bounty problem pool. Without --topic it fills every "
+        "(language, topic, difficulty) combination students requested often in the last --days days."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', default='python')
+        parser.add_argument('--topic', help='Fill only this topic')
+        parser.add_argument('--difficulty', default='Easy')
+        parser.add_argument('--count', type=int, default=BOUNTY_POOL_HIGH_WATER, help='Target pool size per combination')
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if options['topic']:
+            keys = [(options['language'], normalize_topic(options['topic']), options['difficulty'])]
+        else:
+            keys = popular_pool_keys(days=options['days'])
+
+        if not keys:
+            self.stdout.write("No popular topics to pool yet.")
+            return
+
+        for language, topic_key, difficulty in keys:
+            added = fill_pool(language, topic_key, difficulty, target=options['count'])
+            size = pool_size(language, topic_key, difficulty)
+            self.stdout.write(f"{language} / {topic_key} / {difficulty}: +{added} (pool size {size})")
+
+        self.stdout.write(self.style.SUCCESS("Bounty pool filled."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from students.chat_search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the community chat search index from all CourseGroupMessage rows."
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} message(s) with {type(get_backend()).__name__}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from students.activity import rebuild_activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the DailyActivity rollups behind the profile heatmap from bounty submissions, "
+        "quiz results and coin events (run once after upgrading, or after importing data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Rebuild only this user id')
+
+    def handle(self, *args, **options):
+        count = rebuild_activity(options['user'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} daily activity row(s)."))
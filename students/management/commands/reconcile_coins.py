@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from students.coin_ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks every user's lms_coins against the sum of their CoinEvent ledger entries. "
+        "With --fix, books each difference as a correction entry."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Write correction entries for the mismatches')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile(fix=options['fix'])
+        for user_id, username, balance, ledger_total in mismatches:
+            self.stdout.write(f"{username} (#{user_id}): balance {balance}, ledger {ledger_total} ({balance - ledger_total:+d})")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All balances match the ledger."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Booked {len(mismatches)} correction(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} mismatch(es); run with --fix to book corrections."))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from students.task_queue import claim_due, run_task, requeue_stale, purge_finished
+from students.chat_events import purge_old_events
+from students.coin_ledger import find_mismatches
+from students.execution_queue import purge_expired_jobs
+
+# Housekeeping (stale claims, old rows, old chat change log rows, expired code jobs) runs at most this often
+HOUSEKEEPING_INTERVAL = 300
+# Coin balances are checked against the ledger this often (reported only; fix with reconcile_coins --fix)
+RECONCILE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = "Runs due ScheduledTask rows (community auto-replies, ...). Polls the table in batches until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due now, then exit')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls when idle')
+
+    def handle(self, *args, **options):
+        last_housekeeping = 0
+        last_reconcile = 0
+        while True:
+            close_old_connections()
+
+            if time.monotonic() - last_housekeeping > HOUSEKEEPING_INTERVAL:
+                requeued = requeue_stale()
+                purged = purge_finished()
+                purged_events = purge_old_events()
+                purged_jobs = purge_expired_jobs()
+                if requeued or purged or purged_events or purged_jobs:
+                    self.stdout.write(
+                        f"Requeued {requeued} stale task(s), purged {purged} finished task(s), "
+                        f"{purged_events} chat event(s) and {purged_jobs} code job(s)."
+                    )
+                last_housekeeping = time.monotonic()
+
+            if time.monotonic() - last_reconcile > RECONCILE_INTERVAL:
+                mismatches = find_mismatches()
+                if mismatches:
+                    self.stdout.write(self.style.WARNING(
+                        f"{len(mismatches)} coin balance(s) differ from the ledger; run reconcile_coins for details."
+                    ))
+                last_reconcile = time.monotonic()
+
+            tasks = claim_due(options['batch_size'])
+            for task in tasks:
+                ok = run_task(task)
+                self.stdout.write(f"{task.kind} #{task.id}: {'done' if ok else 'failed'}")
+
+            if options['once']:
+                if len(tasks) < options['batch_size']:
+                    break
+                continue
+            if not tasks:
+                time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_course_assigned_faculty_user_is_faculty_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledBountyProblem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=50)),
+                ('topic_key', models.CharField(help_text='Normalized topic text', max_length=100)),
+                ('difficulty', models.CharField(max_length=50)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('base_code', models.TextField()),
+                ('test_cases', models.JSONField(default=list, help_text='[{"input": ..., "output": ..., "hidden": ...}]')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['language', 'topic_key', 'difficulty'], name='bounty_pool_key_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0012_scheduledtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseChatEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('message', 'New message'), ('update', 'Message changed'), ('delete', 'Message deleted'), ('reaction', 'Reactions changed')], max_length=10)),
+                ('message_id', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_events', to='students.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'id'], name='chat_event_cursor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0013_coursechatevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coursegroupmessage',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='chat_msg_history_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+from django.db import migrations, OperationalError
+
+
+def create_fts_index(apps, schema_editor):
+    """ FTS5 index for community chat search (SQLite only; other databases use the icontains fallback). """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    message_table = apps.get_model('students', 'CourseGroupMessage')._meta.db_table
+    user_table = apps.get_model('students', 'User')._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5(text, sender_name, course)")
+        except OperationalError:
+            # SQLite built without FTS5
+            return
+        cursor.execute(
+            f"INSERT INTO chat_message_fts (rowid, text, sender_name, course) "
+            f"SELECT m.id, COALESCE(m.text, ''), TRIM(COALESCE(u.first_name, '') || ' ' || u.username), 'course' || m.course_id "
+            f"FROM {message_table} m JOIN {user_table} u ON u.id = m.sender_id"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS chat_message_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0014_coursegroupmessage_chat_msg_history_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0015_chat_message_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('reason', models.CharField(choices=[('lesson', 'Lesson completed'), ('course_complete', 'Course completed'), ('quiz', 'Quiz passed'), ('bounty', 'Bounty Arena problem solved'), ('chat_bounty', 'Community chat bounty'), ('purchase', 'Course purchased with coins'), ('admin', 'Balance set by admin')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coin_events', to='students.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='coin_event_time_idx'), models.Index(fields=['course', 'created_at'], name='coin_event_course_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-17 20:00
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_ledger(apps, schema_editor):
+    """ One opening entry per user, so every existing balance equals the sum of its ledger entries. """
+    User = apps.get_model('students', 'User')
+    CoinEvent = apps.get_model('students', 'CoinEvent')
+    logged = dict(CoinEvent.objects.values('user').annotate(total=Sum('amount')).values_list('user', 'total'))
+    CoinEvent.objects.bulk_create([
+        CoinEvent(user_id=user_id, amount=balance - logged.get(user_id, 0), reason='opening', idempotency_key=f"opening:{user_id}")
+        for user_id, balance in User.objects.values_list('id', 'lms_coins')
+        if balance != logged.get(user_id, 0)
+    ], batch_size=500)
+
+
+def close_ledger(apps, schema_editor):
+    apps.get_model('students', 'CoinEvent').objects.filter(reason='opening').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0017_dailyactivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coinevent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='coinevent',
+            name='reason',
+            field=models.CharField(choices=[('lesson', 'Lesson completed'), ('course_complete', 'Course completed'), ('quiz', 'Quiz passed'), ('bounty', 'Bounty Arena problem solved'), ('chat_bounty', 'Community chat bounty'), ('purchase', 'Course purchased with coins'), ('admin', 'Balance set by admin'), ('opening', 'Opening balance'), ('correction', 'Reconciliation correction')], max_length=20),
+        ),
+        migrations.RunPython(open_ledger, close_ledger),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0018_coin_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeJob',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('language', models.CharField(max_length=20)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done')], default='queued', max_length=10)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('submitted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='code_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
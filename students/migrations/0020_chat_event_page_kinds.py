@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0019_codejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coursechatevent',
+            name='kind',
+            field=models.CharField(choices=[('message', 'New message'), ('update', 'Message changed'), ('delete', 'Message deleted'), ('reaction', 'Reactions changed'), ('members', 'Members joined or left'), ('course', 'Course details changed')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0020_chat_event_page_kinds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamicbountyproblem',
+            name='verification',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('failed', 'Failed')], default='verified', max_length=10),
+        ),
+    ]
@@ -140,6 +140,7 @@ class Lesson(models.Model):
     is_completed = models.BooleanField(default=False) 
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['order']
@@ -461,6 +462,8 @@ class CourseGroupMessage(models.Model):
     class Meta:
         # Like WhatsApp, your messages are on top and new messages are for water.
         ordering = ['created_at'] 
+        # Chat history is paged by (created_at, id) within a course, newest page first
+        indexes = [models.Index(fields=['course', 'created_at', 'id'], name='chat_msg_history_idx')]
 
     def __str__(self):
         return f"Message by {self.sender.username} in {self.course.title}"
@@ -489,12 +492,56 @@ class MessageReaction(models.Model):
         return f"{self.user.username} reacted {self.reaction_type} on Msg ID {self.message.id}"
 
 
+# --- NEW: Community Chat Change Log ---
+class CourseChatEvent(models.Model):
+    """
+    One row per change in a course chat (new/edited/deleted message, reaction change, member joined/left, course edited).
+    Open chat pages poll for the events after the last id they saw instead of re-rendering the whole chat.
+    """
+    KIND_MESSAGE = 'message'
+    KIND_UPDATE = 'update'
+    KIND_DELETE = 'delete'
+    KIND_REACTION = 'reaction'
+    KIND_MEMBERS = 'members'
+    KIND_COURSE = 'course'
+    KIND_CHOICES = [
+        (KIND_MESSAGE, 'New message'),
+        (KIND_UPDATE, 'Message changed'),
+        (KIND_DELETE, 'Message deleted'),
+        (KIND_REACTION, 'Reactions changed'),
+        (KIND_MEMBERS, 'Members joined or left'),
+        (KIND_COURSE, 'Course details changed'),
+    ]
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='chat_events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Plain id, not a foreign key: the message may already be deleted (0 for member/course events)
+    message_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['course', 'id'], name='chat_event_cursor_idx')]
+
+    def __str__(self):
+        return f"{self.kind} #{self.message_id} in {self.course.title}"
+
+
 # 🚀 NEW: BOUNTY ARENA (SYNTAX SINGULARITY) MODELS
 
 class DynamicBountyProblem(models.Model):
     """
     Stores the AI-generated coding problem specific to a student.
     """
+    # Live-generated problems are checked against their reference solution in the background
+    VERIFICATION_PENDING = 'pending'
+    VERIFICATION_VERIFIED = 'verified'
+    VERIFICATION_FAILED = 'failed'
+    VERIFICATION_CHOICES = [
+        (VERIFICATION_PENDING, 'Pending'),
+        (VERIFICATION_VERIFIED, 'Verified'),
+        (VERIFICATION_FAILED, 'Failed'),
+    ]
+
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bounty_problems')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='bounty_problems')
     language = models.CharField(max_length=50)
@@ -506,6 +553,7 @@ class DynamicBountyProblem(models.Model):
     base_code = models.TextField()
     
     base_bounty_coins = models.IntegerField(default=10)
+    verification = models.CharField(max_length=10, choices=VERIFICATION_CHOICES, default=VERIFICATION_VERIFIED)
     is_solved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -543,4 +591,154 @@ class BountySubmission(models.Model):
     submitted_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Submission by {self.student.username} - {self.status}"
\ No newline at end of file
+        return f"Submission by {self.student.username} - {self.status}"
+
+class PooledBountyProblem(models.Model):
+    """
+    A pre-generated, validated problem waiting in the pool for popular
+    (language, topic, difficulty) combinations. Handed to a student on request.
+    """
+    language = models.CharField(max_length=50)
+    topic_key = models.CharField(max_length=100, help_text="Normalized topic text")
+    difficulty = models.CharField(max_length=50)
+
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    base_code = models.TextField()
+    test_cases = models.JSONField(default=list, help_text='[{"input": ..., "output": ..., "hidden": ...}]')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['language', 'topic_key', 'difficulty'], name='bounty_pool_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"[Pool] {self.title} ({self.language} / {self.topic_key} / {self.difficulty})"
+
+class ScheduledTask(models.Model):
+    """
+    Durable delayed job (e.g. the 45 min community auto-reply), run by `manage.py run_scheduled_tasks`.
+    group_key lets a whole group be cancelled with one UPDATE (e.g. "course:5" when someone replies).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    run_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    group_key = models.CharField(max_length=100, blank=True, db_index=True)
+
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='scheduled_task_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} @ {self.run_at:%Y-%m-%d %H:%M} ({self.status})"
+
+# 🏆 LMS COIN ECONOMY: append-only ledger of every change to a balance (see students/coin_ledger.py).
+# The sum of a user's entries equals their lms_coins; also feeds the time-windowed and per-course leaderboards.
+class CoinEvent(models.Model):
+    REASON_LESSON = 'lesson'
+    REASON_COURSE_COMPLETE = 'course_complete'
+    REASON_QUIZ = 'quiz'
+    REASON_BOUNTY = 'bounty'
+    REASON_CHAT_BOUNTY = 'chat_bounty'
+    REASON_PURCHASE = 'purchase'
+    REASON_ADMIN = 'admin'
+    REASON_OPENING = 'opening'
+    REASON_CORRECTION = 'correction'
+    REASON_CHOICES = [
+        (REASON_LESSON, 'Lesson completed'),
+        (REASON_COURSE_COMPLETE, 'Course completed'),
+        (REASON_QUIZ, 'Quiz passed'),
+        (REASON_BOUNTY, 'Bounty Arena problem solved'),
+        (REASON_CHAT_BOUNTY, 'Community chat bounty'),
+        (REASON_PURCHASE, 'Course purchased with coins'),
+        (REASON_ADMIN, 'Balance set by admin'),
+        (REASON_OPENING, 'Opening balance'),
+        (REASON_CORRECTION, 'Reconciliation correction'),
+    ]
+    # Bookkeeping entries: they move the ledger, but nobody earned or spent anything
+    BOOKKEEPING_REASONS = (REASON_OPENING, REASON_CORRECTION)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coin_events')
+    # Positive = earned, negative = spent
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='coin_events')
+    # Set for rewards that must be paid only once (e.g. "quiz:<user>:<exam>"); a second attempt is a no-op
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='coin_event_time_idx'),
+            models.Index(fields=['course', 'created_at'], name='coin_event_course_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.amount:+d} ({self.reason})"
+
+# 📊 DAILY ACTIVITY ROLLUP: one row per user per active day, feeds the profile heatmap
+class DailyActivity(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity')
+    date = models.DateField()
+
+    solves = models.PositiveIntegerField(default=0)   # Bounty Arena problems solved
+    coins = models.PositiveIntegerField(default=0)    # LMS coins earned (spending not counted)
+    lessons = models.PositiveIntegerField(default=0)
+    quizzes = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Also the index behind the heatmap's (user, date range) query
+        unique_together = ('user', 'date')
+
+    def __str__(self):
+        return f"{self.user.username} @ {self.date}"
+
+# ⚙️ IDE CODE RUNS: submit + poll jobs. Kept in the database so a poll can land on any web process.
+class CodeJob(models.Model):
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_CHOICES = [
+        (STATE_QUEUED, 'Queued'),
+        (STATE_RUNNING, 'Running'),
+        (STATE_DONE, 'Done'),
+    ]
+
+    id = models.CharField(max_length=32, primary_key=True)  # uuid4 hex, handed to the client
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='code_jobs')
+    language = models.CharField(max_length=20)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_QUEUED)
+    result = models.JSONField(null=True, blank=True)
+
+    submitted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.language} job {self.id} ({self.state})"
@@ -0,0 +1,114 @@
+import uuid
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ScheduledTask
+
+# kind -> dotted path of the function run with **payload
+TASK_HANDLERS = {
+    'community_auto_reply': 'students.community_views.check_and_auto_reply',
+}
+# kind -> dotted path of the function run with (error, **payload) once a task has failed for good
+FAILURE_HANDLERS = {
+    'community_auto_reply': 'students.community_views.auto_reply_failed',
+}
+
+MAX_ATTEMPTS = 3
+# Retry delay after a failed attempt grows with each attempt
+RETRY_DELAY = timedelta(minutes=2)
+# A running task whose worker died is handed out again after this long
+STALE_AFTER = timedelta(minutes=10)
+STALE_TASK_ERROR = 'Worker stopped while running the task.'
+# Finished rows are deleted after this long
+KEEP_FINISHED = timedelta(days=7)
+
+
+def schedule(kind, payload, delay=None, run_at=None, group_key=''):
+    """ Stores a task to run after `delay` (timedelta) or at `run_at`. """
+    if kind not in TASK_HANDLERS:
+        raise ValueError(f"Unknown task kind: {kind}")
+    run_at = run_at or timezone.now() + (delay or timedelta())
+    return ScheduledTask.objects.create(kind=kind, payload=payload, run_at=run_at, group_key=group_key)
+
+
+def cancel_pending(group_key, kind=None):
+    """ Cancels every pending task of a group with a single UPDATE. Returns how many were cancelled. """
+    tasks = ScheduledTask.objects.filter(group_key=group_key, status=ScheduledTask.STATUS_PENDING)
+    if kind:
+        tasks = tasks.filter(kind=kind)
+    return tasks.update(status=ScheduledTask.STATUS_CANCELLED)
+
+
+def claim_due(batch_size=50):
+    """
+    Claims up to batch_size due tasks for this worker. The claim is one conditional UPDATE
+    (status still pending), so two workers polling at once never get the same task.
+    """
+    worker_token = uuid.uuid4().hex
+    now = timezone.now()
+    due_ids = list(
+        ScheduledTask.objects.filter(status=ScheduledTask.STATUS_PENDING, run_at__lte=now)
+        .order_by('run_at').values_list('id', flat=True)[:batch_size]
+    )
+    if not due_ids:
+        return []
+    ScheduledTask.objects.filter(id__in=due_ids, status=ScheduledTask.STATUS_PENDING).update(
+        status=ScheduledTask.STATUS_RUNNING, claimed_by=worker_token, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(ScheduledTask.objects.filter(claimed_by=worker_token, status=ScheduledTask.STATUS_RUNNING).order_by('run_at'))
+
+
+def run_task(task):
+    """ Runs one claimed task and records the outcome. Returns True on success. """
+    try:
+        handler = import_string(TASK_HANDLERS[task.kind])
+        handler(**task.payload)
+    except Exception as e:
+        print(f"Scheduled Task Error ({task.kind} #{task.id}): {e}")
+        if task.attempts < MAX_ATTEMPTS:
+            ScheduledTask.objects.filter(id=task.id).update(
+                status=ScheduledTask.STATUS_PENDING, run_at=timezone.now() + RETRY_DELAY * task.attempts,
+                claimed_by='', last_error=str(e)[:2000],
+            )
+        else:
+            ScheduledTask.objects.filter(id=task.id).update(status=ScheduledTask.STATUS_FAILED, last_error=str(e)[:2000])
+            _report_failure(task, e)
+        return False
+
+    ScheduledTask.objects.filter(id=task.id).update(status=ScheduledTask.STATUS_DONE)
+    return True
+
+
+def _report_failure(task, error):
+    if task.kind not in FAILURE_HANDLERS:
+        return
+    try:
+        import_string(FAILURE_HANDLERS[task.kind])(error, **task.payload)
+    except Exception as e:
+        print(f"Scheduled Task Failure Handler Error ({task.kind} #{task.id}): {e}")
+
+
+def requeue_stale():
+    """
+    Hands tasks from crashed workers out again. After MAX_ATTEMPTS they fail for good and
+    their failure handler runs, like for a task that raised.
+    """
+    stale = ScheduledTask.objects.filter(status=ScheduledTask.STATUS_RUNNING, claimed_at__lt=timezone.now() - STALE_AFTER)
+    for task in stale.filter(attempts__gte=MAX_ATTEMPTS):
+        # Conditional on the old claim, so two workers cleaning up at once report it only once
+        failed = ScheduledTask.objects.filter(
+            id=task.id, status=ScheduledTask.STATUS_RUNNING, claimed_by=task.claimed_by
+        ).update(status=ScheduledTask.STATUS_FAILED, last_error=STALE_TASK_ERROR)
+        if failed:
+            _report_failure(task, RuntimeError(STALE_TASK_ERROR))
+    return stale.update(status=ScheduledTask.STATUS_PENDING, claimed_by='')
+
+
+def purge_finished():
+    return ScheduledTask.objects.filter(
+        status__in=[ScheduledTask.STATUS_DONE, ScheduledTask.STATUS_CANCELLED, ScheduledTask.STATUS_FAILED],
+        run_at__lt=timezone.now() - KEEP_FINISHED,
+    ).delete()[0]
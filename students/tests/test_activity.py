@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from students import activity
+from students.coin_ledger import apply_coins
+from students.models import User, Course, Exam, QuizResult, DynamicBountyProblem, BountySubmission, CoinEvent, DailyActivity
+
+
+class ActivityTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='alice')
+        self.course = Course.objects.create(title='Algorithms', description='-')
+        self.today = timezone.localdate()
+
+    def _counts(self, day=None):
+        return DailyActivity.objects.filter(user=self.student, date=day or self.today).values(*activity.COUNTERS).get()
+
+    def _solve(self, coins=50):
+        problem = DynamicBountyProblem.objects.create(
+            student=self.student, course=self.course, language='python', topic='sums', difficulty='easy',
+            title='Add', description='-', base_code='', base_bounty_coins=coins,
+        )
+        return BountySubmission.objects.create(problem=problem, student=self.student, submitted_code='-', status='Accepted', earned_coins=coins)
+
+    def test_counters_add_up_in_one_row_per_day(self):
+        activity.record_activity(self.student.id, solves=1, coins=50)
+        activity.record_activity(self.student.id, solves=1, quizzes=0)
+        activity.record_activity(self.student.id, coins=0)
+        self.assertEqual(self._counts(), {'solves': 2, 'coins': 50, 'lessons': 0, 'quizzes': 0})
+        self.assertEqual(DailyActivity.objects.filter(user=self.student).count(), 1)
+
+    def test_signals_count_earnings_solves_and_quizzes(self):
+        apply_coins(self.student, 30, CoinEvent.REASON_LESSON)
+        apply_coins(self.student, -10, CoinEvent.REASON_PURCHASE)
+        apply_coins(self.student, 500, CoinEvent.REASON_CORRECTION)
+        self._solve()
+        BountySubmission.objects.create(problem=DynamicBountyProblem.objects.get(), student=self.student, submitted_code='-', status='Wrong Answer')
+        QuizResult.objects.create(student=self.student, exam=Exam.objects.create(course=self.course, title='Quiz'), score=5)
+        # The solve's coins are counted through its own CoinEvent, not twice
+        self.assertEqual(self._counts(), {'solves': 1, 'coins': 30, 'lessons': 1, 'quizzes': 1})
+
+    def test_heatmap_covers_the_window_only(self):
+        activity.record_activity(self.student.id, solves=1)
+        activity.record_activity(self.student.id, self.today - timedelta(days=activity.HEATMAP_DAYS - 1), coins=5)
+        activity.record_activity(self.student.id, self.today - timedelta(days=activity.HEATMAP_DAYS), coins=7)
+        heatmap = activity.heatmap(self.student)
+        self.assertEqual(list(heatmap), [(self.today - timedelta(days=activity.HEATMAP_DAYS - 1)).isoformat(), self.today.isoformat()])
+        self.assertEqual(heatmap[self.today.isoformat()]['solves'], 1)
+
+    def test_rebuild_matches_the_live_rollups(self):
+        apply_coins(self.student, 30, CoinEvent.REASON_LESSON)
+        self._solve(coins=40)
+        QuizResult.objects.create(student=self.student, exam=Exam.objects.create(course=self.course, title='Quiz'), score=5)
+        live = self._counts()
+
+        DailyActivity.objects.all().delete()
+        self.assertEqual(activity.rebuild_activity(self.student.id), 1)
+        self.assertEqual(self._counts(), live)
+
+    def test_rebuild_takes_coins_older_than_the_ledger_from_the_solves(self):
+        solve = self._solve(coins=40)
+        yesterday = timezone.now() - timedelta(days=1)
+        BountySubmission.objects.filter(pk=solve.pk).update(submitted_at=yesterday)
+        activity.rebuild_activity()
+        self.assertEqual(self._counts(timezone.localdate(yesterday)), {'solves': 1, 'coins': 40, 'lessons': 0, 'quizzes': 0})
+
+
+class HeatmapViewTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='alice')
+        self.client.force_login(self.student)
+        self.url = reverse('activity_heatmap')
+
+    def test_unchanged_heatmap_answers_304(self):
+        activity.record_activity(self.student.id, solves=1)
+        first = self.client.get(self.url)
+        data = first.json()
+        self.assertEqual(data['activity'][data['today']]['solves'], 1)
+        self.assertEqual(data['days'], activity.HEATMAP_DAYS)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        activity.record_activity(self.student.id, coins=5)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_etag_is_per_user(self):
+        first = self.client.get(self.url)
+        self.client.force_login(User.objects.create_user(username='bob'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
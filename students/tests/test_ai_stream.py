@@ -0,0 +1,118 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from students import ai_service, llm_cache, llm_gateway, views
+from students.llm_gateway import LLMError
+from students.models import User
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+
+class AiChatStreamViewTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='learner'))
+
+    def _post(self):
+        body = json.dumps({'question': 'What is a B-tree?', 'history': []})
+        return self.client.post(reverse('ai_chat_stream'), body, content_type='application/json')
+
+    def test_reply_is_sent_as_deltas_then_done(self):
+        with mock.patch.object(views, 'stream_learning_assistant_response', return_value=iter(['A balanced ', 'search tree.'])):
+            response = self._post()
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        self.assertEqual(parse_events(body), [
+            ('message', {'delta': 'A balanced '}),
+            ('message', {'delta': 'search tree.'}),
+            ('done', {'answer': 'A balanced search tree.'}),
+        ])
+
+    def test_broken_upstream_ends_with_the_friendly_error(self):
+        def failing_stream(*args, **kwargs):
+            yield 'Partial'
+            raise LLMError('Groq stream interrupted')
+
+        with mock.patch.object(ai_service, 'stream_chat_completion', side_effect=failing_stream), \
+                mock.patch.object(ai_service, 'build_assistant_messages', return_value=[]):
+            events = parse_events(b''.join(self._post().streaming_content).decode())
+        self.assertEqual(events[0], ('message', {'delta': 'Partial'}))
+        self.assertEqual(events[-1][0], 'done')
+        self.assertTrue(events[-1][1]['answer'].endswith(ai_service.AI_ERROR_REPLY))
+
+
+class GatewayStreamTests(SimpleTestCase):
+    def setUp(self):
+        caches[llm_cache.LLM_CACHE_ALIAS].clear()
+        self.addCleanup(caches[llm_cache.LLM_CACHE_ALIAS].clear)
+
+    def _upstream(self, lines):
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = iter(lines)
+        return mock.patch.object(llm_gateway, '_post', return_value=response)
+
+    def test_sse_lines_are_decoded_and_the_reply_is_cached(self):
+        lines = [
+            b'data: ' + json.dumps({'choices': [{'delta': {'content': 'Café '}}]}).encode(),
+            b'',
+            b': keep-alive',
+            b'data: ' + json.dumps({'choices': [{'delta': {'content': 'au lait'}}]}).encode(),
+            b'data: [DONE]',
+        ]
+        messages = [{'role': 'user', 'content': 'coffee?'}]
+        with self._upstream(lines), mock.patch.object(llm_gateway, '_acquire_quota'):
+            chunks = list(llm_gateway.stream_chat_completion(messages, feature='ai_chat'))
+        self.assertEqual(chunks, ['Café ', 'au lait'])
+
+        # Asked again: one chunk straight from the cache, Groq not involved
+        with mock.patch.object(llm_gateway, '_post') as post:
+            self.assertEqual(list(llm_gateway.stream_chat_completion(messages, feature='ai_chat')), ['Café au lait'])
+        post.assert_not_called()
+
+
+class IterateInThreadTests(SimpleTestCase):
+    async def test_items_arrive_before_the_iterator_is_finished(self):
+        release = threading.Event()
+
+        def slow():
+            yield 'first'
+            release.wait(5)
+            yield 'second'
+
+        stream = views._iterate_in_thread(slow())
+        self.assertEqual(await asyncio.wait_for(stream.__anext__(), 2), 'first')
+        release.set()
+        self.assertEqual(await asyncio.wait_for(stream.__anext__(), 2), 'second')
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(stream.__anext__(), 2)
+
+    async def test_client_going_away_stops_the_producer(self):
+        produced = []
+        step = threading.Event()
+
+        def endless():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+                step.wait(5)
+                step.clear()
+
+        stream = views._iterate_in_thread(endless())
+        await asyncio.wait_for(stream.__anext__(), 2)
+        await stream.aclose()
+        step.set()
+        await asyncio.sleep(0.1)
+        self.assertLessEqual(len(produced), 2)
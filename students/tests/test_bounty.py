@@ -0,0 +1,253 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+
+from students import bounty_service
+from students.judge import JudgeError, ACCEPTED, WRONG_ANSWER, COMPILATION_ERROR
+from students.models import User, Course, DynamicBountyProblem, ProblemTestCase, BountySubmission, PooledBountyProblem
+
+PROBLEM = {
+    'title': 'Add', 'description': 'Add two numbers.', 'base_code': 'print()',
+    'reference_solution': 'print(sum(map(int, input().split())))',
+    'test_cases': [
+        {'input': '1 2', 'output': '3', 'hidden': False},
+        {'input': '2 2', 'output': '4', 'hidden': True},
+        {'input': '5 5', 'output': '10', 'hidden': True},
+    ],
+}
+
+
+class BountySubmissionTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='solver', password='x')
+        self.course = Course.objects.create(title='Algorithms', description='-')
+        self.problem = DynamicBountyProblem.objects.create(
+            student=self.student, course=self.course, language='python', topic='sums', difficulty='easy',
+            title='Add', description='-', base_code='', base_bounty_coins=50,
+        )
+        ProblemTestCase.objects.create(problem=self.problem, input_data='1 2', expected_output='3')
+        self.client.force_login(self.student)
+        review = mock.patch('students.views._ai_bounty_review', return_value={'is_correct': True, 'feedback': 'ok'})
+        self.review = review.start()
+        self.addCleanup(review.stop)
+
+    def _submit(self, code='print(3)'):
+        response = self.client.post(reverse('submit_bounty'), json.dumps({'problem_id': self.problem.id, 'code': code}), content_type='application/json')
+        return response.json()
+
+    def _verdict(self, verdict):
+        case = {'case': 1, 'verdict': verdict, 'time': 0.01, 'hidden': True}
+        return {'verdict': verdict, 'passed': int(verdict == ACCEPTED), 'total': 1, 'execution_time': 0.01, 'cases': [case], 'compile_output': ''}
+
+    def _balance(self):
+        return User.objects.get(pk=self.student.pk).lms_coins
+
+    def test_syntax_error_is_not_an_attempt(self):
+        start = self._balance()
+        data = self._submit('print(')
+        self.assertEqual(data['verdict'], COMPILATION_ERROR)
+        self.assertIsNone(data['attempt'])
+        self.assertFalse(BountySubmission.objects.exists())
+
+        with mock.patch('students.views.judge_problem', return_value=self._verdict(ACCEPTED)):
+            data = self._submit()
+        self.assertEqual((data['attempt'], data['earned_coins']), (1, 50))
+        self.assertEqual(self._balance(), start + 50)
+
+    def test_only_the_first_attempt_pays(self):
+        with mock.patch('students.views.judge_problem', return_value=self._verdict(WRONG_ANSWER)):
+            self.assertEqual(self._submit()['attempt'], 1)
+        with mock.patch('students.views.judge_problem', return_value=self._verdict(ACCEPTED)):
+            data = self._submit()
+        self.assertTrue(data['is_correct'])
+        self.assertEqual((data['attempt'], data['earned_coins']), (2, 0))
+
+    def test_judge_outage_is_not_recorded(self):
+        with mock.patch('students.views.judge_problem', side_effect=JudgeError('docker down')):
+            data = self._submit()
+        self.assertEqual(data['verdict'], 'Not Judged')
+        self.assertEqual(data['earned_coins'], 0)
+        self.assertFalse(BountySubmission.objects.exists())
+
+    def test_ai_fallback_never_pays(self):
+        self.problem.test_cases.all().delete()
+        start = self._balance()
+        data = self._submit()
+        self.assertEqual(data['verdict'], 'AI Accepted')
+        self.assertEqual(data['earned_coins'], 0)
+        self.assertEqual(self._balance(), start)
+
+    def test_pending_problem_is_not_judged_yet(self):
+        self.problem.verification = DynamicBountyProblem.VERIFICATION_PENDING
+        self.problem.save()
+        with mock.patch('students.views.judge_problem') as judge:
+            data = self._submit()
+        self.assertEqual(data['status'], 'error')
+        judge.assert_not_called()
+        self.assertFalse(BountySubmission.objects.exists())
+
+
+class LiveChallengeTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='arena', password='x')
+        self.course = Course.objects.create(title='Algorithms', description='-')
+        self.client.force_login(self.student)
+
+    def _generate(self):
+        body = {'course_id': self.course.id, 'language': 'python', 'topic': 'rare topic', 'difficulty': 'Easy'}
+        return self.client.post(reverse('generate_challenge'), json.dumps(body), content_type='application/json').json()
+
+    def test_live_problem_uses_the_interactive_feature_and_is_verified_later(self):
+        with mock.patch.object(bounty_service, 'complete', return_value=json.dumps(PROBLEM)) as complete, \
+                mock.patch.object(bounty_service, 'validate_problem_data') as validate, \
+                mock.patch.object(bounty_service.verify_pool, 'submit', return_value=object()) as submit:
+            data = self._generate()
+
+        self.assertEqual(complete.call_args.kwargs['feature'], 'challenge_generation')
+        validate.assert_not_called()  # the sandbox never runs on the request path
+        self.assertEqual((data['verification'], data['base_coins']), ('pending', 0))
+        problem = DynamicBountyProblem.objects.get(id=data['problem_id'])
+        self.assertFalse(problem.test_cases.exists())
+        self.assertEqual(submit.call_args.args[1:], (problem.id, PROBLEM))
+
+        status = self.client.get(data['status_url']).json()
+        self.assertEqual(status['verification'], 'pending')
+
+    def test_full_verification_queue_leaves_a_practice_problem(self):
+        with mock.patch.object(bounty_service, 'complete', return_value=json.dumps(PROBLEM)), \
+                mock.patch.object(bounty_service.verify_pool, 'submit', return_value=None):
+            data = self._generate()
+        self.assertEqual(data['verification'], 'failed')
+        self.assertEqual(DynamicBountyProblem.objects.get(id=data['problem_id']).verification, 'failed')
+
+    def test_status_is_private(self):
+        problem = bounty_service.create_problem_for_student(self.student, self.course, 'python', 'sums', 'Easy', PROBLEM)
+        self.client.force_login(User.objects.create_user(username='someone-else'))
+        self.assertEqual(self.client.get(reverse('challenge_status', args=[problem.id])).status_code, 404)
+
+
+class VerifyLiveProblemTests(TestCase):
+    def setUp(self):
+        student = User.objects.create_user(username='arena')
+        course = Course.objects.create(title='Algorithms', description='-')
+        self.problem = bounty_service.create_problem_for_student(
+            student, course, 'python', 'sums', 'Medium', PROBLEM, verification=DynamicBountyProblem.VERIFICATION_PENDING,
+        )
+
+    def test_passing_reference_solution_attaches_cases_and_coins(self):
+        with mock.patch.object(bounty_service, 'judge_code', return_value={'verdict': ACCEPTED, 'passed': 3, 'total': 3}):
+            self.assertEqual(bounty_service.verify_live_problem(self.problem.id, PROBLEM), 'verified')
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.base_bounty_coins, bounty_service.bounty_coins_for('Medium'))
+        self.assertEqual(ProblemTestCase.objects.filter(problem=self.problem, is_hidden=True).count(), 2)
+
+    def test_failing_reference_solution_stays_practice(self):
+        with mock.patch.object(bounty_service, 'judge_code', return_value={'verdict': WRONG_ANSWER, 'passed': 1, 'total': 3}):
+            self.assertEqual(bounty_service.verify_live_problem(self.problem.id, PROBLEM), 'failed')
+        self.problem.refresh_from_db()
+        self.assertEqual((self.problem.verification, self.problem.base_bounty_coins), ('failed', 0))
+        self.assertFalse(self.problem.test_cases.exists())
+
+    def test_a_problem_is_verified_once(self):
+        with mock.patch.object(bounty_service, 'judge_code', return_value={'verdict': ACCEPTED, 'passed': 3, 'total': 3}) as judge:
+            bounty_service.verify_live_problem(self.problem.id, PROBLEM)
+            self.assertIsNone(bounty_service.verify_live_problem(self.problem.id, PROBLEM))
+        self.assertEqual(judge.call_count, 1)
+        self.assertEqual(self.problem.test_cases.count(), 3)
+
+
+class PoolRefillFeatureTests(TestCase):
+    def test_refill_goes_through_the_batch_feature(self):
+        with mock.patch.object(bounty_service, 'complete', return_value=json.dumps(PROBLEM)) as complete, \
+                mock.patch.object(bounty_service, 'validate_problem_data', return_value=None):
+            self.assertEqual(bounty_service.fill_pool('python', 'sums', 'Easy', target=1), 1)
+        self.assertEqual(complete.call_args.kwargs['feature'], 'bounty_pool_refill')
+
+
+class BountyPoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _pool(self, count, topic_key='binary search'):
+        for i in range(count):
+            PooledBountyProblem.objects.create(
+                language='python', topic_key=topic_key, difficulty='Easy',
+                title=f"Pooled {i}", description='-', base_code='', test_cases=PROBLEM['test_cases'],
+            )
+
+    def test_topics_are_normalized_into_one_pool(self):
+        self.assertEqual(bounty_service.normalize_topic('Binary  Search!!'), 'binary search')
+        self.assertEqual(bounty_service.normalize_topic('   '), 'logic')
+        self.assertNotIn(' ', bounty_service._pool_key('python', 'binary search', 'Very Hard'))
+
+    def test_pooled_problem_is_served_once(self):
+        self._pool(1)
+        with mock.patch.object(bounty_service, 'schedule_refill'):
+            served = bounty_service.serve_problem_from_pool('python', 'Binary Search', 'Easy')
+            self.assertEqual(served['title'], 'Pooled 0')
+            self.assertIsNone(bounty_service.serve_problem_from_pool('python', 'binary search', 'Easy'))
+        self.assertFalse(PooledBountyProblem.objects.exists())
+
+    def test_pool_problem_is_verified_with_its_test_cases(self):
+        self._pool(1)
+        student = User.objects.create_user(username='pooled')
+        course = Course.objects.create(title='Algorithms', description='-')
+        with mock.patch.object(bounty_service, 'schedule_refill'):
+            data = bounty_service.serve_problem_from_pool('python', 'binary search', 'Easy')
+        problem = bounty_service.create_problem_for_student(student, course, 'python', 'binary search', 'Easy', data)
+        self.assertEqual(problem.verification, 'verified')
+        self.assertEqual(problem.test_cases.count(), 3)
+
+    def test_refill_starts_only_for_popular_topics(self):
+        with mock.patch.object(bounty_service, 'schedule_refill') as refill:
+            for _ in range(bounty_service.BOUNTY_POOL_MIN_DEMAND - 1):
+                bounty_service.serve_problem_from_pool('python', 'graphs', 'Easy')
+            refill.assert_not_called()
+            bounty_service.serve_problem_from_pool('python', 'graphs', 'Easy')
+        refill.assert_called_once_with('python', 'graphs', 'Easy')
+
+    def test_full_pool_is_not_refilled(self):
+        # Every request takes a problem, the pool stays at LOW_WATER after the last one
+        self._pool(bounty_service.BOUNTY_POOL_LOW_WATER + bounty_service.BOUNTY_POOL_MIN_DEMAND, topic_key='graphs')
+        with mock.patch.object(bounty_service, 'schedule_refill') as refill:
+            for _ in range(bounty_service.BOUNTY_POOL_MIN_DEMAND):
+                bounty_service.serve_problem_from_pool('python', 'graphs', 'Easy')
+        refill.assert_not_called()
+
+    def test_one_refill_per_combination_at_a_time(self):
+        with mock.patch.object(bounty_service.refill_pool, 'submit', return_value=object()) as submit:
+            self.assertTrue(bounty_service.schedule_refill('python', 'graphs', 'Easy'))
+            self.assertFalse(bounty_service.schedule_refill('python', 'graphs', 'Easy'))
+            self.assertTrue(bounty_service.schedule_refill('python', 'graphs', 'Hard'))
+        self.assertEqual(submit.call_count, 2)
+
+    def test_rejected_refill_releases_its_lock(self):
+        with mock.patch.object(bounty_service.refill_pool, 'submit', return_value=None):
+            self.assertFalse(bounty_service.schedule_refill('python', 'graphs', 'Easy'))
+        with mock.patch.object(bounty_service.refill_pool, 'submit', return_value=object()):
+            self.assertTrue(bounty_service.schedule_refill('python', 'graphs', 'Easy'))
+
+    def test_fill_pool_gives_up_on_a_bad_topic(self):
+        with mock.patch.object(bounty_service, 'complete', return_value=json.dumps(PROBLEM)) as complete, \
+                mock.patch.object(bounty_service, 'validate_problem_data', return_value='reference solution got Wrong Answer'):
+            self.assertEqual(bounty_service.fill_pool('python', 'graphs', 'Easy', target=2), 0)
+        self.assertEqual(complete.call_count, 4)
+        self.assertFalse(PooledBountyProblem.objects.exists())
+
+
+class ValidateProblemDataTests(SimpleTestCase):
+    def test_problems_need_visible_and_hidden_cases(self):
+        only_hidden = dict(PROBLEM, test_cases=[dict(c, hidden=True) for c in PROBLEM['test_cases']])
+        self.assertIn('visible and hidden', bounty_service.validate_problem_data('python', only_hidden))
+        self.assertIn('test cases', bounty_service.validate_problem_data('python', dict(PROBLEM, test_cases=PROBLEM['test_cases'][:2])))
+
+    def test_reference_solution_must_pass_in_the_sandbox(self):
+        with mock.patch.object(bounty_service, 'judge_code', side_effect=JudgeError('docker down')):
+            self.assertIn('sandbox unavailable', bounty_service.validate_problem_data('python', PROBLEM))
+        with mock.patch.object(bounty_service, 'judge_code', return_value={'verdict': ACCEPTED, 'passed': 3, 'total': 3}) as judge:
+            self.assertIsNone(bounty_service.validate_problem_data('python', PROBLEM))
+        self.assertEqual(judge.call_args.args[1], PROBLEM['reference_solution'])
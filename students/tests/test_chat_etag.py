@@ -0,0 +1,60 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from students.chat_events import chat_version
+from students.models import User, Course, Enrollment, CourseGroupMessage, CourseChatEvent
+
+
+class ChatEtagTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='member', password='x')
+        self.course = Course.objects.create(title='Databases', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+        self.url = reverse('chat_updates', args=[self.course.slug]) + '?since=0'
+
+    def _say(self, text, course=None):
+        return CourseGroupMessage.objects.create(course=course or self.course, sender=self.student, text=text)
+
+    def test_unchanged_chat_answers_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        msg = self._say('New index idea')
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn(msg.id, [m['id'] for m in changed.json()['messages']])
+
+    def test_version_is_shared_through_the_database(self):
+        version = chat_version(self.course.slug)
+        # Written like the background worker would: no cache, no broker involved
+        CourseChatEvent.objects.create(course=self.course, kind=CourseChatEvent.KIND_MESSAGE, message_id=1)
+        self.assertGreater(chat_version(self.course.slug), version)
+
+        version = chat_version(self.course.slug)
+        Enrollment.objects.create(student=User.objects.create_user(username='newcomer'), course=self.course)
+        self.assertGreater(chat_version(self.course.slug), version)
+
+    def test_changed_balance_changes_the_etag(self):
+        first = self.client.get(self.url)
+        User.objects.filter(pk=self.student.pk).update(lms_coins=self.student.lms_coins + 5)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_pending_flash_message_is_never_a_304(self):
+        page_url = reverse('course_community_chat', args=[self.course.slug])
+        first = self.client.get(page_url)
+        self.assertEqual(first.status_code, 200)
+
+        # Refused bounty: nothing in the chat changes, the page is redirected to with an error
+        User.objects.filter(pk=self.student.pk).update(lms_coins=0)
+        first = self.client.get(page_url)
+        response = self.client.post(page_url, {'message_text': 'Help!', 'bounty_amount': '500'})
+        self.assertRedirects(response, page_url, fetch_redirect_response=False)
+
+        shown = self.client.get(page_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(shown.status_code, 200)
+        self.assertContains(shown, 'Insufficient LMS Coins')
+        # Once shown, the unchanged page is a 304 again
+        self.assertEqual(self.client.get(page_url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
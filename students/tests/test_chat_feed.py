@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from students import chat_events
+from students.models import User, Course, Enrollment, CourseGroupMessage, CourseChatEvent
+
+
+class ChatFeedTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='member', password='x')
+        self.course = Course.objects.create(title='Databases', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+        self.url = reverse('chat_updates', args=[self.course.slug]) + '?since=0'
+
+    def _say(self, text, course=None):
+        return CourseGroupMessage.objects.create(course=course or self.course, sender=self.student, text=text)
+
+    def _updates(self, since):
+        return self.client.get(reverse('chat_updates', args=[self.course.slug]) + f'?since={since}').json()
+
+    def test_feed_returns_changes_after_the_cursor(self):
+        old = self._say('old')
+        cursor = self.client.get(self.url).json()['cursor']
+        new = self._say('new')
+        old_id = old.id
+        old.delete()
+        data = self.client.get(reverse('chat_updates', args=[self.course.slug]) + f'?since={cursor}').json()
+        self.assertEqual([m['id'] for m in data['messages']], [new.id])
+        self.assertEqual(data['deleted'], [old_id])
+        self.assertGreater(data['cursor'], cursor)
+
+    def test_edits_are_sent_again_with_the_new_text(self):
+        msg = self._say('first draft')
+        cursor = self._updates(0)['cursor']
+        msg.text = 'final wording'
+        msg.save()
+        data = self._updates(cursor)
+        self.assertEqual([m['id'] for m in data['messages']], [msg.id])
+        self.assertIn('final wording', data['messages'][0]['html'])
+        self.assertIn('pinned', data)
+
+    def test_other_courses_are_not_included(self):
+        other = Course.objects.create(title='Compilers', description='-')
+        self._say('elsewhere', course=other)
+        self.assertEqual(self._updates(0)['messages'], [])
+
+    def test_large_backlog_is_paged(self):
+        said = [self._say(text).id for text in ('a', 'b', 'c', 'd', 'e')]
+        received, pages, cursor = [], 0, 0
+        with mock.patch.object(chat_events, 'EVENTS_PER_POLL', 2):
+            while True:
+                data = self._updates(cursor)
+                pages += 1
+                received += [m['id'] for m in data['messages']]
+                cursor = data['cursor']
+                if not data['has_more']:
+                    break
+        self.assertGreaterEqual(pages, 3)
+        self.assertEqual(sorted(received), said)
+
+    def test_purged_cursor_asks_for_a_reload(self):
+        for text in ('a', 'b', 'c'):
+            self._say(text)
+        oldest = CourseChatEvent.objects.order_by('id').first()
+        CourseChatEvent.objects.filter(id__lte=oldest.id + 1).delete()
+        self.assertEqual(self._updates(oldest.id)['reload'], True)
+
+    def test_outsiders_are_refused(self):
+        self.client.force_login(User.objects.create_user(username='outsider'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
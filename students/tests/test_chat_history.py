@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from students import community_views
+from students.models import User, Course, Enrollment, CourseGroupMessage
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='member', password='x')
+        self.course = Course.objects.create(title='Databases', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+        start = timezone.now() - timedelta(hours=1)
+        self.messages = []
+        for i in range(7):
+            msg = CourseGroupMessage.objects.create(course=self.course, sender=self.student, text=f"message {i}")
+            # Two messages share a timestamp: the id breaks the tie
+            CourseGroupMessage.objects.filter(id=msg.id).update(created_at=start + timedelta(minutes=min(i, 5)))
+            self.messages.append(msg.id)
+
+    def _history(self, before):
+        return self.client.get(reverse('chat_history', args=[self.course.slug]) + f"?before={before}").json()
+
+    def test_scrolling_back_visits_every_message_once(self):
+        with mock.patch.object(community_views, 'CHAT_PAGE_SIZE', 3):
+            page, has_older = community_views.message_page(self.course)
+            self.assertTrue(has_older)
+            seen = [msg.id for msg in page]
+            cursor = community_views.history_cursor(page[0])
+            while cursor:
+                data = self._history(cursor)
+                # Pages come back oldest first, ready to be inserted above the loaded ones
+                ids = [int(part.split('"', 1)[0]) for part in data['html'].split('id="msg-')[1:]]
+                self.assertEqual(ids, sorted(ids))
+                self.assertLessEqual(len(ids), 3)
+                seen = ids + seen
+                cursor = data['cursor']
+                self.assertEqual(bool(cursor), data['has_older'])
+        self.assertEqual(seen, self.messages)
+
+    def test_newest_page_is_oldest_first(self):
+        page, has_older = community_views.message_page(self.course, limit=10)
+        self.assertFalse(has_older)
+        self.assertEqual([msg.id for msg in page], self.messages)
+
+    def test_bad_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('chat_history', args=[self.course.slug]) + '?before=nope').status_code, 400)
+
+    def test_outsiders_are_refused(self):
+        self.client.force_login(User.objects.create_user(username='outsider'))
+        first = community_views.history_cursor(CourseGroupMessage.objects.get(id=self.messages[-1]))
+        self.assertEqual(self.client.get(reverse('chat_history', args=[self.course.slug]) + f"?before={first}").status_code, 403)
+
+
+class FeedChangeKindTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='member', password='x')
+        self.course = Course.objects.create(title='Databases', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+
+    def _updates(self, since):
+        return self.client.get(reverse('chat_updates', args=[self.course.slug]) + f'?since={since}').json()
+
+    def test_new_messages_and_updates_are_told_apart(self):
+        old = CourseGroupMessage.objects.create(course=self.course, sender=self.student, text='old, not on the first page')
+        cursor = self._updates(0)['cursor']
+        old.text = 'edited later'
+        old.save()
+        new = CourseGroupMessage.objects.create(course=self.course, sender=self.student, text='new')
+        new.text = 'new, edited right away'
+        new.save()
+        data = self._updates(cursor)
+        self.assertEqual([(m['id'], m['kind']) for m in data['messages']], [(old.id, 'update'), (new.id, 'message')])
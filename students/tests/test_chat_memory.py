@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from students import chat_memory
+
+
+class TrimMessageTests(SimpleTestCase):
+    def test_short_message_is_unchanged(self):
+        self.assertEqual(chat_memory._trim_message('short question'), 'short question')
+
+    def test_long_message_keeps_head_and_tail(self):
+        content = 'start ' + 'word ' * 2000 + ' finish'
+        trimmed = chat_memory._trim_message(content)
+        self.assertTrue(trimmed.startswith('start'))
+        self.assertTrue(trimmed.endswith('finish'))
+        self.assertIn('characters trimmed', trimmed)
+        self.assertLess(chat_memory.count_tokens(trimmed), chat_memory.MESSAGE_TOKEN_CAP * 1.1)
+
+    def test_dense_message_is_cut_not_duplicated(self):
+        # Symbols count one token each: over the cap, yet fewer characters than the old fixed cut
+        content = '{}' * 500
+        trimmed = chat_memory._trim_message(content)
+        self.assertLess(len(trimmed), len(content))
+        self.assertLess(chat_memory.count_tokens(trimmed), chat_memory.MESSAGE_TOKEN_CAP * 1.1)
+
+
+class ConversationHistoryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_turns_are_remembered_per_conversation(self):
+        chat_memory.remember_turn('c1', 'What is a heap?', 'A tree-shaped priority queue.')
+        self.assertEqual(chat_memory.build_history('c1'), [
+            {'role': 'user', 'content': 'What is a heap?'},
+            {'role': 'assistant', 'content': 'A tree-shaped priority queue.'},
+        ])
+        self.assertEqual(chat_memory.build_history('c2'), [])
+        self.assertEqual(chat_memory.last_user_message('c1'), 'What is a heap?')
+
+    def test_old_turns_are_folded_into_a_summary_within_the_budget(self):
+        for i in range(30):
+            chat_memory.remember_turn('long', f"Question {i} " + 'about sorting ' * 20, f"Answer {i} " + 'merge sort ' * 20)
+        history = chat_memory.build_history('long')
+        self.assertEqual(history[0]['role'], 'system')
+        self.assertIn('Summary of the earlier conversation', history[0]['content'])
+        self.assertTrue(history[-1]['content'].startswith('Answer 29'))
+        turns_tokens = sum(chat_memory.count_tokens(m['content']) for m in history[1:])
+        self.assertLessEqual(turns_tokens, chat_memory.HISTORY_TOKEN_BUDGET)
+        self.assertLessEqual(chat_memory.count_tokens(history[0]['content']), chat_memory.SUMMARY_TOKEN_BUDGET + 20)
+
+    def test_client_history_wins_over_the_stored_turns(self):
+        chat_memory.remember_turn('c1', 'stored question', 'stored answer')
+        sent = [{'role': 'user', 'content': 'sent question'}]
+        self.assertEqual(chat_memory.build_history('c1', sent), sent)
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from students.community_views import history_cursor
+from students.models import User, Course, Enrollment, CourseGroupMessage, MessageReaction
+
+
+class ChatQueryCountTests(TestCase):
+    """ Rendering cost must not grow with the number of messages or reactions on the page. """
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='member', password='x')
+        self.course = Course.objects.create(title='Databases', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+        self.reactors = [User.objects.create_user(username=f"reactor{i}") for i in range(3)]
+        self._add_messages(2)
+
+    def _add_messages(self, count):
+        for i in range(count):
+            msg = CourseGroupMessage.objects.create(course=self.course, sender=self.student, text=f"message {i}")
+            for reactor, reaction_type in zip(self.reactors, ('like', 'fire', 'like')):
+                MessageReaction.objects.create(message=msg, user=reactor, reaction_type=reaction_type)
+
+    def _assert_constant_queries(self, fetch):
+        with CaptureQueriesContext(connection) as baseline:
+            response = fetch()
+        self.assertEqual(response.status_code, 200)
+        self._add_messages(10)
+        with self.assertNumQueries(len(baseline.captured_queries)):
+            response = fetch()
+        return response
+
+    def test_chat_page(self):
+        response = self._assert_constant_queries(lambda: self.client.get(reverse('course_community_chat', args=[self.course.slug])))
+        self.assertContains(response, 'reactor0')
+
+    def test_update_feed(self):
+        url = reverse('chat_updates', args=[self.course.slug]) + '?since=0'
+        response = self._assert_constant_queries(lambda: self.client.get(url))
+        self.assertEqual(len(response.json()['messages']), 12)
+
+    def test_history_page(self):
+        # Everything written during the test is older than the cursor
+        newest = CourseGroupMessage.objects.create(course=self.course, sender=self.student, text='newest')
+        newest.created_at += timedelta(days=1)
+        CourseGroupMessage.objects.filter(id=newest.id).update(created_at=newest.created_at)
+        url = reverse('chat_history', args=[self.course.slug]) + f"?before={history_cursor(newest)}"
+        response = self._assert_constant_queries(lambda: self.client.get(url))
+        self.assertEqual(response.json()['html'].count('id="msg-'), 12)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from students import chat_search
+from students.chat_search import search_messages
+from students.models import User, Course, Enrollment, CourseGroupMessage
+
+
+class ChatSearchTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='member', password='x')
+        self.course = Course.objects.create(title='Databases', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+
+    def _say(self, text, course=None):
+        return CourseGroupMessage.objects.create(course=course or self.course, sender=self.student, text=text)
+
+    def test_search_ranks_and_scopes_to_the_course(self):
+        other_course = Course.objects.create(title='Compilers', description='-')
+        hit = self._say('Use a covering index for this query')
+        self._say('Lunch at noon?')
+        self._say('index index index', course=other_course)
+
+        results = search_messages(self.course.id, 'index')
+        self.assertEqual([m.id for m in results], [hit.id])
+        if results[0].search_snippet is not None:  # FTS5 build: highlighted snippet
+            self.assertIn('<mark>index</mark>', results[0].search_snippet)
+
+        self.assertEqual([m.id for m in search_messages(self.course.id, 'cover')], [hit.id])  # prefix match
+        hit.text = 'Rewritten message'
+        hit.save()
+        self.assertEqual(search_messages(self.course.id, 'covering'), [])
+        self.assertEqual([m.id for m in search_messages(self.course.id, 'rewritten')], [hit.id])
+
+    def test_query_syntax_from_users_is_plain_text(self):
+        hit = self._say('Is NOT NULL faster than a default?')
+        for query in ('NOT', '"null', 'default*', 'course:1 OR x', '))'):
+            results = search_messages(self.course.id, query)
+            self.assertIsInstance(results, list)
+        self.assertEqual([m.id for m in search_messages(self.course.id, 'NOT NULL')], [hit.id])
+
+    def test_deleted_messages_leave_the_index(self):
+        msg = self._say('temporary covering index')
+        msg.delete()
+        self.assertEqual(search_messages(self.course.id, 'temporary'), [])
+
+    def test_snippets_escape_message_html(self):
+        self._say('<script>alert(1)</script> index tricks')
+        result = search_messages(self.course.id, 'index')[0]
+        if result.search_snippet is not None:
+            self.assertNotIn('<script>', result.search_snippet)
+
+    def test_rebuild_restores_the_index(self):
+        hit = self._say('vacuum analyze')
+        chat_search.get_backend().clear()
+        self.assertEqual(chat_search.rebuild_index(), 1)
+        self.assertEqual([m.id for m in search_messages(self.course.id, 'vacuum')], [hit.id])
+
+    def test_chat_page_shows_only_the_matches(self):
+        self._say('Use a covering index')
+        self._say('Lunch at noon?')
+        response = self.client.get(reverse('course_community_chat', args=[self.course.slug]) + '?q=covering')
+        self.assertContains(response, 'covering')
+        self.assertNotContains(response, 'Lunch at noon')
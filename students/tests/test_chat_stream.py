@@ -0,0 +1,118 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+
+from students import chat_events, community_views
+from students.chat_broker import course_channel, get_broker
+from students.chat_events import ChangeLogPoller
+from students.models import User, Course, CourseChatEvent, CourseGroupMessage
+
+
+class FakeBroker:
+    def __init__(self, watched=()):
+        self.watched = set(watched)
+        self.published = []
+
+    def has_subscribers(self, channel):
+        return channel in self.watched
+
+    def publish(self, channel, event):
+        self.published.append((channel, event))
+
+
+class ChangeLogPollerTests(TestCase):
+    def setUp(self):
+        self.courses = [Course.objects.create(title=title, description='-') for title in ('Databases', 'Networks')]
+        self.broker = FakeBroker(course_channel(course.id) for course in self.courses)
+        patcher = mock.patch.object(chat_events, 'get_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.poller = ChangeLogPoller()
+        # Rounds are driven by the test, no thread
+        self.poller._thread = mock.Mock()
+        for course in self.courses:
+            self.poller.watch(course.id, chat_events.latest_cursor(course.id))
+        patcher = mock.patch.object(chat_events, 'poller', self.poller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _event(self, course, message_id):
+        return CourseChatEvent.objects.create(course=course, kind=CourseChatEvent.KIND_MESSAGE, message_id=message_id)
+
+    def test_one_query_per_watched_course_whatever_the_number_of_streams(self):
+        with self.assertNumQueries(2):
+            self.poller.poll()
+        self.assertEqual(self.broker.published, [])
+
+    def test_events_from_other_processes_are_published_once(self):
+        # Saved without a poke, like the background worker does from its own process
+        first, second = self._event(self.courses[0], 7), self._event(self.courses[0], 8)
+        self.poller.poll()
+        self.poller.poll()
+        channel = course_channel(self.courses[0].id)
+        self.assertEqual(self.broker.published, [
+            (channel, {'cursor': first.id, 'kind': 'message', 'message_id': 7}),
+            (channel, {'cursor': second.id, 'kind': 'message', 'message_id': 8}),
+        ])
+
+    def test_poke_reads_only_that_course(self):
+        self.poller.poke(self.courses[1].id)
+        event = self._event(self.courses[1], 9)
+        with self.assertNumQueries(1):
+            self.poller.poll(only_due=True)
+        self.assertEqual(self.broker.published, [(course_channel(self.courses[1].id), {'cursor': event.id, 'kind': 'message', 'message_id': 9})])
+
+    def test_local_saves_are_read_at_once(self):
+        student = User.objects.create_user(username='member')
+        with self.captureOnCommitCallbacks(execute=True):
+            msg = CourseGroupMessage.objects.create(course=self.courses[0], sender=student, text='hi')
+        self.poller.poll(only_due=True)
+        self.assertEqual([event['message_id'] for _, event in self.broker.published], [msg.id])
+
+    def test_courses_without_open_streams_are_forgotten(self):
+        self.broker.watched.clear()
+        self._event(self.courses[0], 7)
+        with self.assertNumQueries(0):
+            self.poller.poll()
+        self.assertEqual(self.poller.stats()['watched_courses'], 0)
+        self.assertEqual(self.broker.published, [])
+
+
+class ChatStreamTests(TransactionTestCase):
+    """ The poller runs on its own thread with its own DB connection, so rows have to be committed. """
+
+    def setUp(self):
+        self.course = Course.objects.create(title='Databases', description='-')
+        self.poller = ChangeLogPoller(interval=0.05)
+        patcher = mock.patch.object(community_views, 'change_log_poller', self.poller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _next_event(self, stream):
+        sent = await asyncio.wait_for(stream.__anext__(), 5)
+        return json.loads(sent[len('data: '):])
+
+    async def test_stream_delivers_events_saved_by_other_processes(self):
+        cursor = await CourseChatEvent.objects.filter(course=self.course).order_by('-id').values_list('id', flat=True).afirst()
+        stream = community_views._chat_event_stream(self.course.id, cursor)
+        try:
+            await stream.__anext__()  # retry hint
+            # Saved without a poke, like the background worker does from its own process
+            event = await CourseChatEvent.objects.acreate(course=self.course, kind=CourseChatEvent.KIND_MESSAGE, message_id=7)
+            self.assertEqual(await self._next_event(stream), {'cursor': event.id, 'kind': 'message', 'message_id': 7})
+        finally:
+            await stream.aclose()
+        self.assertFalse(get_broker().has_subscribers(course_channel(self.course.id)))
+
+    async def test_events_already_sent_are_skipped(self):
+        stream = community_views._chat_event_stream(self.course.id, 100)
+        try:
+            await stream.__anext__()
+            channel = course_channel(self.course.id)
+            get_broker().publish(channel, {'cursor': 99, 'kind': 'message', 'message_id': 1})
+            get_broker().publish(channel, {'cursor': 101, 'kind': 'message', 'message_id': 2})
+            self.assertEqual((await self._next_event(stream))['cursor'], 101)
+        finally:
+            await stream.aclose()
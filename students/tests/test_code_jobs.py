@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from students import execution_queue
+from students.models import CodeJob, User
+
+
+class CodeJobApiTests(TransactionTestCase):
+    """ Jobs run on pool threads with their own DB connection, so each test commits for real. """
+
+    def setUp(self):
+        self.student = User.objects.create_user(username='coder', password='x')
+        self.client.force_login(self.student)
+        self.release = threading.Event()
+        self.release.set()
+
+        def fake_execute(language, code, timeout=5):
+            self.release.wait(5)
+            return {'status': 'success', 'output': f"ran {language}"}
+
+        patcher = mock.patch.object(execution_queue, 'execute_code', side_effect=fake_execute)
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _submit(self, url_name='submit_code_job', code='print(1)'):
+        return self.client.post(reverse(url_name), json.dumps({'language': 'python', 'code': code}), content_type='application/json')
+
+    def _poll(self, job_id, until='done', timeout=5):
+        deadline = time.monotonic() + timeout
+        while True:
+            data = self.client.get(reverse('code_job_status', args=[job_id])).json()
+            if data.get('state') == until or time.monotonic() > deadline:
+                return data
+            time.sleep(0.02)
+
+    def test_submit_answers_at_once_and_the_result_is_polled(self):
+        self.release.clear()
+        response = self._submit()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertEqual(response.json()['poll_url'], reverse('code_job_status', args=[job_id]))
+
+        self.assertEqual(self._poll(job_id, until='running')['state'], 'running')
+        self.release.set()
+        data = self._poll(job_id)
+        self.assertEqual((data['state'], data['output']), ('done', 'ran python'))
+        self.assertIn('wait_ms', data)
+
+    def test_legacy_endpoint_no_longer_waits_for_the_sandbox(self):
+        self.release.clear()
+        response = self._submit('execute_code_api')
+        self.assertEqual(response.status_code, 202)
+        self.release.set()
+        self.assertEqual(self._poll(response.json()['job_id'])['output'], 'ran python')
+
+    def test_jobs_are_private(self):
+        job_id = self._submit().json()['job_id']
+        self._poll(job_id)
+        self.client.force_login(User.objects.create_user(username='someone-else'))
+        self.assertEqual(self.client.get(reverse('code_job_status', args=[job_id])).status_code, 404)
+
+    def test_full_queue_is_rejected_without_a_job(self):
+        with mock.patch.object(execution_queue.execution_pool, 'submit', return_value=None):
+            response = self._submit()
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(CodeJob.objects.exists())
+
+    def test_empty_code_is_refused(self):
+        self.assertEqual(self._submit(code='  ').json()['status'], 'error')
+        self.assertFalse(CodeJob.objects.exists())
+
+    def test_expired_jobs_are_gone(self):
+        job_id = self._submit().json()['job_id']
+        self._poll(job_id)
+        CodeJob.objects.filter(id=job_id).update(submitted_at=timezone.now() - timedelta(seconds=execution_queue.JOB_RESULT_TTL + 1))
+        self.assertEqual(self.client.get(reverse('code_job_status', args=[job_id])).status_code, 404)
+        self.assertEqual(execution_queue.purge_expired_jobs(), 1)
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+
+from students import coin_ledger, leaderboard
+from students.coin_ledger import apply_coins, apply_coins_bulk, InsufficientCoins
+from students.models import User, Course, Enrollment, CoinEvent, DailyActivity
+
+
+class CoinLedgerTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='spender', password='x', lms_coins=1000)
+        self.course = Course.objects.create(title='Premium', description='-', price=50)
+
+    def _balance(self):
+        return User.objects.get(pk=self.student.pk).lms_coins
+
+    def test_keyed_reward_is_paid_once(self):
+        self.assertIsNotNone(apply_coins(self.student, 50, CoinEvent.REASON_BOUNTY, key='bounty:1'))
+        self.assertIsNone(apply_coins(self.student, 50, CoinEvent.REASON_BOUNTY, key='bounty:1'))
+        self.assertEqual(self._balance(), 1050)
+        self.assertEqual(CoinEvent.objects.filter(idempotency_key='bounty:1').count(), 1)
+
+    def test_overdraft_writes_nothing(self):
+        with self.assertRaises(InsufficientCoins):
+            apply_coins(self.student, -5000, CoinEvent.REASON_PURCHASE)
+        self.assertEqual(self._balance(), 1000)
+        self.assertFalse(CoinEvent.objects.filter(reason=CoinEvent.REASON_PURCHASE).exists())
+
+    def _buy(self, token):
+        return self.client.post(reverse('purchase_with_coins', args=[self.course.id]), {'purchase_token': token})
+
+    def test_double_submit_is_charged_once(self):
+        self.client.force_login(self.student)
+        self._buy('form-1')
+        self._buy('form-1')
+        self.assertEqual(self._balance(), 500)
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+
+    def test_buying_again_after_the_enrollment_was_removed_is_charged(self):
+        self.client.force_login(self.student)
+        self._buy('form-1')
+        Enrollment.objects.filter(student=self.student, course=self.course).delete()
+
+        self._buy('form-1')  # the old form again: refused, not free
+        self.assertFalse(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+
+        self._buy('form-2')
+        self.assertEqual(self._balance(), 0)
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+
+
+class BulkAwardTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', lms_coins=100)
+        self.bob = User.objects.create_user(username='bob', lms_coins=100)
+        self.course = Course.objects.create(title='Algorithms', description='-')
+
+    def _balances(self):
+        return dict(User.objects.filter(pk__in=[self.alice.pk, self.bob.pk]).values_list('username', 'lms_coins'))
+
+    def test_entries_are_booked_and_balances_move(self):
+        paid = apply_coins_bulk([
+            (self.alice.id, 30, CoinEvent.REASON_ADMIN, self.course.id, 'prize:alice'),
+            (self.bob.id, 20, CoinEvent.REASON_ADMIN, None, None),
+            (self.alice.id, 5, CoinEvent.REASON_LESSON, None, None),
+        ], batch_size=2)
+        self.assertEqual(paid, 3)
+        self.assertEqual(self._balances(), {'alice': 135, 'bob': 120})
+        self.assertEqual(coin_ledger.find_mismatches(), [])
+        self.assertEqual(DailyActivity.objects.values_list('user__username', 'coins', 'lessons').get(user=self.alice), ('alice', 35, 1))
+
+    def test_paid_keys_are_skipped(self):
+        apply_coins(self.alice, 30, CoinEvent.REASON_ADMIN, key='prize:alice')
+        entries = [
+            (self.alice.id, 30, CoinEvent.REASON_ADMIN, None, 'prize:alice'),
+            (self.bob.id, 30, CoinEvent.REASON_ADMIN, None, 'prize:bob'),
+            (self.bob.id, 30, CoinEvent.REASON_ADMIN, None, 'prize:bob'),  # same key twice in one call
+        ]
+        self.assertEqual(apply_coins_bulk(entries), 1)
+        self.assertEqual(apply_coins_bulk(entries), 0)
+        self.assertEqual(self._balances(), {'alice': 130, 'bob': 130})
+        self.assertEqual(CoinEvent.objects.filter(idempotency_key='prize:bob').count(), 1)
+
+    def test_only_credits(self):
+        with self.assertRaises(ValueError):
+            apply_coins_bulk([(self.alice.id, -10, CoinEvent.REASON_PURCHASE, None, None)])
+        self.assertEqual(self._balances(), {'alice': 100, 'bob': 100})
+
+    def test_leaderboard_hears_about_the_new_balances(self):
+        leaderboard._board = None
+        leaderboard.global_board()
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_coins_bulk([(self.bob.id, 50, CoinEvent.REASON_ADMIN, None, None)])
+        self.assertEqual(leaderboard.rank_of(self.bob), {'rank': 1, 'score': 150, 'total': 2})
+
+    def test_award_command_pays_each_enrolled_student_once(self):
+        Enrollment.objects.create(student=self.alice, course=self.course)
+        out = StringIO()
+        call_command('award_coins', '25', campaign='contest-1', course=self.course.id, stdout=out)
+        call_command('award_coins', '25', campaign='contest-1', course=self.course.id, stdout=out)
+        self.assertIn('Paid 25 coins to 0 student(s); 1 already had this award.', out.getvalue())
+        self.assertEqual(self._balances(), {'alice': 125, 'bob': 100})
+        self.assertEqual(CoinEvent.objects.get(idempotency_key=f"award:contest-1:{self.alice.id}").course, self.course)
+
+        call_command('award_coins', '10', campaign='launch', stdout=out)
+        self.assertEqual(self._balances(), {'alice': 135, 'bob': 110})
+
+    def test_award_command_refuses_bad_input(self):
+        with self.assertRaises(CommandError):
+            call_command('award_coins', '0', campaign='x')
+        with self.assertRaises(CommandError):
+            call_command('award_coins', '10', campaign='x', course=999999)
+        self.assertFalse(CoinEvent.objects.filter(reason=CoinEvent.REASON_ADMIN).exists())
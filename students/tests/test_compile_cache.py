@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from students import compiler_service
+
+from .utils import FakeSandbox, completed
+
+
+class CompileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        patcher = mock.patch.object(compiler_service, 'COMPILE_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _compiling_sandbox(self, binary=b'\x7fELF real build'):
+        def on_run(host_dir, cmd):
+            with open(os.path.join(host_dir, 'main'), 'wb') as f:
+                f.write(binary)
+            return completed()
+        sandbox = FakeSandbox(on_run)
+        self.addCleanup(sandbox.destroy)
+        return sandbox
+
+    def _read(self, sandbox):
+        with open(os.path.join(sandbox.host_dir, 'main'), 'rb') as f:
+            return f.read()
+
+    def test_cache_lives_outside_every_sandbox_mount(self):
+        real_cache = os.path.realpath(compiler_service.COMPILE_CACHE_DIR)
+        self.assertFalse(real_cache.startswith(os.path.realpath(compiler_service.TEMP_DIR) + os.sep))
+
+    def test_build_is_cached_before_the_program_runs(self):
+        sandbox = self._compiling_sandbox()
+        compile_step, _, key = compiler_service.prepare_program(sandbox, 'cpp', 'int main(){}')
+        self.assertEqual(compile_step, 'g++ main.cpp -o main')
+        compiler_service.compile_program(sandbox, 'cpp', compile_step, key)
+
+        # The student's program overwrites its own binary while it runs
+        with open(os.path.join(sandbox.host_dir, 'main'), 'wb') as f:
+            f.write(b'tampered')
+
+        second = self._compiling_sandbox(b'unused')
+        compile_step, _, _ = compiler_service.prepare_program(second, 'cpp', 'int main(){}')
+        self.assertIsNone(compile_step)
+        self.assertEqual(self._read(second), b'\x7fELF real build')
+
+    def test_modified_entry_is_rejected_and_dropped(self):
+        sandbox = self._compiling_sandbox()
+        _, _, key = compiler_service.prepare_program(sandbox, 'cpp', 'int main(){}')
+        compiler_service.compile_program(sandbox, 'cpp', 'g++ main.cpp -o main', key)
+        with open(os.path.join(self.cache_dir, key, 'main'), 'wb') as f:
+            f.write(b'evil')
+
+        second = self._compiling_sandbox()
+        compile_step, _, _ = compiler_service.prepare_program(second, 'cpp', 'int main(){}')
+        self.assertIsNotNone(compile_step)  # compiled again instead of running the modified build
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, key)))
+
+    def test_failed_compile_is_not_cached(self):
+        sandbox = FakeSandbox(lambda host_dir, cmd: completed(1, stderr='error'))
+        self.addCleanup(sandbox.destroy)
+        _, _, key = compiler_service.prepare_program(sandbox, 'cpp', 'broken')
+        compiler_service.compile_program(sandbox, 'cpp', 'g++ main.cpp -o main', key)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, key)))
+
+    def test_least_recently_used_builds_are_evicted(self):
+        keys = []
+        for number in range(3):
+            sandbox = self._compiling_sandbox(b'x' * 1000)
+            _, _, key = compiler_service.prepare_program(sandbox, 'cpp', f'int main(){{return {number};}}')
+            with override_settings(COMPILE_CACHE_MAX_BYTES=2500):
+                compiler_service.compile_program(sandbox, 'cpp', 'g++ main.cpp -o main', key)
+            os.utime(os.path.join(self.cache_dir, key), (number, number))  # older entries first
+            keys.append(key)
+
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, keys[0])))
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, keys[2])))
@@ -0,0 +1,92 @@
+import socket
+import subprocess
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from students import compiler_service
+
+
+class FakeContainer:
+    def __init__(self, number):
+        self.number = number
+        self.destroyed = False
+
+    def destroy(self):
+        self.destroyed = True
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class WarmPoolTests(SimpleTestCase):
+    def setUp(self):
+        started = iter(range(1, 100))
+        patcher = mock.patch.object(compiler_service.Sandbox, 'start', side_effect=lambda: FakeContainer(next(started)))
+        self.start = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sandboxes_are_never_handed_out_twice(self):
+        pool = compiler_service.WarmContainerPool(size=2)
+        pool.refill()
+        self.assertTrue(_wait_for(lambda: pool.stats()['idle'] == 2))
+
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsNotNone(first)
+        self.assertIsNot(first, second)
+        # Both taken sandboxes are replaced in the background
+        self.assertTrue(_wait_for(lambda: pool.stats()['idle'] == 2))
+        self.assertEqual(self.start.call_count, 4)
+        self.assertEqual(pool.stats()['warm_runs'], 2)
+
+    def test_empty_pool_falls_back_to_cold_start(self):
+        pool = compiler_service.WarmContainerPool(size=1)
+        self.assertIsNone(pool.acquire())
+        self.assertEqual(pool.stats()['cold_runs'], 1)
+
+    @override_settings(COMPILER_POOL_SIZE=2)
+    def test_pool_starts_on_the_first_run_only(self):
+        self.addCleanup(setattr, compiler_service, '_pool', None)
+        compiler_service._pool = None
+        self.assertIsNone(compiler_service.pool_stats())  # importing the module started nothing
+
+        with mock.patch.object(compiler_service, 'reap_stale_containers', return_value=0) as reap:
+            self.assertIsNotNone(compiler_service.open_sandbox())
+            self.assertTrue(_wait_for(lambda: compiler_service.pool_stats()['idle'] == 2))
+            warm_runs = compiler_service.pool_stats()['warm_runs']
+            compiler_service.open_sandbox()
+        reap.assert_called_once_with()
+        self.assertEqual(compiler_service.pool_stats()['warm_runs'], warm_runs + 1)
+
+
+class ReapStaleContainersTests(SimpleTestCase):
+    def test_only_containers_of_dead_local_processes_are_removed(self):
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        host = socket.gethostname()
+        listing = '\n'.join([
+            f"aaa {host}:{dead.pid}",
+            f"bbb {host}:{compiler_service.os.getpid()}",
+            f"ccc other-host:{dead.pid}",
+            "ddd ",
+        ])
+        removed = []
+
+        def fake_docker(cmd, **kwargs):
+            if cmd[:2] == ['docker', 'ps']:
+                return subprocess.CompletedProcess(cmd, 0, listing, '')
+            removed.append(cmd[-1])
+            return subprocess.CompletedProcess(cmd, 0, '', '')
+
+        with mock.patch.object(compiler_service.subprocess, 'run', side_effect=fake_docker):
+            self.assertEqual(compiler_service.reap_stale_containers(), 2)
+        self.assertEqual(removed, ['aaa', 'ddd'])
+
+    def test_docker_missing_is_not_an_error(self):
+        with mock.patch.object(compiler_service.subprocess, 'run', side_effect=FileNotFoundError('docker')):
+            self.assertEqual(compiler_service.reap_stale_containers(), 0)
@@ -0,0 +1,47 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from students import course_index
+from students.models import Course, Lesson
+
+
+class CourseIndexTests(TestCase):
+    def setUp(self):
+        course_index._index = None
+        self.addCleanup(setattr, course_index, '_index', None)
+        self.databases_course = Course.objects.create(title='Databases', description='Relational modelling and SQL.')
+        self.networks_course = Course.objects.create(title='Computer Networks', description='TCP, routing and sockets.')
+
+    def test_only_relevant_courses_go_into_the_prompt(self):
+        context = course_index.relevant_course_context('How do TCP sockets work?')
+        self.assertIn('Computer Networks', context)
+        self.assertNotIn('Databases', context)
+
+    def test_lesson_titles_are_searchable(self):
+        Lesson.objects.create(course=self.databases_course, title='B-tree indexes', order=1)
+        self.assertEqual(course_index.get_index().search('What are B-tree indexes?'), [self.databases_course.id])
+
+    def test_unmatched_question_falls_back_to_the_newest_courses(self):
+        context = course_index.relevant_course_context('hi')
+        self.assertIn('newest courses', context)
+        self.assertLess(context.index('Computer Networks'), context.index('Databases'))
+
+    def test_unchanged_catalog_reuses_the_index(self):
+        index = course_index.get_index()
+        self.assertIs(course_index.get_index(), index)
+
+    def test_every_kind_of_change_rebuilds_the_index(self):
+        changes = [
+            lambda: Course.objects.create(title='Compilers', description='Parsing.'),
+            lambda: Lesson.objects.create(course=self.networks_course, title='UDP', order=1),
+            lambda: Lesson.objects.filter(course=self.networks_course).update(title='QUIC', updated_at=timezone.now()),
+            lambda: self.databases_course.delete(),
+            # Written by another process: no signal, no cache message, only the rows change
+            lambda: Course.objects.filter(pk=self.networks_course.pk).update(description='Routing.', updated_at=timezone.now()),
+        ]
+        for change in changes:
+            index = course_index.get_index()
+            change()
+            self.assertIsNot(course_index.get_index(), index)
+
+        self.assertNotIn('Databases', course_index.relevant_course_context('SQL'))
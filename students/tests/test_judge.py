@@ -0,0 +1,105 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from students import compiler_service
+from students.judge import (
+    _collect_results, judge_code, precheck_syntax,
+    ACCEPTED, WRONG_ANSWER, TIME_LIMIT_EXCEEDED, RUNTIME_ERROR, COMPILATION_ERROR,
+)
+
+from .utils import FakeSandbox, completed
+
+
+class FakeCase:
+    def __init__(self, input_data, expected_output, is_hidden=False):
+        self.input_data = input_data
+        self.expected_output = expected_output
+        self.is_hidden = is_hidden
+
+
+class JudgeVerdictTests(SimpleTestCase):
+    def setUp(self):
+        self.run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.run_dir, True)
+
+    def _case_files(self, index, meta, out='', err=''):
+        for suffix, text in (('meta', meta), ('out', out), ('err', err)):
+            with open(os.path.join(self.run_dir, f"case_{index}.{suffix}"), 'w') as f:
+                f.write(text)
+
+    def test_verdict_per_case(self):
+        cases = [FakeCase('1', '2'), FakeCase('2', '4'), FakeCase('3', '6'), FakeCase('4', '8', is_hidden=True)]
+        self._case_files(1, '0 12', out='2\r\n')          # trailing whitespace is ignored
+        self._case_files(2, '0 10', out='5\n')
+        self._case_files(3, '1 5', err='Traceback')
+        self._case_files(4, '124 2000')
+
+        result = _collect_results(self.run_dir, cases, time_limit=2)
+
+        self.assertEqual([c['verdict'] for c in result['cases']], [ACCEPTED, WRONG_ANSWER, RUNTIME_ERROR, TIME_LIMIT_EXCEEDED])
+        self.assertEqual(result['verdict'], WRONG_ANSWER)  # the first failing case decides
+        self.assertEqual(result['passed'], 1)
+        self.assertEqual(result['cases'][2]['error'], 'Traceback')
+        self.assertNotIn('input', result['cases'][3])      # hidden cases stay hidden
+
+    def test_case_that_never_ran_is_a_timeout(self):
+        result = _collect_results(self.run_dir, [FakeCase('1', '1')], time_limit=2)
+        self.assertEqual(result['verdict'], TIME_LIMIT_EXCEEDED)
+
+    def test_compile_error_is_reported_without_running_cases(self):
+        sandbox = FakeSandbox(lambda host_dir, cmd: completed(1, stderr='main.cpp:1: error: expected'))
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        with mock.patch('students.judge.open_sandbox', return_value=sandbox), \
+                mock.patch('students.judge.close_sandbox', side_effect=lambda s: s.destroy()), \
+                mock.patch.object(compiler_service, 'COMPILE_CACHE_DIR', cache_dir):
+            result = judge_code('cpp', 'int main( {', [FakeCase('', '')])
+        self.assertEqual(result['verdict'], COMPILATION_ERROR)
+        self.assertIn('expected', result['compile_output'])
+
+    def test_precheck_only_parses_python(self):
+        self.assertIsNotNone(precheck_syntax('python', 'def f(:\n  pass'))
+        self.assertIsNone(precheck_syntax('python', 's = r"\\("\n'))
+        # Raw strings and digit separators must reach the real compiler untouched
+        self.assertIsNone(precheck_syntax('cpp', 'auto s = R"(})"; int n = 1\'000;'))
+        self.assertIsNone(precheck_syntax('java', 'String s = """\n  {\n""";'))
+
+
+def run_locally(host_dir, shell_cmd):
+    """ Runs a sandbox command on this machine (python3 / sh only), as `docker exec` would in /app. """
+    return subprocess.run(['sh', '-c', shell_cmd], cwd=host_dir, capture_output=True, text=True, timeout=30)
+
+
+class JudgeSessionTests(SimpleTestCase):
+    """ The generated judge script, run for real against local python3 instead of a container. """
+
+    def _judge(self, code, cases, time_limit=1):
+        sandbox = FakeSandbox(run_locally)
+        with mock.patch('students.judge.open_sandbox', return_value=sandbox), \
+                mock.patch('students.judge.close_sandbox', side_effect=lambda s: s.destroy()):
+            return judge_code('python', code, cases, time_limit=time_limit)
+
+    def test_all_cases_in_one_session(self):
+        code = "a, b = map(int, input().split())\nprint(a + b)\n"
+        result = self._judge(code, [FakeCase('1 2', '3'), FakeCase('10 5', '15', is_hidden=True)])
+        self.assertEqual((result['verdict'], result['passed'], result['total']), (ACCEPTED, 2, 2))
+        self.assertEqual(result['cases'][0]['actual'].strip(), '3')
+
+    def test_failing_verdicts(self):
+        code = (
+            "n = int(input())\n"
+            "if n == 2: print(0)\n"
+            "elif n == 3: raise ValueError('boom')\n"
+            "elif n == 4:\n    while True: pass\n"
+            "else: print(n)\n"
+        )
+        cases = [FakeCase('1', '1'), FakeCase('2', '2'), FakeCase('3', '3'), FakeCase('4', '4')]
+        result = self._judge(code, cases)
+        self.assertEqual([c['verdict'] for c in result['cases']], [ACCEPTED, WRONG_ANSWER, RUNTIME_ERROR, TIME_LIMIT_EXCEEDED])
+        self.assertIn('boom', result['cases'][2]['error'])
+        self.assertEqual(result['verdict'], WRONG_ANSWER)
@@ -0,0 +1,134 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from students import leaderboard
+from students.coin_ledger import apply_coins
+from students.models import User, Course, CoinEvent
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        leaderboard._board = None
+        leaderboard._event_boards.clear()
+        self.addCleanup(leaderboard._event_boards.clear)
+
+    def test_board_ranks_ties_and_updates(self):
+        board = leaderboard.Board({1: 50, 2: 80, 3: 50})
+        self.assertEqual(board.top(1), [(2, 80)])
+        self.assertEqual((board.rank_of(1), board.rank_of(3)), (2, 2))
+        board.update(3, 100)
+        self.assertEqual(board.rank_of(3), 1)
+        board.update(2, None)
+        self.assertIsNone(board.rank_of(2))
+        self.assertEqual(len(board), 2)
+
+    def test_balance_changes_move_students(self):
+        alice = User.objects.create_user(username='alice', lms_coins=100)
+        bob = User.objects.create_user(username='bob', lms_coins=100)
+        User.objects.create_user(username='teacher', lms_coins=10000, is_student=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_coins(bob, 50, CoinEvent.REASON_BOUNTY)
+
+        self.assertEqual([u.username for u in leaderboard.top_students(2)], ['bob', 'alice'])
+        self.assertEqual(leaderboard.rank_of(alice)['rank'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_coins(alice, 100, CoinEvent.REASON_BOUNTY)
+        self.assertEqual(leaderboard.rank_of(alice)['rank'], 1)
+        self.assertEqual(leaderboard.rank_of(alice, window='week')['score'], 100)
+
+    def test_stale_board_is_rebuilt_without_a_version_change(self):
+        alice = User.objects.create_user(username='alice', lms_coins=100)
+        leaderboard.rank_of(alice)
+        # A balance changed behind the signals' back: only the staleness limit picks it up
+        User.objects.filter(pk=alice.pk).update(lms_coins=500)
+        self.assertEqual(leaderboard.rank_of(alice)['score'], 100)
+        leaderboard._board.built_at -= leaderboard.BOARD_MAX_STALENESS + 1
+        self.assertEqual(leaderboard.rank_of(alice)['score'], 500)
+
+    def test_version_change_rebuilds_at_once(self):
+        alice = User.objects.create_user(username='alice', lms_coins=100)
+        leaderboard.rank_of(alice)
+        User.objects.filter(pk=alice.pk).update(lms_coins=500)
+        leaderboard.cache.incr(leaderboard.BOARD_VERSION_KEY)  # another process applied a change
+        self.assertEqual(leaderboard.rank_of(alice)['score'], 500)
+
+
+class EventBoardTests(TestCase):
+    def setUp(self):
+        leaderboard._event_boards.clear()
+        self.addCleanup(leaderboard._event_boards.clear)
+        self.alice = User.objects.create_user(username='alice', lms_coins=0)
+        self.bob = User.objects.create_user(username='bob', lms_coins=0)
+        self.course = Course.objects.create(title='Algorithms', description='-')
+
+    def _earn(self, user, amount, days_ago=0, course=None):
+        event = apply_coins(user, amount, CoinEvent.REASON_BOUNTY, course)
+        CoinEvent.objects.filter(pk=event.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_windows_only_count_their_own_days(self):
+        self._earn(self.alice, 50)
+        self._earn(self.bob, 80, days_ago=10)
+        self._earn(self.bob, 30, days_ago=40)
+
+        self.assertEqual(leaderboard.event_board('week').top(5), [(self.alice.id, 50)])
+        self.assertEqual(leaderboard.event_board('month').top(5), [(self.bob.id, 80), (self.alice.id, 50)])
+
+    def test_course_board_counts_that_course_only(self):
+        self._earn(self.alice, 50, course=self.course)
+        self._earn(self.bob, 80)
+        board = leaderboard.event_board(course_id=self.course.id)
+        self.assertEqual(board.top(5), [(self.alice.id, 50)])
+        self.assertEqual(leaderboard.event_board('week', self.course.id).top(5), [(self.alice.id, 50)])
+
+    def test_spending_and_bookkeeping_are_not_earnings(self):
+        self._earn(self.alice, 50)
+        apply_coins(self.alice, -20, CoinEvent.REASON_PURCHASE)
+        apply_coins(self.bob, 500, CoinEvent.REASON_CORRECTION)
+        self.assertEqual(leaderboard.event_board('week').top(5), [(self.alice.id, 50)])
+
+    def test_teachers_are_not_ranked(self):
+        teacher = User.objects.create_user(username='teacher', lms_coins=0, is_student=False, is_teacher=True)
+        self._earn(teacher, 1000)
+        self._earn(self.alice, 50)
+        self.assertEqual(leaderboard.event_board('week').top(5), [(self.alice.id, 50)])
+
+    def test_boards_are_cached_for_their_ttl(self):
+        first = leaderboard.event_board('week')
+        self.assertIs(leaderboard.event_board('week'), first)
+        first.built_at -= leaderboard.EVENT_BOARD_TTL
+        self.assertIsNot(leaderboard.event_board('week'), first)
+
+    @mock.patch.object(leaderboard, 'EVENT_BOARD_MAX', 2)
+    def test_least_recently_used_board_is_dropped(self):
+        leaderboard.event_board('week')
+        leaderboard.event_board('month')
+        leaderboard.event_board('week')  # used again: month is now the oldest
+        leaderboard.event_board(course_id=self.course.id)
+        self.assertEqual(list(leaderboard._event_boards), [('week', None), (None, self.course.id)])
+
+
+class LeaderboardApiTests(TestCase):
+    def setUp(self):
+        leaderboard._board = None
+        leaderboard._event_boards.clear()
+        self.addCleanup(leaderboard._event_boards.clear)
+        self.student = User.objects.create_user(username='alice', lms_coins=100)
+        self.client.force_login(self.student)
+
+    def test_window_board_with_my_rank(self):
+        apply_coins(self.student, 40, CoinEvent.REASON_BOUNTY)
+        data = self.client.get(reverse('leaderboard_api'), {'window': 'week'}).json()
+        self.assertEqual([(p['name'], p['score']) for p in data['leaders']], [('alice', 40)])
+        self.assertEqual(data['me'], {'rank': 1, 'score': 40, 'total': 1})
+
+    def test_bad_window_and_course_are_refused(self):
+        url = reverse('leaderboard_api')
+        self.assertEqual(self.client.get(url, {'window': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'course': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'course': '999999'}).status_code, 404)
+        self.assertEqual(leaderboard._event_boards, {})
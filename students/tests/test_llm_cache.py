@@ -0,0 +1,75 @@
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from students import llm_cache, llm_gateway
+
+MESSAGES = [{'role': 'user', 'content': 'What is  Python?\n'}]
+
+
+class LLMCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches[llm_cache.LLM_CACHE_ALIAS].clear()
+        self.addCleanup(caches[llm_cache.LLM_CACHE_ALIAS].clear)
+        patcher = mock.patch.object(llm_gateway, '_request_completion', return_value='A language.')
+        self.upstream = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _ask(self, feature, messages=MESSAGES, temperature=0.7):
+        return llm_gateway.chat_completion(messages, temperature=temperature, feature=feature)
+
+    def test_keys_ignore_whitespace_but_not_parameters(self):
+        key = llm_cache.cache_key('m', MESSAGES, 0.7, None)
+        self.assertEqual(key, llm_cache.cache_key('m', [{'role': 'user', 'content': 'What is Python?'}], 0.7, None))
+        self.assertNotEqual(key, llm_cache.cache_key('m', MESSAGES, 0.2, None))
+        self.assertNotEqual(key, llm_cache.cache_key('other', MESSAGES, 0.7, None))
+
+    def test_cached_feature_is_answered_without_calling_groq(self):
+        self.assertEqual(self._ask('ai_chat'), 'A language.')
+        self.assertEqual(self._ask('ai_chat', [{'role': 'user', 'content': 'What is Python?'}]), 'A language.')
+        self.assertEqual(self.upstream.call_count, 1)
+        self.assertGreaterEqual(llm_cache.cache_stats()['features']['ai_chat']['hits'], 1)
+
+    def test_features_without_a_policy_are_never_cached(self):
+        for feature in (None, 'community_auto_reply', 'bounty_pool_refill'):
+            self.assertEqual(llm_cache.cache_ttl(feature), 0)
+        self._ask('bounty_pool_refill')
+        self._ask('bounty_pool_refill')
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_entries_expire_after_the_feature_ttl(self):
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            self._ask('challenge_generation')
+        with mock.patch('time.time', return_value=now + llm_cache.LLM_CACHE_POLICIES['challenge_generation'] - 1):
+            self._ask('challenge_generation')
+        self.assertEqual(self.upstream.call_count, 1)
+        with mock.patch('time.time', return_value=now + llm_cache.LLM_CACHE_POLICIES['challenge_generation'] + 1):
+            self._ask('challenge_generation')
+        self.assertEqual(self.upstream.call_count, 2)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        llm_cache.LLM_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'llm-lru-test',
+            'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 2},
+        },
+    })
+    def test_least_recently_used_reply_is_evicted_first(self):
+        first, second, third = ([{'role': 'user', 'content': q}] for q in ('one', 'two', 'three'))
+        self._ask('ai_chat', first)
+        self._ask('ai_chat', second)
+        self._ask('ai_chat', first)  # hit: 'one' is now the most recently used
+        self._ask('ai_chat', third)  # full: evicts 'two'
+        self.assertEqual(self.upstream.call_count, 3)
+        self._ask('ai_chat', first)
+        self.assertEqual(self.upstream.call_count, 3)
+        self._ask('ai_chat', second)
+        self.assertEqual(self.upstream.call_count, 4)
+
+    def test_broken_backend_is_a_miss_not_an_error(self):
+        with mock.patch.object(llm_cache, 'caches', {llm_cache.LLM_CACHE_ALIAS: mock.Mock(get=mock.Mock(side_effect=RuntimeError('no table')), set=mock.Mock(side_effect=RuntimeError('no table')))}):
+            self.assertEqual(self._ask('ai_chat'), 'A language.')
+        self.assertEqual(self.upstream.call_count, 1)
@@ -0,0 +1,192 @@
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from students import llm_gateway
+from students.llm_gateway import CircuitBreaker, LLMError, LLMUnavailable, SingleFlight
+
+
+def reply(status=200, content='pong', headers=None):
+    response = mock.Mock(status_code=status, headers=headers or {}, text='')
+    response.json.return_value = (
+        {'choices': [{'message': {'content': content}}], 'usage': {'total_tokens': 12}}
+        if status == 200 else {'error': {'message': f"status {status}"}}
+    )
+    return response
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(llm_gateway.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=2, cooldown=30)
+
+    def test_opens_after_the_threshold_and_lets_one_trial_through(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), 'open')
+        self.assertFalse(self.breaker.allow())
+
+        self.now += 31
+        self.assertEqual(self.breaker.state(), 'half-open')
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # only one trial call at a time
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state(), 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), 'open')
+
+
+@override_settings(GROQ_API_KEY='test-key')
+class GatewayRetryTests(SimpleTestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.breaker = CircuitBreaker(threshold=2, cooldown=30)
+        for patcher in (
+            mock.patch.object(llm_gateway, 'get_session', return_value=self.session),
+            mock.patch.object(llm_gateway, 'breaker', self.breaker),
+            mock.patch.object(llm_gateway.time, 'sleep'),
+            mock.patch.object(llm_gateway.scheduler, 'pause'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.sleep = llm_gateway.time.sleep
+        self.pause = llm_gateway.scheduler.pause
+
+    def _ask(self, **kwargs):
+        return llm_gateway.chat_completion([{'role': 'user', 'content': 'ping'}], **kwargs)
+
+    def test_server_errors_are_retried_with_backoff(self):
+        self.session.post.side_effect = [reply(503), reply(502), reply()]
+        self.assertEqual(self._ask(), 'pong')
+        self.assertEqual(self.session.post.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        for call in self.sleep.call_args_list:
+            self.assertLessEqual(call.args[0], llm_gateway.BACKOFF_MAX)
+
+    def test_rate_limit_honours_retry_after_and_pauses_the_scheduler(self):
+        self.session.post.side_effect = [reply(429, headers={'Retry-After': '3'}), reply()]
+        self.assertEqual(self._ask(), 'pong')
+        self.sleep.assert_called_once_with(3.0)
+        self.pause.assert_called_once_with(3.0)
+
+    def test_client_errors_fail_at_once_and_keep_the_circuit_closed(self):
+        self.session.post.side_effect = [reply(400)] * 3
+        with self.assertRaisesMessage(LLMError, 'status 400'):
+            self._ask()
+        self.assertEqual(self.session.post.call_count, 1)
+        self.assertEqual(self.breaker.state(), 'closed')
+
+    def test_repeated_failures_open_the_circuit(self):
+        self.session.post.side_effect = requests.ConnectionError('refused')
+        for _ in range(2):
+            with self.assertRaisesMessage(LLMError, 'unreachable'):
+                self._ask(retries=1)
+        self.assertEqual(self.session.post.call_count, 4)
+
+        # Open: refused without touching the network
+        with self.assertRaises(LLMUnavailable):
+            self._ask()
+        self.assertEqual(self.session.post.call_count, 4)
+
+    @override_settings(GROQ_API_KEY='')
+    def test_missing_key_never_calls_groq(self):
+        with mock.patch.dict(llm_gateway.os.environ, {'GROQ_API_KEY': ''}):
+            with self.assertRaisesMessage(LLMError, 'GROQ_API_KEY'):
+                self._ask()
+        self.session.post.assert_not_called()
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_upstream_call(self):
+        flights = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow_call():
+            calls.append(1)
+            release.wait(2)
+            return 'answer'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do('k', slow_call))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['answer'] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_stream_followers_get_every_chunk(self):
+        flights = SingleFlight()
+
+        def make_stream():
+            for chunk in ('Hel', 'lo ', 'world'):
+                time.sleep(0.1)
+                yield chunk
+
+        followed = []
+        leader = threading.Thread(target=lambda: followed.append(''.join(flights.stream('k', make_stream))))
+        leader.start()
+        time.sleep(0.05)
+        follower = ''.join(flights.stream('k', lambda: iter(['not called'])))
+        leader.join()
+        self.assertEqual(follower, 'Hello world')
+        self.assertEqual(followed, ['Hello world'])
+
+    def test_do_never_joins_a_stream(self):
+        flights = SingleFlight()
+
+        def make_stream():
+            for chunk in ('Hel', 'lo'):
+                time.sleep(0.2)
+                yield chunk
+
+        streamer = threading.Thread(target=lambda: list(flights.stream('k', make_stream)))
+        streamer.start()
+        time.sleep(0.1)
+        self.assertEqual(flights.do('k', lambda: 'Hello, whole reply'), 'Hello, whole reply')
+        streamer.join()
+
+    def test_followers_get_the_leader_error(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def failing_call():
+            release.wait(2)
+            raise LLMError('Groq API unreachable')
+
+        errors = []
+
+        def call():
+            try:
+                flights.do('k', failing_call)
+            except LLMError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
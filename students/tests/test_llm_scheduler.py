@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+
+from students.llm_scheduler import TokenBudgetScheduler, INTERACTIVE, BATCH, priority_for
+
+
+class TokenSchedulerTests(SimpleTestCase):
+    def test_calls_over_budget_are_shed(self):
+        scheduler = TokenBudgetScheduler(rpm=1, tpm=10000, user_rpm=10, user_tpm=10000, batch_share=1)
+        self.assertIsNotNone(scheduler.acquire(INTERACTIVE, 100, max_wait=0))
+        self.assertIsNone(scheduler.acquire(INTERACTIVE, 100, max_wait=0))
+        self.assertEqual(scheduler.stats()['shed'][INTERACTIVE], 1)
+
+    def test_batch_leaves_headroom_for_interactive(self):
+        scheduler = TokenBudgetScheduler(rpm=4, tpm=10000, user_rpm=10, user_tpm=10000, batch_share=0.5)
+        self.assertIsNotNone(scheduler.acquire(BATCH, 100, max_wait=0))
+        self.assertIsNotNone(scheduler.acquire(BATCH, 100, max_wait=0))
+        self.assertIsNone(scheduler.acquire(BATCH, 100, max_wait=0))
+        self.assertIsNotNone(scheduler.acquire(INTERACTIVE, 100, max_wait=0))
+
+    def test_per_user_limit(self):
+        scheduler = TokenBudgetScheduler(rpm=100, tpm=100000, user_rpm=1, user_tpm=100000, batch_share=1)
+        self.assertIsNotNone(scheduler.acquire(INTERACTIVE, 10, user_id=1, max_wait=0))
+        self.assertIsNone(scheduler.acquire(INTERACTIVE, 10, user_id=1, max_wait=0))
+        self.assertIsNotNone(scheduler.acquire(INTERACTIVE, 10, user_id=2, max_wait=0))
+
+    def test_features_map_to_their_lane(self):
+        self.assertEqual(priority_for('challenge_generation'), INTERACTIVE)
+        self.assertEqual(priority_for('bounty_pool_refill'), BATCH)
+        self.assertEqual(priority_for('unknown_feature'), BATCH)
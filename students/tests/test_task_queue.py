@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from students import community_views, task_queue
+from students.models import User, Course, CourseGroupMessage, ScheduledTask
+
+
+class AutoReplyRetryTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='asker', password='x')
+        self.course = Course.objects.create(title='Networks', description='-')
+        self.question = CourseGroupMessage.objects.create(course=self.course, sender=self.student, text='Why TCP?')
+        self.task = task_queue.schedule('community_auto_reply', {
+            'course_id': self.course.id, 'message_id': self.question.id, 'prompt': 'Why TCP?',
+        })
+
+    def _run_once(self):
+        ScheduledTask.objects.filter(id=self.task.id).update(run_at=self.task.run_at)
+        for task in task_queue.claim_due():
+            task_queue.run_task(task)
+        return ScheduledTask.objects.get(id=self.task.id)
+
+    def _replies(self):
+        return CourseGroupMessage.objects.filter(reply_to=self.question)
+
+    def test_failures_are_retried_and_reported_once(self):
+        with mock.patch.object(community_views, 'chat_completion', side_effect=RuntimeError('upstream down')):
+            for _ in range(task_queue.MAX_ATTEMPTS - 1):
+                self.assertEqual(self._run_once().status, ScheduledTask.STATUS_PENDING)
+                self.assertFalse(self._replies().exists())
+            task = self._run_once()
+        self.assertEqual(task.status, ScheduledTask.STATUS_FAILED)
+        self.assertEqual(task.attempts, task_queue.MAX_ATTEMPTS)
+        self.assertEqual(self._replies().count(), 1)
+        self.assertIn('AI Core Error', self._replies().get().text)
+
+    def test_retry_succeeds(self):
+        with mock.patch.object(community_views, 'chat_completion', side_effect=[RuntimeError('blip'), 'Reliable delivery.']):
+            self._run_once()
+            task = self._run_once()
+        self.assertEqual(task.status, ScheduledTask.STATUS_DONE)
+        self.assertEqual(list(self._replies().values_list('text', flat=True)), ['Reliable delivery.'])
+
+    def test_answered_question_gets_no_reply(self):
+        CourseGroupMessage.objects.create(course=self.course, sender=self.student, text='Because of retransmits.')
+        with mock.patch.object(community_views, 'chat_completion') as completion:
+            self.assertEqual(self._run_once().status, ScheduledTask.STATUS_DONE)
+        completion.assert_not_called()
+
+    def _crash_while_running(self, attempts):
+        ScheduledTask.objects.filter(id=self.task.id).update(
+            status=ScheduledTask.STATUS_RUNNING, claimed_by='dead-worker', attempts=attempts,
+            claimed_at=timezone.now() - task_queue.STALE_AFTER * 2,
+        )
+
+    def test_task_of_a_crashed_worker_is_handed_out_again(self):
+        self._crash_while_running(attempts=1)
+        self.assertEqual(task_queue.requeue_stale(), 1)
+        task = ScheduledTask.objects.get(id=self.task.id)
+        self.assertEqual((task.status, task.claimed_by), (ScheduledTask.STATUS_PENDING, ''))
+        self.assertFalse(self._replies().exists())
+
+    def test_crash_on_the_last_attempt_runs_the_failure_handler(self):
+        self._crash_while_running(attempts=task_queue.MAX_ATTEMPTS)
+        self.assertEqual(task_queue.requeue_stale(), 0)
+        task = ScheduledTask.objects.get(id=self.task.id)
+        self.assertEqual((task.status, task.last_error), (ScheduledTask.STATUS_FAILED, task_queue.STALE_TASK_ERROR))
+        self.assertEqual(self._replies().count(), 1)
+        self.assertIn('AI Core Error', self._replies().get().text)
+
+        # A second cleanup pass doesn't report it again
+        task_queue.requeue_stale()
+        self.assertEqual(self._replies().count(), 1)
@@ -0,0 +1,75 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from students import community_views
+from students.models import User, Course, Enrollment, CourseGroupMessage
+from students.worker_pool import BoundedWorkerPool
+
+
+class BoundedWorkerPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = BoundedWorkerPool(name='test-pool', max_workers=1, max_queue=1)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def test_full_pool_rejects_instead_of_queueing(self):
+        running = self.pool.submit(self.release.wait, 5)
+        queued = self.pool.submit(lambda: 'queued')
+        self.assertIsNotNone(running)
+        self.assertIsNotNone(queued)
+        self.assertIsNone(self.pool.submit(lambda: 'rejected'))
+        self.assertEqual(self.pool.stats()['rejected'], 1)
+
+        self.release.set()
+        self.assertEqual(queued.result(5), 'queued')
+        # The slots are free again
+        self.assertEqual(self.pool.submit(lambda: 'later').result(5), 'later')
+
+    def test_failing_job_releases_its_slot(self):
+        def boom():
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            self.pool.submit(boom).result(5)
+        self.assertEqual(self.pool.submit(lambda: 'next').result(5), 'next')
+        stats = self.pool.stats()
+        self.assertEqual((stats['failed'], stats['completed'], stats['running'], stats['queued']), (1, 1, 0, 0))
+
+
+class CommunityAiPoolTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='asker', password='x')
+        self.course = Course.objects.create(title='Networks', description='-')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.student)
+
+    def _ask(self):
+        return self.client.post(
+            reverse('course_community_chat', args=[self.course.slug]), {'message_text': '/ai what is TCP?'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+    def test_command_is_queued_on_the_pool(self):
+        with mock.patch.object(community_views.community_ai_pool, 'submit', return_value=object()) as submit:
+            self._ask()
+        question = CourseGroupMessage.objects.get(sender=self.student)
+        self.assertEqual(submit.call_args.args, (community_views._ai_reply_job, self.course.id, 'what is TCP?', question.id, None))
+        self.assertFalse(CourseGroupMessage.objects.filter(reply_to=question).exists())
+
+    def test_full_pool_answers_busy_at_once(self):
+        with mock.patch.object(community_views.community_ai_pool, 'submit', return_value=None):
+            self._ask()
+        question = CourseGroupMessage.objects.get(sender=self.student)
+        reply = CourseGroupMessage.objects.get(reply_to=question)
+        self.assertEqual(reply.sender.username, 'ai_commander')
+        self.assertIn('busy', reply.text)
+
+    def test_reply_job_closes_its_connection_even_on_errors(self):
+        with mock.patch.object(community_views, 'generate_ai_reply', side_effect=RuntimeError('down')), \
+                mock.patch.object(community_views.connection, 'close') as close:
+            with self.assertRaises(RuntimeError):
+                community_views._ai_reply_job(self.course.id, 'hi', 1)
+        close.assert_called_once_with()
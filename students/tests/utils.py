@@ -0,0 +1,21 @@
+import shutil
+import subprocess
+import tempfile
+
+
+class FakeSandbox:
+    """ Stands in for a container: run() calls `on_run(host_dir, cmd)` and returns its CompletedProcess. """
+
+    def __init__(self, on_run):
+        self.host_dir = tempfile.mkdtemp()
+        self.on_run = on_run
+
+    def run(self, shell_cmd, timeout):
+        return self.on_run(self.host_dir, shell_cmd)
+
+    def destroy(self):
+        shutil.rmtree(self.host_dir, ignore_errors=True)
+
+
+def completed(returncode=0, stdout='', stderr=''):
+    return subprocess.CompletedProcess([], returncode, stdout, stderr)
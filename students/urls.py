@@ -1,7 +1,6 @@
 from django.urls import path
 from students import community_views
 from . import views
-from . import compiler_service  # NEW: Import the compiler service for Docker Execution
 
 urlpatterns = [
 
@@ -48,9 +47,6 @@ urlpatterns = [
     path('api/chat/delete/<int:message_id>/', community_views.delete_message, name='delete_message'),
     path('api/chat/edit/<int:message_id>/', community_views.edit_message, name='edit_message'),
     
-    # 👉 🚀 NEW: Local Docker Code Execution API
-    path('api/chat/execute-local-code/', compiler_service.run_code_in_docker, name='run_code_in_docker'),
-    
     # 🚀 NEW: BOUNTY ARENA API ENDPOINTS
     # Route to render the main page (404 Error Fix)
     path('bounty-arena/', views.bounty_arena_view, name='bounty_arena'),
@@ -1,27 +1,60 @@
-import os
-import uuid
-import subprocess
 import json
+import asyncio
 import datetime
+import threading
 import time
 import re  
-import requests 
+import uuid
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q, Avg
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q, Avg, Count, Sum
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.utils import timezone
 from django.core.paginator import Paginator
 
 # Import AI Logic
 from .ai_utils import extract_text_from_file, generate_quiz_from_text
 # Import the powerful AI Service
-from .ai_service import generate_learning_assistant_response
+from .ai_service import generate_learning_assistant_response, stream_learning_assistant_response
+# Shared Docker sandbox engine + background job queue
+from .compiler_service import pool_stats, compile_cache_stats
+from .execution_queue import submit_job, get_job, queue_stats
+# Batch test-case judge for the bounty arena
+from .judge import (
+    judge_problem,
+    precheck_syntax,
+    JudgeError,
+    ACCEPTED as JUDGE_ACCEPTED,
+    WRONG_ANSWER,
+    RUNTIME_ERROR,
+    COMPILATION_ERROR,
+)
+# AI problem generation + pre-generated problem pool
+from .bounty_service import (
+    call_groq,
+    generate_problem_data,
+    create_problem_for_student,
+    schedule_verification,
+    serve_problem_from_pool,
+    bounty_pool_stats,
+)
+from .llm_gateway import LLMError, gateway_stats
+from .llm_scheduler import scheduler as llm_scheduler
+from .llm_cache import cache_stats as llm_cache_stats
+from .community_views import community_ai_pool
+from . import leaderboard
+from . import activity
+from .coin_ledger import apply_coins, InsufficientCoins
 
 # Import Forms
 from .forms import (
@@ -53,7 +86,8 @@ from .models import (
     DynamicBountyProblem,  
     ProblemTestCase,       
     BountySubmission,      
-    FacultyProfile         
+    FacultyProfile,
+    CoinEvent
 )
 
 User = get_user_model()
@@ -185,8 +219,9 @@ def student_dashboard(request):
     completed_courses = enrollments.filter(progress=100).count()
     certificate_eligible = completed_courses
     
-    # 🏆 GLOBAL LEADERBOARD LOGIC
-    top_students = User.objects.filter(is_student=True).order_by('-lms_coins')[:10]
+    # 🏆 GLOBAL LEADERBOARD LOGIC (pre-sorted board, no per-request sort of the user table)
+    top_students = leaderboard.top_students(10)
+    my_rank = leaderboard.rank_of(user)
     
     context = {
         'enrollments': enrollments,
@@ -195,11 +230,44 @@ def student_dashboard(request):
         'completed_courses': completed_courses,
         'certificate_eligible': certificate_eligible,
         'top_students': top_students,
+        'my_rank': my_rank,
         'user': user
     }
     return render(request, 'student_dashboard.html', context)
 
 
+@login_required
+def leaderboard_api(request):
+    """
+    Leaderboard JSON: ?window=week|month (coins earned in that window, default all-time balance)
+    and/or ?course=<id> (coins earned in that course). Includes the requesting user's rank.
+    """
+    window = request.GET.get('window') or None
+    if window is not None and window not in leaderboard.WINDOWS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown window'}, status=400)
+    try:
+        course_id = int(request.GET['course']) if request.GET.get('course') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid course'}, status=400)
+    if course_id is not None and not Course.objects.filter(id=course_id).exists():
+        return JsonResponse({'status': 'error', 'message': 'Course not found'}, status=404)
+
+    leaders = leaderboard.top_students(10, window=window, course_id=course_id)
+    return JsonResponse({
+        'status': 'success',
+        'leaders': [
+            {
+                'rank': student.rank,
+                'name': student.first_name or student.username,
+                'score': student.score,
+                'avatar': student.profile.profile_pic.url if hasattr(student, 'profile') and student.profile.profile_pic else None,
+            }
+            for student in leaders
+        ],
+        'me': leaderboard.rank_of(request.user, window=window, course_id=course_id),
+    })
+
+
 @login_required
 def profile_view(request):
     """
@@ -227,36 +295,45 @@ def profile_view(request):
     # =========================================================
     # 🚀 SYNTAX SINGULARITY STATS & GITHUB HEATMAP GRAPH FETCHING
     # =========================================================
-    successful_bounties = BountySubmission.objects.filter(
-        student=user, 
-        earned_coins__gt=0
-    ).select_related('problem').order_by('submitted_at') # ordered ascending for graph
+    successful_bounties = BountySubmission.objects.filter(student=user, earned_coins__gt=0)
     
-    total_bounties_solved = successful_bounties.count()
-    bounty_coins_earned = sum(sub.earned_coins for sub in successful_bounties)
+    # Totals counted by the database in one query
+    bounty_totals = successful_bounties.aggregate(solved=Count('id'), coins=Sum('earned_coins'))
     
     # For recent list (descending)
-    recent_bounties = BountySubmission.objects.filter(
-        student=user, earned_coins__gt=0
-    ).select_related('problem').order_by('-submitted_at')[:5]
-
-    # 📊 GRAPH DATA LOGIC (Dictionary of date -> count)
-    contribution_data = {}
-    for sub in successful_bounties:
-        date_str = sub.submitted_at.strftime('%Y-%m-%d')
-        contribution_data[date_str] = contribution_data.get(date_str, 0) + 1
+    recent_bounties = successful_bounties.select_related('problem').order_by('-submitted_at')[:5]
 
+    # 📊 The heatmap itself is loaded from activity_heatmap (daily rollups)
     context = {
         'user': user,
         'form': form,
         'enrollments': enrollments,
-        'total_bounties_solved': total_bounties_solved,
-        'bounty_coins_earned': bounty_coins_earned,
+        'total_bounties_solved': bounty_totals['solved'],
+        'bounty_coins_earned': bounty_totals['coins'] or 0,
         'recent_bounties': recent_bounties,
-        'contribution_json': json.dumps(contribution_data), # <-- Sent to Template for Heatmap Graph
     }
     return render(request, 'student_profile.html', context)
 
+
+def heatmap_etag(request):
+    return activity.heatmap_version(request.user) if request.user.is_authenticated else None
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=heatmap_etag)
+def activity_heatmap(request):
+    """
+    Profile heatmap JSON: the user's daily solves / coins / lessons / quizzes for the last 365 days.
+    Revalidated with an ETag, so an unchanged graph costs the browser a 304.
+    """
+    return JsonResponse({
+        'status': 'success',
+        'days': activity.HEATMAP_DAYS,
+        'today': timezone.localdate().isoformat(),
+        'activity': activity.heatmap(request.user),
+    })
+
 # 4. COURSE & LEARNING LOGIC
 
 @login_required
@@ -312,7 +389,8 @@ def enroll_course(request, course_id):
 @login_required
 def payment_page(request, course_id):
     course = get_object_or_404(Course, id=course_id)
-    return render(request, 'payment.html', {'course': course})
+    # One token per rendered form: a double submit is charged once, a later purchase is a new one
+    return render(request, 'payment.html', {'course': course, 'purchase_token': uuid.uuid4().hex})
 
 
 @login_required
@@ -336,21 +414,36 @@ def purchase_with_coins(request, course_id):
         course = get_object_or_404(Course, id=course_id)
         required_coins = int(course.price) * 10
         
-        # Check if the user has enough coins
-        if request.user.lms_coins >= required_coins:
-            # Deduct coins securely
-            request.user.lms_coins -= required_coins
-            request.user.save(update_fields=['lms_coins'])
-            
-            # Enroll the student in the course
-            Enrollment.objects.get_or_create(student=request.user, course=course)
-            
-            # Success Message with 'Coin' keyword to trigger the Golden Popup
-            messages.success(request, f"Course Unlocked! You purchased '{course.title}' using {required_coins} LMS Coins.")
-            return redirect('dashboard')
-        else:
+        purchase_token = request.POST.get('purchase_token') or uuid.uuid4().hex
+
+        # Enrollment check, charge and enrollment in one transaction: either all of it happens or none
+        try:
+            with transaction.atomic():
+                if Enrollment.objects.filter(student=request.user, course=course).exists():
+                    messages.info(request, f"You are already enrolled in '{course.title}'.")
+                    return redirect('dashboard')
+                # Fails without charging if the balance is too low, even under concurrent purchases
+                charged = apply_coins(
+                    request.user, -required_coins, CoinEvent.REASON_PURCHASE, course,
+                    key=f"purchase:{request.user.id}:{course.id}:{purchase_token}",
+                )
+                if required_coins and charged is None:
+                    # An old form sent again: its token already paid for an enrollment that is gone now
+                    messages.error(request, "This purchase form has expired. Please try again.")
+                    return redirect('payment_page', course_id=course.id)
+                Enrollment.objects.create(student=request.user, course=course)
+        except InsufficientCoins:
             messages.error(request, "Insufficient coins! Keep learning to earn more.")
             return redirect('payment_page', course_id=course.id)
+        except IntegrityError:
+            # A concurrent submit enrolled first: this charge was rolled back with the transaction
+            request.user.refresh_from_db(fields=['lms_coins'])
+            messages.info(request, f"You are already enrolled in '{course.title}'.")
+            return redirect('dashboard')
+        
+        # Success Message with 'Coin' keyword to trigger the Golden Popup
+        messages.success(request, f"Course Unlocked! You purchased '{course.title}' using {required_coins} LMS Coins.")
+        return redirect('dashboard')
             
     return redirect('all_courses')
 
@@ -404,14 +497,13 @@ def course_watch(request, course_id, lesson_id=None):
                 
                 # --- LMS COIN REWARD SYSTEM (VIDEO WATCH) ---
 
-                request.user.lms_coins += 20
-                messages.success(request, "+20 LMS Coins for completing a lesson!")
+                # Keyed per lesson / course: a reload racing the first view can't pay twice
+                if apply_coins(request.user, 20, CoinEvent.REASON_LESSON, course, key=f"lesson:{request.user.id}:{current_lesson.id}"):
+                    messages.success(request, "+20 LMS Coins for completing a lesson!")
                 
                 if new_progress >= 100.0 and enrollment.progress < 100.0:
-                    request.user.lms_coins += 500
-                    messages.success(request, "Course Completed! +500 Bonus LMS Coins!")
-                    
-                request.user.save(update_fields=['lms_coins'])
+                    if apply_coins(request.user, 500, CoinEvent.REASON_COURSE_COMPLETE, course, key=f"course_complete:{request.user.id}:{course.id}"):
+                        messages.success(request, "Course Completed! +500 Bonus LMS Coins!")
 
                 if hasattr(enrollment, 'update_progress'):
                     enrollment.update_progress(new_progress)
@@ -580,7 +672,7 @@ def generate_quiz_view(request):
                 return JsonResponse({'status': 'error', 'message': 'File is empty or unreadable.'}, status=400)
 
             # 4. Generate 10-15 Questions
-            generated_questions = generate_quiz_from_text(extracted_text, num_questions=15)
+            generated_questions = generate_quiz_from_text(extracted_text, num_questions=15, user_id=request.user.id)
             
             time.sleep(1) # Simulation delay
             
@@ -700,9 +792,8 @@ def submit_quiz_view(request, exam_id):
             ).count()
             
             if past_success_count == 1:
-                request.user.lms_coins += 100
-                request.user.save(update_fields=['lms_coins'])
-                messages.success(request, "Excellent! You scored 80%+ and earned 100 LMS Coins!")
+                if apply_coins(request.user, 100, CoinEvent.REASON_QUIZ, exam.course, key=f"quiz:{request.user.id}:{exam.id}"):
+                    messages.success(request, "Excellent! You scored 80%+ and earned 100 LMS Coins!")
 
         context = {
             'exam': exam,
@@ -716,6 +807,20 @@ def submit_quiz_view(request, exam_id):
     return redirect('dashboard')
 
 
+def _conversation_id(request, client_id):
+    """
+    Server-side key for the assistant conversation. The id the browser sends is scoped
+    to the user (or session) so nobody can read into someone else's conversation.
+    """
+    if request.user.is_authenticated:
+        owner = f"user{request.user.id}"
+    else:
+        if not request.session.session_key:
+            request.session.save()
+        owner = f"session{request.session.session_key}"
+    return f"{owner}:{str(client_id or 'default')[:64]}"
+
+
 @csrf_exempt
 def ai_chat(request):
     """
@@ -727,7 +832,10 @@ def ai_chat(request):
             user_message = data.get('question', '')
             history = data.get('history', [])
 
-            ai_reply = generate_learning_assistant_response(user_message, history)
+            ai_reply = generate_learning_assistant_response(
+                user_message, history, user_id=request.user.id,
+                conversation_id=_conversation_id(request, data.get('conversation_id'))
+            )
 
             return JsonResponse({'answer': ai_reply})
         except Exception as e:
@@ -737,94 +845,168 @@ def ai_chat(request):
     return JsonResponse({'error': "Invalid request"}, status=400)
 
 
+def _sse_event(data, event=None):
+    """ Formats one Server-Sent Event. """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _iterate_in_thread(iterator):
+    """
+    Async version of a blocking iterator: it runs in its own thread and each item is handed to the
+    event loop as soon as it is produced. Under ASGI Django buffers a sync iterator to the end,
+    so streams served there have to be async. Stops early when the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def pump():
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(items.put_nowait, item)
+        except Exception as e:
+            print(f"Stream Error: {e}")
+        finally:
+            # The thread's own DB connection, don't leak it
+            connection.close()
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, finished)
+            except RuntimeError:
+                pass  # the event loop is already closed
+
+    threading.Thread(target=pump, name='sse-stream', daemon=True).start()
+    try:
+        while (item := await items.get()) is not finished:
+            yield item
+    finally:
+        stop.set()
+
+
+@csrf_exempt
+def ai_chat_stream(request):
+    """
+    Streaming version of ai_chat: forwards the reply to the browser as Server-Sent Events
+    while Groq generates it ({"delta": ...} chunks), then one "done" event with the full answer.
+    Served chunk by chunk under both WSGI (runserver) and the ASGI app.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': "Invalid request"}, status=400)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': "Invalid request"}, status=400)
+
+    user_message = data.get('question', '')
+    history = data.get('history', [])
+    user_id = request.user.id
+    conversation_id = _conversation_id(request, data.get('conversation_id'))
+
+    def event_stream():
+        answer = []
+        for chunk in stream_learning_assistant_response(user_message, history, user_id=user_id, conversation_id=conversation_id):
+            answer.append(chunk)
+            yield _sse_event({'delta': chunk})
+        yield _sse_event({'answer': ''.join(answer)}, event='done')
+
+    stream = event_stream()
+    if isinstance(request, ASGIRequest):
+        stream = _iterate_in_thread(stream)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+
+@staff_member_required
+def ai_gateway_stats(request):
+    """
+    Operator view: LLM gateway call/retry/failure counters, circuit breaker state,
+    response cache hit rates, quota scheduler usage (queued / shed calls per priority)
+    and the community /ai reply pool (queue length, wait/run times, rejected commands).
+    """
+    return JsonResponse({
+        'gateway': gateway_stats(),
+        'cache': llm_cache_stats(),
+        'scheduler': llm_scheduler.stats(),
+        'community_ai': community_ai_pool.stats(),
+    })
+
+
 #  6. PREVIOUS DOCKER EXECUTION ENGINE (Remains intact as requested)
 
 @csrf_exempt
+@login_required
 def execute_code_api(request):
     """
-    Local Docker Code Execution Engine.
+    Local Docker Code Execution Engine (older URL, kept for existing clients).
     Requires Docker to be installed and 'local-compiler' image to be built.
+    Same as submit_code_job: answers 202 with a job id at once, the output is polled from code_job_status.
+    """
+    return submit_code_job(request)
+
+
+# --- ASYNC CODE EXECUTION JOBS (Submit + Poll) ---
+
+CODE_QUEUE_FULL_MESSAGE = "The code runner is busy right now. Please try again in a few seconds."
+
+@login_required
+def submit_code_job(request):
+    """
+    Queues code for execution and returns a job id straight away.
+    The web worker never waits on Docker; the client polls code_job_status.
     """
     if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'message': 'Invalid Request'})
-        
+        return JsonResponse({'status': 'error', 'message': 'Invalid Request'}, status=400)
+
     try:
         data = json.loads(request.body)
-        language = data.get('language', 'python')
         code = data.get('code', '')
-        
         if not code.strip():
             return JsonResponse({'status': 'error', 'message': 'Code cannot be empty.'})
 
-        # 1. Create a unique folder and file for the student's code
-        unique_id = str(uuid.uuid4())
-        TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_codes')
-        os.makedirs(TEMP_DIR, exist_ok=True)
-        
-        # 2. Determine execution command based on selected language
-        if language == 'python':
-            file_ext = '.py'
-            run_cmd = ['python3', f'/app/{unique_id}{file_ext}']
-        elif language == 'javascript':
-            file_ext = '.js'
-            run_cmd = ['node', f'/app/{unique_id}{file_ext}']
-        elif language == 'cpp':
-            file_ext = '.cpp'
-            # C++ requires compilation first, then execution
-            run_cmd = ['sh', '-c', f'g++ /app/{unique_id}{file_ext} -o /app/{unique_id} && /app/{unique_id}']
-        elif language == 'java':
-            file_ext = '.java'
-            # Assuming the main class is named 'Main'
-            run_cmd = ['sh', '-c', f'javac /app/{unique_id}{file_ext} && cd /app && java Main']
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Unsupported language.'})
-
-        file_name = f"{unique_id}{file_ext}"
-        file_path = os.path.join(TEMP_DIR, file_name)
-
-        # 3. Write code to the temporary file
-        with open(file_path, 'w') as f:
-            f.write(code)
-
-        # 4. Prepare Docker run command
-        # Binds the TEMP_DIR to /app inside container, limits memory and CPU
-        docker_cmd = [
-            'docker', 'run', '--rm', 
-            '-v', f"{TEMP_DIR}:/app", 
-            '--network', 'none',      
-            '--memory', '256m',       
-            '--cpus', '0.5',          
-            'local-compiler'          
-        ] + run_cmd
-
-        # 5. Run the code safely with a timeout of 5 seconds
-        try:
-            process = subprocess.run(
-                docker_cmd, capture_output=True, text=True, timeout=15
-            )
-            output = process.stdout
-            error = process.stderr
-            
-            if process.returncode == 0:
-                result_status = 'success'
-                final_output = output if output else "Execution completed (No output)"
-            else:
-                result_status = 'error'
-                final_output = error if error else output
+        job_id = submit_job(data.get('language', 'python'), code, owner_id=request.user.id, timeout=15)
+        if job_id is None:
+            return JsonResponse({'status': 'error', 'message': CODE_QUEUE_FULL_MESSAGE}, status=503)
 
-        except subprocess.TimeoutExpired:
-            result_status = 'error'
-            final_output = "Timeout Error: Your code took too long to execute (Possible Infinite Loop)."
-            
-        finally:
-            # 6. Cleanup: Remove the temporary file after execution to save space
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
-        return JsonResponse({'status': result_status, 'output': final_output})
+        return JsonResponse({'status': 'queued', 'job_id': job_id, 'poll_url': reverse('code_job_status', args=[job_id])}, status=202)
 
     except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)})
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@login_required
+def code_job_status(request, job_id):
+    """
+    Returns the state of a job ('queued', 'running', 'done') and its output once done.
+    """
+    job = get_job(job_id, owner_id=request.user.id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found or expired.'}, status=404)
+
+    data = {'job_id': job['id'], 'state': job['state'], 'status': job['state']}
+    if job['started_at']:
+        data['wait_ms'] = int((job['started_at'] - job['submitted_at']) * 1000)
+    if job['state'] == 'done':
+        data.update(job['result'])
+    return JsonResponse(data)
+
+
+@staff_member_required
+def code_queue_stats(request):
+    """
+    Operator view: execution queue depth, wait/run times, warm container pool usage,
+    compile cache hit/miss counters and the bounty problem pool.
+    """
+    return JsonResponse({
+        'queue': queue_stats(),
+        'container_pool': pool_stats(),
+        'compile_cache': compile_cache_stats(),
+        'bounty_pool': bounty_pool_stats(),
+    })
 
 
 # 7. ADMIN PANEL SYSTEM (FULL CREATE/DELETE LOGIC)
@@ -982,9 +1164,12 @@ def admin_update_student_info(request, user_id):
             # --- ONLY UPDATE COINS ---
             new_coins = request.POST.get('new_coins')
             if new_coins is not None:
-                student.lms_coins = int(new_coins)
-                student.save(update_fields=['lms_coins'])
-                messages.success(request, f"Coin balance updated to {new_coins} for {student.username}.")
+                # Booked as the difference, so coins earned meanwhile by the student aren't overwritten
+                try:
+                    apply_coins(student, int(new_coins) - student.lms_coins, CoinEvent.REASON_ADMIN)
+                    messages.success(request, f"Coin balance updated to {new_coins} for {student.username}.")
+                except InsufficientCoins:
+                    messages.error(request, f"Coin balance of {student.username} can't go below zero.")
         else:
             # --- NORMAL PROFILE UPDATE ---
             student.first_name = request.POST.get('first_name', student.first_name)
@@ -1103,6 +1288,9 @@ def admin_delete_enrollment(request, enroll_id):
 # 8. PREVIOUS: SYNTAX SINGULARITY (AI LOGIC CHECKER)
 # =====================================================================
 
+# A slow AI review must never hold up a submission for long
+BOUNTY_AI_TIMEOUT = 10
+
 @login_required
 def syntax_singularity_view(request):
     """ Renders the VS Code style Syntax Singularity page. """
@@ -1112,7 +1300,10 @@ def syntax_singularity_view(request):
 @login_required
 @csrf_exempt
 def generate_ai_challenge(request):
-    """ Calls Groq API to generate a dynamic coding problem based on User's typed topic. """
+    """
+    Gives the student a coding problem (with test cases) for their typed topic:
+    from the pre-generated pool when one is waiting, otherwise generated live by Groq.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -1122,66 +1313,31 @@ def generate_ai_challenge(request):
             difficulty = data.get('difficulty', 'Easy')
             
             course_obj = get_object_or_404(Course, id=course_id)
-            groq_api_key = getattr(settings, 'GROQ_API_KEY', os.environ.get('GROQ_API_KEY', ''))
-            
-            if not groq_api_key:
-                return JsonResponse({'status': 'error', 'message': 'Groq API Key is missing in backend.'}, status=500)
-                
-            headers = {"Authorization": f"Bearer {groq_api_key}", "Content-Type": "application/json"}
-            
-            prompt = f"""
-            You are ARIS, an advanced AI system. Generate a coding problem for a student.
-            Language: {language}
-            Topic: {topic}
-            Difficulty: {difficulty}
-            
-            CRITICAL INSTRUCTION FOR `base_code`: 
-            You MUST NOT provide the solution. Provide ONLY the empty function signature/template for the student to start with. The function body MUST be empty (use `pass` in Python, or empty brackets `{{}}` in other languages). DO NOT write the actual logic.
-            
-            Return ONLY a valid JSON object without markdown tags:
-            {{
-                "title": "A short engaging title",
-                "description": "Clear problem statement and constraints.",
-                "base_code": "def solve(arr):\\n    # Write your logic here\\n    pass"
-            }}
-            """
-            
-            payload = {
-                "model": "llama-3.3-70b-versatile", # 🚀 UPDATED MODEL NAME (Current Flagship)
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.5
-            }
-            
-            base_url = "https://"
-            endpoint = "api.groq.com/openai/v1/chat/completions"
-            groq_url = base_url + endpoint
-            
-            response = requests.post(groq_url, headers=headers, json=payload)
-            response_data = response.json()
-            
-            if 'choices' not in response_data:
-                error_msg = response_data.get('error', {}).get('message', str(response_data))
-                return JsonResponse({'status': 'error', 'message': f'Groq API Error: {error_msg}'}, status=500)
-            
-            content = response_data['choices'][0]['message']['content'].replace("```json", "").replace("```", "").strip()
             
-            try: problem_data = json.loads(content)
-            except json.JSONDecodeError: return JsonResponse({'status': 'error', 'message': 'AI generated invalid JSON. Try again.'}, status=500)
-            
-            base_coins = 10 if difficulty == 'Easy' else (30 if difficulty == 'Medium' else 100)
-            
-            new_problem = DynamicBountyProblem.objects.create(
-                student=request.user, course=course_obj, language=language,
-                topic=topic, difficulty=difficulty, title=problem_data['title'],
-                description=problem_data['description'], base_code=problem_data.get('base_code', ''),
-                base_bounty_coins=base_coins
-            )
+            # ⚡ Popular topics are served instantly from the pre-generated pool
+            # (pooled problems were validated before they entered the pool)
+            problem_data = serve_problem_from_pool(language, topic, difficulty)
+            if problem_data is not None:
+                new_problem = create_problem_for_student(request.user, course_obj, language, topic, difficulty, problem_data)
+            else:
+                # Live problems are shown at once; the sandbox check of the reference solution runs in the background
+                try:
+                    problem_data = generate_problem_data(language, topic, difficulty, with_solution=True, user_id=request.user.id, feature='challenge_generation')
+                except (ValueError, LLMError) as e:
+                    return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+                new_problem = create_problem_for_student(
+                    request.user, course_obj, language, topic, difficulty, problem_data,
+                    verification=DynamicBountyProblem.VERIFICATION_PENDING,
+                )
+                schedule_verification(new_problem, problem_data)
             
             return JsonResponse({
                 'status': 'success', 'problem_id': new_problem.id,
                 'title': new_problem.title, 'description': new_problem.description,
                 'base_code': new_problem.base_code, 'difficulty': new_problem.difficulty,
-                'base_coins': new_problem.base_bounty_coins
+                'base_coins': new_problem.base_bounty_coins,
+                'verification': new_problem.verification,
+                'status_url': reverse('challenge_status', args=[new_problem.id]),
             })
             
         except Exception as e:
@@ -1189,10 +1345,92 @@ def generate_ai_challenge(request):
     return JsonResponse({'status': 'error', 'message': 'Invalid Request'}, status=400)
 
 
+@login_required
+def challenge_status(request, problem_id):
+    """
+    Polled by the arena page while a live problem is being verified: 'pending', 'verified'
+    (test cases and coins attached) or 'failed' (AI-checked practice, no coins).
+    """
+    problem = get_object_or_404(DynamicBountyProblem, id=problem_id, student=request.user)
+    return JsonResponse({
+        'status': 'success', 'problem_id': problem.id,
+        'verification': problem.verification, 'base_coins': problem.base_bounty_coins,
+    })
+
+
+def _ai_bounty_review(problem, submitted_code, test_results=None):
+    """
+    Asks the AI to review a submission. Returns {'is_correct': ..., 'feedback': ...} or None.
+    With test_results the verdict is already decided and only the hint text is used.
+    """
+    prompt = f"""
+    You are a strict, expert coding instructor.
+    Problem Title: {problem.title}
+    Problem Description: {problem.description}
+    Language: {problem.language}
+    
+    Student's Code:
+    {submitted_code}
+    """
+    if test_results:
+        failed = next((c for c in test_results['cases'] if c['verdict'] != JUDGE_ACCEPTED), None)
+        prompt += f"""
+    The code was executed and failed test case {failed['case']} ({failed['verdict']}).
+    Input: {failed.get('input', '(hidden test case)')}
+    Expected output: {failed.get('expected', '(hidden)')}
+    Student's output: {failed.get('actual', '(hidden)')}
+    
+    Give a short hint about the logical mistake WITHOUT writing the solution.
+    """
+    else:
+        prompt += """
+    Check if the student's code logically and perfectly solves the problem. Ignore minor syntax warnings if the core logic is flawlessly correct.
+    """
+    prompt += """
+    Return ONLY a valid JSON object in this exact format (no markdown):
+    {
+        "is_correct": true or false,
+        "feedback": "Short encouraging explanation of what is right, or clear guidance on what is logically wrong."
+    }
+    """
+
+    try:
+        content = call_groq(prompt, temperature=0.2, timeout=BOUNTY_AI_TIMEOUT, feature='bounty_review', user_id=problem.student_id)
+        return json.loads(content)
+    except (ValueError, LLMError) as e:
+        print(f"Bounty AI Review Error: {e}")
+        return None
+
+
+def _test_feedback(test_results):
+    """ Deterministic feedback text built from the judge's per-case results. """
+    verdict = test_results['verdict']
+    total = test_results['total']
+    if verdict == JUDGE_ACCEPTED:
+        return f"All {total} test cases passed! ✅"
+    if verdict == COMPILATION_ERROR:
+        return f"Compilation failed:\n{test_results['compile_output']}"
+
+    failed = next(c for c in test_results['cases'] if c['verdict'] != JUDGE_ACCEPTED)
+    feedback = f"Passed {test_results['passed']}/{total} test cases. Test case {failed['case']}: {verdict}."
+    if failed['hidden']:
+        return feedback + " (hidden test case)"
+    if verdict == WRONG_ANSWER:
+        feedback += f"\nInput:\n{failed['input']}\nExpected:\n{failed['expected']}\nYour output:\n{failed['actual']}"
+    elif verdict == RUNTIME_ERROR and failed.get('error'):
+        feedback += f"\n{failed['error']}"
+    return feedback
+
+
 @login_required
 @csrf_exempt
 def submit_bounty_code(request):
-    """ Evaluates the student's code logically using Groq AI (No Docker Execution). """
+    """
+    Evaluates the student's code in three steps:
+    1. cheap local syntax pre-check, 2. the problem's test cases in the Docker sandbox,
+    3. the AI, only for hint text or for practice problems without verified test cases.
+    Coins are only ever paid for a sandbox verdict.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -1203,86 +1441,97 @@ def submit_bounty_code(request):
             
             if not submitted_code.strip():
                 return JsonResponse({'status': 'error', 'message': 'Code cannot be empty.'})
-
-            groq_api_key = getattr(settings, 'GROQ_API_KEY', os.environ.get('GROQ_API_KEY', ''))
-            if not groq_api_key:
-                return JsonResponse({'status': 'error', 'message': 'Groq API Key is missing.'}, status=500)
+            
+            # Test cases aren't attached until the background check is done, don't judge (or pay) without them
+            if problem.verification == DynamicBountyProblem.VERIFICATION_PENDING:
+                return JsonResponse({'status': 'error', 'message': 'The test cases for this problem are still being verified. Please submit again in a few seconds.'}, status=409)
+            
+            # 1. Syntax pre-check (no sandbox, no AI). Not an attempt: the one-shot reward stays available
+            syntax_error = precheck_syntax(problem.language, submitted_code)
+            if syntax_error:
+                return JsonResponse({
+                    'status': 'success',
+                    'is_correct': False,
+                    'verdict': COMPILATION_ERROR,
+                    'feedback': f"Syntax error: {syntax_error}\n\n(Not counted as an attempt.)",
+                    'earned_coins': 0,
+                    'attempt': None,
+                    'test_results': None,
+                })
             
             # 🎯 ONE-SHOT LOGIC: Check attempt count
             attempt_count = BountySubmission.objects.filter(problem=problem, student=request.user).count()
             current_attempt = attempt_count + 1
-                
-            headers = {"Authorization": f"Bearer {groq_api_key}", "Content-Type": "application/json"}
-            
-            prompt = f"""
-            You are a strict, expert coding instructor.
-            Problem Title: {problem.title}
-            Problem Description: {problem.description}
-            Language: {problem.language}
-            
-            Student's Code:
-            {submitted_code}
             
-            Check if the student's code logically and perfectly solves the problem. Ignore minor syntax warnings if the core logic is flawlessly correct.
+            test_results = None
+            judged = problem.test_cases.exists()
             
-            Return ONLY a valid JSON object in this exact format (no markdown):
-            {{
-                "is_correct": true or false,
-                "feedback": "Short encouraging explanation of what is right, or clear guidance on what is logically wrong."
-            }}
-            """
+            # 2. 🧪 Run every (validated) test case in one sandbox session
+            if judged:
+                try:
+                    test_results = judge_problem(problem, submitted_code)
+                except JudgeError as e:
+                    print(f"Judge Error: {e}")
+                    # Sandbox down: an AI opinion is shown, but nothing is recorded and no coins are paid
+                    review = _ai_bounty_review(problem, submitted_code)
+                    feedback = review.get('feedback', '') if review else ''
+                    return JsonResponse({
+                        'status': 'success',
+                        'is_correct': False,
+                        'verdict': 'Not Judged',
+                        'feedback': f"The judge is unavailable right now, so this was not counted as an attempt. Please submit again shortly.\n\n{feedback}".strip(),
+                        'earned_coins': 0,
+                        'attempt': None,
+                        'test_results': None,
+                    })
             
-            payload = {
-                "model": "llama-3.3-70b-versatile", # 🚀 UPDATED MODEL NAME (Current Flagship)
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.2
-            }
-            
-            base_url = "https://"
-            endpoint = "api.groq.com/openai/v1/chat/completions"
-            groq_url = base_url + endpoint
-            
-            response = requests.post(groq_url, headers=headers, json=payload)
-            response_data = response.json()
-            
-            if 'choices' not in response_data:
-                return JsonResponse({'status': 'error', 'message': 'AI failed to evaluate code.'}, status=500)
-            
-            content = response_data['choices'][0]['message']['content'].replace("```json", "").replace("```", "").strip()
-            
-            try: 
-                eval_result = json.loads(content)
-            except json.JSONDecodeError: 
-                return JsonResponse({'status': 'error', 'message': 'AI response format error.'}, status=500)
-            
-            is_correct = eval_result.get('is_correct', False)
-            feedback = eval_result.get('feedback', 'No feedback provided.')
+            if test_results:
+                verdict = test_results['verdict']
+                feedback = _test_feedback(test_results)
+                
+                # AI only adds a hint to logic errors; the verdict stays deterministic
+                if verdict == WRONG_ANSWER and getattr(settings, 'BOUNTY_AI_HINTS', True):
+                    review = _ai_bounty_review(problem, submitted_code, test_results)
+                    if review and review.get('feedback'):
+                        feedback += f"\n\n💡 Hint: {review['feedback']}"
+            else:
+                # 3. Practice problem without verified test cases: AI logic check, never any coins
+                review = _ai_bounty_review(problem, submitted_code)
+                if review is None:
+                    return JsonResponse({'status': 'error', 'message': 'AI failed to evaluate code.'}, status=500)
+                verdict = "AI Accepted" if review.get('is_correct', False) else "AI Rejected"
+                feedback = review.get('feedback', 'No feedback provided.')
             
+            is_correct = verdict in (JUDGE_ACCEPTED, "AI Accepted")
             earned_coins = 0
             
-            # 💰 ONE-SHOT REWARD LOGIC: Coin Reward only on 1st Attempt
+            # 💰 ONE-SHOT REWARD LOGIC: Coin Reward only on 1st Attempt, and only for a sandbox verdict
             if is_correct and not problem.is_solved:
-                if current_attempt == 1:
+                if current_attempt == 1 and judged:
                     earned_coins = problem.base_bounty_coins
-                    request.user.lms_coins += earned_coins
-                    request.user.save(update_fields=['lms_coins'])
+                    # One payout per problem, even if two submissions are judged at the same time
+                    if not apply_coins(request.user, earned_coins, CoinEvent.REASON_BOUNTY, problem.course, key=f"bounty:{problem.id}"):
+                        earned_coins = 0
                     
                 problem.is_solved = True
                 problem.save(update_fields=['is_solved'])
             
             BountySubmission.objects.create(
                 problem=problem, student=request.user, submitted_code=submitted_code,
-                status="AI Accepted" if is_correct else "AI Rejected",
+                status=verdict,
                 earned_coins=earned_coins,
-                attempt_number=current_attempt
+                attempt_number=current_attempt,
+                execution_time=test_results['execution_time'] if test_results else None
             )
             
             return JsonResponse({
                 'status': 'success',
                 'is_correct': is_correct,
+                'verdict': verdict,
                 'feedback': feedback,
                 'earned_coins': earned_coins,
-                'attempt': current_attempt
+                'attempt': current_attempt,
+                'test_results': test_results
             })
 
         except Exception as e:
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BoundedWorkerPool:
+    """
+    Fixed-size background thread pool with a bounded backlog.
+    `submit` never blocks: when every worker is busy and the backlog is full it
+    returns None so the caller can push back on the user instead of piling up work.
+    Tracks queue depth plus wait/run times for the operator stats view.
+    """
+
+    # How many recent jobs the wait/run time figures are computed from
+    SAMPLE_SIZE = 200
+
+    def __init__(self, name, max_workers, max_queue):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=self.SAMPLE_SIZE)
+        self._run_times = deque(maxlen=self.SAMPLE_SIZE)
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """ Queues fn(*args, **kwargs). Returns a Future, or None if the pool is full. """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+        return self._executor.submit(self._run, time.monotonic(), fn, args, kwargs)
+
+    def _run(self, enqueued_at, fn, args, kwargs):
+        started_at = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self._wait_times.append(started_at - enqueued_at)
+
+        try:
+            result = fn(*args, **kwargs)
+            with self._lock:
+                self.completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self._run_times.append(time.monotonic() - started_at)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._wait_times)
+            runs = sorted(self._run_times)
+            return {
+                'name': self.name,
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': self.queued,
+                'running': self.running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_wait_ms': _avg_ms(waits),
+                'p95_wait_ms': _p95_ms(waits),
+                'avg_run_ms': _avg_ms(runs),
+                'p95_run_ms': _p95_ms(runs),
+            }
+
+
+def _avg_ms(samples):
+    return round(sum(samples) / len(samples) * 1000, 1) if samples else 0
+
+
+def _p95_ms(sorted_samples):
+    if not sorted_samples:
+        return 0
+    index = min(len(sorted_samples) - 1, int(len(sorted_samples) * 0.95))
+    return round(sorted_samples[index] * 1000, 1)